@@ -81,7 +81,7 @@ for row in rows:
         continue
     # DL
     print("Downloading", info.page_url, "to", redl_rel_path)
-    success = dl.download_hls_ffmpeg(info.direct_url, redl_full_path)
+    success = dl.download_hls(info.direct_url, redl_full_path)
     if not success:
         print("Download FAILED!")
         continue
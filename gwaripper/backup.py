@@ -0,0 +1,186 @@
+"""
+Online backups of the sqlite DB
+
+Snapshots are made with the sqlite backup API in steps of a limited nr of pages,
+so other connections (e.g. the webGUI) can keep reading and writing in between
+instead of being locked out for the whole copy
+
+PageStore keeps multiple snapshots in a single file storing every distinct page
+only once (zlib compressed), so a new snapshot only adds the pages that changed
+since the snapshots that are already in the store
+"""
+
+import os
+import time
+import zlib
+import hashlib
+import sqlite3
+import logging
+
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# nr of pages copied per step of the backup API, 1MiB with the default page size
+BACKUP_PAGES_PER_STEP = 256
+# seconds to wait before retrying a step when the DB is locked
+BACKUP_BUSY_SLEEP = 0.05
+
+
+def snapshot_db(db_path: str, out_path: str,
+                pages_per_step: int = BACKUP_PAGES_PER_STEP) -> None:
+    """
+    Writes a consistent copy of the DB at db_path to out_path (overwriting it) using
+    the sqlite backup API
+
+    NOTE: if another connection writes to the DB between two steps the backup
+    starts over, so the result always matches a committed state of the DB
+    """
+    src = sqlite3.connect(db_path)
+    try:
+        dst = sqlite3.connect(out_path)
+        try:
+            src.backup(dst, pages=pages_per_step, sleep=BACKUP_BUSY_SLEEP)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+class PageStore:
+    """
+    Deduplicated and compressed snapshots of sqlite DB files, which are kept in
+    a sqlite DB themselves
+
+    Snapshots are identified by a unique name and are ordered by the time they
+    were added
+    """
+
+    SCHEMA = """
+    -- every distinct page once; digest is the blake2b hash of the uncompressed page
+    CREATE TABLE IF NOT EXISTS Page(
+        id INTEGER PRIMARY KEY ASC,
+        digest BLOB UNIQUE NOT NULL,
+        data BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Snapshot(
+        id INTEGER PRIMARY KEY ASC,
+        name TEXT UNIQUE NOT NULL,
+        created REAL NOT NULL,
+        page_size INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS SnapshotPage(
+        snapshot_id INTEGER NOT NULL,
+        page_no INTEGER NOT NULL,
+        page_id INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, page_no),
+        FOREIGN KEY (snapshot_id) REFERENCES Snapshot(id) ON DELETE CASCADE,
+        FOREIGN KEY (page_id) REFERENCES Page(id)
+    ) WITHOUT ROWID;
+    -- finding pages that aren't used by any snapshot anymore
+    CREATE INDEX IF NOT EXISTS snapshot_page_page_id_idx ON SnapshotPage(page_id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.con = sqlite3.connect(path)
+        # NOTE: has to be set before creating the tables; lets us give the space of
+        # pages that were removed together with old snapshots back to the file system
+        self.con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.con.execute("PRAGMA foreign_keys=on")
+        self.con.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> 'PageStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def snapshots(self) -> List[str]:
+        """
+        :return: Names of all snapshots, oldest first
+        """
+        return [row[0] for row in self.con.execute(
+            "SELECT name FROM Snapshot ORDER BY created, id")]
+
+    def add_snapshot(self, name: str, db_path: str) -> Tuple[int, int]:
+        """
+        Adds the DB file at db_path (which must not be written to while it's being
+        added, e.g. a file written by snapshot_db) as snapshot name, replacing an
+        existing snapshot with the same name
+
+        :return: Nr of pages of the snapshot and how many of them weren't in the store yet
+        """
+        db = sqlite3.connect(db_path)
+        try:
+            page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            db.close()
+
+        nr_pages = nr_new_pages = 0
+        with self.con:
+            self._remove_snapshot(name)
+            snapshot_id = self.con.execute(
+                "INSERT INTO Snapshot(name, created, page_size) VALUES (?, ?, ?)",
+                (name, time.time(), page_size)).lastrowid
+            with open(db_path, "rb") as f:
+                while True:
+                    page = f.read(page_size)
+                    if not page:
+                        break
+                    digest = hashlib.blake2b(page, digest_size=16).digest()
+                    row = self.con.execute(
+                        "SELECT id FROM Page WHERE digest = ?", (digest,)).fetchone()
+                    if row is None:
+                        page_id = self.con.execute(
+                            "INSERT INTO Page(digest, data) VALUES (?, ?)",
+                            (digest, zlib.compress(page))).lastrowid
+                        nr_new_pages += 1
+                    else:
+                        page_id = row[0]
+                    self.con.execute(
+                        "INSERT INTO SnapshotPage(snapshot_id, page_no, page_id) "
+                        "VALUES (?, ?, ?)", (snapshot_id, nr_pages, page_id))
+                    nr_pages += 1
+
+        return nr_pages, nr_new_pages
+
+    def _remove_snapshot(self, name: str) -> None:
+        self.con.execute("DELETE FROM Snapshot WHERE name = ?", (name,))
+        # pages that were only used by the removed snapshot
+        self.con.execute("""
+            DELETE FROM Page WHERE NOT EXISTS (
+                SELECT 1 FROM SnapshotPage WHERE page_id = Page.id)""")
+
+    def remove_snapshot(self, name: str) -> None:
+        with self.con:
+            self._remove_snapshot(name)
+        self.con.execute("PRAGMA incremental_vacuum")
+
+    def restore(self, name: str, out_path: str) -> None:
+        """
+        Writes the DB file of snapshot name to out_path
+
+        :raises KeyError: If there's no snapshot with that name
+        """
+        row = self.con.execute(
+            "SELECT id FROM Snapshot WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        c = self.con.execute("""
+            SELECT Page.data FROM SnapshotPage
+            JOIN Page ON Page.id = SnapshotPage.page_id
+            WHERE SnapshotPage.snapshot_id = ?
+            ORDER BY SnapshotPage.page_no""", (row[0],))
+        with open(out_path, "wb") as f:
+            for (data,) in c:
+                f.write(zlib.decompress(data))
+
+    def size(self) -> int:
+        """
+        :return: Size of the store in bytes
+        """
+        return os.path.getsize(self.path)
@@ -0,0 +1,278 @@
+"""
+Bulk import of external catalogs (e.g. legacy csv exports) into the DB
+
+GWARipper.add_to_db inserts one file at a time and every insert fires the triggers
+that keep the materialized view, the full-text search index and the change log
+in sync (each running several queries), which makes importing a catalog with
+100k files take minutes
+
+bulk_import instead resolves the artists, aliases and collections of a whole batch
+of records at once, inserts the files with executemany and defers the trigger
+maintenance: the triggers that fire on inserting files are dropped for the
+duration of the import and the rows they would've written are added with one
+INSERT .. SELECT per table at the end
+"""
+
+import csv
+import datetime
+import sqlite3
+import logging
+
+from typing import (
+    Iterable, Iterator, NamedTuple, Optional, Union, Dict, List, Tuple, Set
+)
+
+logger = logging.getLogger(__name__)
+
+# nr of records that are resolved and inserted at once
+BULK_IMPORT_BATCH_SIZE = 10_000
+# triggers that fire (once per row) when inserting into AudioFile; their work is
+# done once for all imported files by _refresh_derived_tables
+# NOTE: inserting into FileCollection/RedditInfo doesn't fire any triggers and the
+# trigram index triggers on Artist/Alias are kept since there are few artists
+# compared to files
+DEFERRED_TRIGGERS = (
+    "mv_combined_audio_ai",
+    "search_fts_mv_ai",
+    "audio_change_log_mv_ai",
+)
+
+
+class ImportRecord(NamedTuple):
+    """
+    One audio file of an external catalog
+
+    The collection_* fields are only used when the collection isn't in the DB
+    yet, the first record of a collection determines its values
+    """
+    url: str
+    filename: str
+    # name the file was posted under
+    alias: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    # date it was downloaded, today if None
+    date: Optional[Union[str, datetime.date]] = None
+    # if set the alias will be linked to this artist (like for reddit authors)
+    artist: Optional[str] = None
+    rating: Optional[float] = None
+    favorite: int = 0
+    # e.g. the url of the reddit submission that linked to the file
+    collection_url: Optional[str] = None
+    collection_title: Optional[str] = None
+    collection_id_on_page: Optional[str] = None
+    collection_subpath: str = ""
+    # alias of the collection's author, defaults to alias
+    collection_alias: Optional[str] = None
+    # if any of these is set the collection gets a RedditInfo
+    reddit_created_utc: Optional[float] = None
+    selftext: Optional[str] = None
+    # path of the selftext file relative to the root dir
+    selftext_path: Optional[str] = None
+
+
+def _none_if_empty(value: str) -> Optional[str]:
+    return value if value else None
+
+
+def records_from_csv(filename: str) -> Iterator[ImportRecord]:
+    """
+    Reads the records of a csv export of mv_audio_and_collection_combined (see
+    db.export_changes_to_csv), so e.g. a library can be restored from the csv backups
+
+    NOTE: exports contain changed files multiple times, only the last row of a
+    file is used so all rows have to be read before the first record is returned;
+    files that were removed after the last full export are still in the file
+    """
+    rows: Dict[str, Dict[str, str]] = {}
+    with open(filename, "r", newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile, dialect="excel", delimiter=";"):
+            # re-insert so the files stay in the order of their last change
+            rows.pop(row["url"], None)
+            rows[row["url"]] = row
+
+    for row in rows.values():
+        yield ImportRecord(
+            url=row["url"],
+            filename=row["filename"],
+            alias=row["alias_name"],
+            title=_none_if_empty(row["title"]),
+            description=_none_if_empty(row["description"]),
+            date=_none_if_empty(row["date"]),
+            artist=_none_if_empty(row["artist_name"]),
+            rating=float(row["rating"]) if row["rating"] else None,
+            favorite=int(row["favorite"] or 0),
+            collection_url=_none_if_empty(row["fcol_url"]),
+            collection_title=_none_if_empty(row["fcol_title"]),
+            collection_id_on_page=_none_if_empty(row["fcol_id_on_page"]),
+            collection_subpath=row["fcol_subpath"],
+            collection_alias=_none_if_empty(row["fcol_alias_name"]),
+            reddit_created_utc=(float(row["reddit_created_utc"])
+                                if row["reddit_created_utc"] else None),
+            # not in exports of DBs older than version 10
+            selftext_path=_none_if_empty(row.get("reddit_selftext_path", "")),
+        )
+
+
+def _batches(records: Iterable[ImportRecord], batch_size: int) -> Iterator[List[ImportRecord]]:
+    batch: List[ImportRecord] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ids_by_name(c: sqlite3.Cursor, table: str, names: Set[str]) -> Dict[str, int]:
+    # NOTE: one scan over the table is faster than looking up the names one by one
+    # (or in chunks because of the max nr of host parameters) once the batch
+    # contains a good part of all names, which is the usual case for an import
+    return {name: _id for _id, name in c.execute(f"SELECT id, name FROM {table}")
+            if name in names}
+
+
+def _resolve_names(c: sqlite3.Cursor, batch: List[ImportRecord]) -> Dict[str, int]:
+    """
+    Adds all artists and aliases of batch that aren't in the DB yet
+
+    :return: Alias name -> alias id
+    """
+    artists = {r.artist for r in batch if r.artist}
+    # same as GWARipper.add_artist: the artist name is also one of its aliases
+    alias_artist: Dict[str, Optional[str]] = {a: a for a in artists}
+    for r in batch:
+        if r.collection_alias and r.collection_alias not in alias_artist:
+            alias_artist[r.collection_alias] = None
+        # the artist is only known if it's given for the record
+        if r.artist or r.alias not in alias_artist:
+            alias_artist[r.alias] = r.artist
+
+    c.executemany("INSERT OR IGNORE INTO Artist(name) VALUES (?)",
+                  ((a,) for a in artists))
+    artist_ids = _ids_by_name(c, "Artist", artists)
+    # NOTE: like in GWARipper.add_to_db an existing alias keeps its artist
+    c.executemany("INSERT OR IGNORE INTO Alias(name, artist_id) VALUES (?, ?)",
+                  ((alias, artist_ids[artist] if artist else None)
+                   for alias, artist in alias_artist.items()))
+
+    return _ids_by_name(c, "Alias", set(alias_artist))
+
+
+def _resolve_collections(c: sqlite3.Cursor, batch: List[ImportRecord],
+                         alias_ids: Dict[str, int]) -> Dict[str, int]:
+    """
+    Adds the collections of batch that aren't in the DB yet
+
+    :return: Collection url -> collection id
+    """
+    first_record: Dict[str, ImportRecord] = {}
+    for r in batch:
+        if r.collection_url and r.collection_url not in first_record:
+            first_record[r.collection_url] = r
+
+    collection_ids: Dict[str, int] = {}
+    for url, r in first_record.items():
+        row = c.execute("SELECT id FROM FileCollection WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            collection_ids[url] = row[0]
+            continue
+
+        reddit_info_id = None
+        if (r.reddit_created_utc is not None or r.selftext is not None or
+                r.selftext_path is not None):
+            reddit_info_id = c.execute(
+                "INSERT INTO RedditInfo(created_utc, selftext, selftext_path) VALUES (?, ?, ?)",
+                (r.reddit_created_utc, r.selftext, r.selftext_path)).lastrowid
+        collection_ids[url] = c.execute("""
+            INSERT INTO FileCollection(
+                url, id_on_page, title, subpath, reddit_info_id, parent_id, alias_id
+            ) VALUES (?, ?, ?, ?, ?, NULL, ?)""", (
+                url, r.collection_id_on_page, r.collection_title, r.collection_subpath,
+                reddit_info_id, alias_ids[r.collection_alias or r.alias])).lastrowid
+
+    return collection_ids
+
+
+def _refresh_derived_tables(c: sqlite3.Cursor, first_new_id: int) -> None:
+    """
+    Does the work of DEFERRED_TRIGGERS for all AudioFiles with an id >= first_new_id
+    """
+    c.execute("""
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined WHERE id >= ?""", (first_new_id,))
+    # NOTE: same values as the search_fts_mv_ai trigger; the imported ids weren't
+    # used before so they can't be in the index yet
+    c.execute("""
+        INSERT INTO Search_fts_idx(rowid, title, collection_title, description, artist, selftext)
+        SELECT
+            mv.id, mv.title, mv.fcol_title, mv.description,
+            mv.alias_name || ' ' || IFNULL(mv.artist_name, '') || ' ' ||
+                IFNULL(mv.fcol_alias_name, ''),
+            RedditInfo.selftext
+        FROM mv_audio_and_collection_combined mv
+        LEFT JOIN RedditInfo ON RedditInfo.id = mv.fcol_reddit_info_id
+        WHERE mv.id >= ?""", (first_new_id,))
+    # every imported file gets its own sequence nr, like with the trigger
+    c.execute("""
+        INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+        SELECT
+            id,
+            (SELECT IFNULL(MAX(change_seq), 0) FROM AudioFileChangeLog) +
+                ROW_NUMBER() OVER (ORDER BY id)
+        FROM mv_audio_and_collection_combined WHERE id >= ?""", (first_new_id,))
+
+
+def bulk_import(db_con: sqlite3.Connection, records: Iterable[ImportRecord],
+                batch_size: int = BULK_IMPORT_BATCH_SIZE) -> int:
+    """
+    Imports records into the DB in a single transaction, which is rolled back if
+    anything fails; records whose url is already in the DB are skipped
+
+    NOTE: db_con must not have a transaction open, since the import commits
+
+    :return: Nr of imported files
+    """
+    today = datetime.date.today()
+    c = db_con.cursor()
+    # NOTE: DROP TRIGGER doesn't implicitly start a transaction
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        trigger_sql: List[Tuple[str, str]] = c.execute(f"""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'trigger' AND name IN ({', '.join('?' * len(DEFERRED_TRIGGERS))})
+            """, DEFERRED_TRIGGERS).fetchall()
+        for name, _ in trigger_sql:
+            c.execute(f"DROP TRIGGER {name}")
+
+        first_new_id = c.execute(
+            "SELECT IFNULL(MAX(id), 0) + 1 FROM AudioFile").fetchone()[0]
+        for batch in _batches(records, batch_size):
+            alias_ids = _resolve_names(c, batch)
+            collection_ids = _resolve_collections(c, batch, alias_ids)
+            # OR IGNORE: skip files that are already in the DB (url is UNIQUE)
+            c.executemany("""
+                INSERT OR IGNORE INTO AudioFile(
+                    collection_id, date, description, filename, title, url,
+                    alias_id, rating, favorite
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
+                    (collection_ids[r.collection_url] if r.collection_url else None,
+                     r.date or today, r.description, r.filename, r.title, r.url,
+                     alias_ids[r.alias], r.rating, r.favorite)
+                    for r in batch))
+
+        nr_imported = c.execute(
+            "SELECT COUNT(*) FROM AudioFile WHERE id >= ?", (first_new_id,)).fetchone()[0]
+        _refresh_derived_tables(c, first_new_id)
+
+        for _, sql in trigger_sql:
+            c.execute(sql)
+    except BaseException:
+        db_con.rollback()
+        raise
+    else:
+        db_con.commit()
+
+    logger.info("Imported %d files", nr_imported)
+    return nr_imported
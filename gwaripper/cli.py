@@ -14,6 +14,8 @@ from . import utils
 from . import clipwatcher_single
 from gwaripper import config
 from .gwaripper import GWARipper
+from .db import load_or_create_sql_db
+from .urlindex import UrlIndex, load_url_index
 from .reddit import reddit_praw, parse_subreddit, search_subreddit
 from .logging_setup import configure_logging
 
@@ -50,6 +52,9 @@ def main():
                              "disk! WARNING: They are not stored in the DB at the "
                              "moment, so the selftext will not be available - even in "
                              "the webGUI")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="Number of URLs/submissions that are extracted and downloaded "
+                             "concurrently (default: 1)")
 
     # support sub-commands like svn checkout which require different kinds of
     # command-line arguments
@@ -317,7 +322,8 @@ def download_all_links(urls: List[str], args: argparse.Namespace) -> None:
             skip_non_audio=args.skip_non_audio,
             dont_write_selftext=args.dont_write_selftext,
             only_one_mirror=config.config.getboolean("Settings", "only_one_mirror", fallback=False),
-            host_priority=config.get_host_priorities()) as gw:
+            host_priority=config.get_host_priorities(),
+            max_workers=args.jobs) as gw:
         gw.set_urls(urls)
         gw.download_all()
 
@@ -347,7 +353,8 @@ def download_all_subs(sublist: List[praw.models.Submission], args: argparse.Name
             skip_non_audio=args.skip_non_audio,
             dont_write_selftext=args.dont_write_selftext,
             only_one_mirror=config.config.getboolean("Settings", "only_one_mirror", fallback=False),
-            host_priority=config.get_host_priorities()) as gw:
+            host_priority=config.get_host_priorities(),
+            max_workers=args.jobs) as gw:
         gw.download_all(sublist)
 
 
@@ -540,9 +547,21 @@ def watch_clip() -> Optional[List[str]]:  # type: ignore[return]
     :param domain: keyword that points to function is_domain_url in clipwatcher_single module
     :return: ClipboardWatcher instance or None
     """
+    known_urls: Optional[UrlIndex] = None
+    db_path = os.path.join(config.get_root(), "gwarip_db.sqlite")
+    if os.path.isfile(db_path):
+        db_con, _ = load_or_create_sql_db(db_path)
+        try:
+            known_urls = load_url_index(db_con)
+        finally:
+            db_con.close()
+        logger.debug("Loaded %d known urls (%.1f KiB)", len(known_urls),
+                     known_urls.memory_usage() / 1024)
+
     watcher = clipwatcher_single.ClipboardWatcher(clipwatcher_single.is_url,
                                                   clipwatcher_single.print_write_to_txtf,
-                                                  os.path.join(config.get_root(), "_linkcol"), 0.1)
+                                                  os.path.join(config.get_root(), "_linkcol"), 0.1,
+                                                  known_urls=known_urls)
     try:
         logger.info("Watching clipboard...")
         watcher.run()
@@ -551,6 +570,9 @@ def watch_clip() -> Optional[List[str]]:  # type: ignore[return]
         logger.info("Stopped watching clipboard!")
         if watcher.found:
             logger.info("URLs were saved in: {}\n".format(watcher.txtname))
+            for found in watcher.found_tagged:
+                logger.info("%s: %s", found.extractor.EXTRACTOR_NAME if found.extractor
+                            else "No extractor", found.url)
             yn = input("Do you want to download found URLs directly? (yes/no):\n")
             if yn == "yes":
                 # dont return ref so watcher can die
@@ -3,10 +3,14 @@ import os
 import logging
 import re
 
-from typing import Callable, List, Any
+from typing import Callable, List, Any, Optional, Type, NamedTuple
 
 import pyperclip
 
+from .extractors import find_extractor
+from .extractors.base import BaseExtractor
+from .urlindex import UrlIndex
+
 logger = logging.getLogger(__name__)
 
 URL_RE = re.compile(r"^(?:https?://)?(?:[-A-Za-z0-9]{1,61}\.)*[-A-Za-z0-9]{2,61}\.[a-z]{2,61}/.+")
@@ -28,6 +32,12 @@ def print_write_to_txtf(wstring, linkdir, txtname) -> None:
         w.write(wstring + "\n")
 
 
+class FoundUrl(NamedTuple):
+    url: str
+    # None if no extractor supports the url
+    extractor: Optional[Type[BaseExtractor]]
+
+
 class ClipboardWatcher:
     """Watches for changes in clipboard that fullfill predicate and get sent to callback
 
@@ -39,16 +49,22 @@ class ClipboardWatcher:
 
     # predicate ist bedingung ob gesuchter clip content
     # hier beim aufruf in main funktion is_url_but_not_sgasm
+    # known_urls: urls that were already downloaded, urls found during
+    # watching get added to it so they're only captured once
     def __init__(self, predicate: Callable[[str], bool],
                  callback: Callable[[str, str, str], None],
-                 txtpath: str, pause: float = 5.):
+                 txtpath: str, pause: float = 5.,
+                 known_urls: Optional[UrlIndex] = None):
         self._predicate = predicate
         self._callback = callback
         self._txtpath = txtpath
         self._pause = pause
         self._stopping: bool = False
+        self._known_urls = known_urls if known_urls is not None else UrlIndex()
         self.txtname: str = time.strftime("%Y-%m-%d_%Hh.txt")
         self.found: List[str] = []
+        # same as found but tagged with the extractor that will handle the url
+        self.found_tagged: List[FoundUrl] = []
 
     def run(self) -> None:
         recent_value: str = ""
@@ -59,12 +75,25 @@ class ClipboardWatcher:
                 recent_value = tmp_value
                 # if predicate is met
                 if self._predicate(recent_value):
-                    # call callback
-                    self._callback(recent_value, self._txtpath, self.txtname)
-                    # append to found list so we can return it when closing clipwatcher
-                    self.found.append(recent_value)
+                    self._handle_url(recent_value)
             time.sleep(self._pause)
 
+    def _handle_url(self, url: str) -> None:
+        url = url.strip()
+        if url in self._known_urls:
+            logger.info("Skipped already downloaded or copied url: %s", url)
+            return
+        self._known_urls.add(url)
+
+        extractor = find_extractor(url)
+        if extractor is None:
+            logger.warning("No extractor found for url: %s", url)
+        # call callback
+        self._callback(url, self._txtpath, self.txtname)
+        # append to found list so we can return it when closing clipwatcher
+        self.found.append(url)
+        self.found_tagged.append(FoundUrl(url, extractor))
+
     def stop(self) -> None:
         self._stopping = True
 
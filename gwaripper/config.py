@@ -71,10 +71,22 @@ if not config.sections():
             "tag1_in_but_not_tag2": "[script offer];[script fill]",
             "db_bu_freq": "5",
             "max_db_bu": "5",
+            # copy: every backup is a full copy of the DB file
+            # pages: backups are snapshots that only store the pages that changed,
+            #        see gwaripper.backup.PageStore
+            "db_bu_format": "copy",
             "set_missing_reddit": "True",
             "only_one_mirror": "False",
             "host_priority": "0,5,4",
             "set_ssl_cert_file": "True",
+            # per host rate:burst:max_connections; see ratelimit.scheduler_from_config
+            "host_rate_limit": "4:8:4",
+            "host_rate_limits": "",
+            # nr of segments of a HLS stream that are downloaded concurrently
+            "hls_concurrency": "4",
+            # nr of files of a collection (e.g. a soundgasm user page) that are
+            # extracted concurrently while the first ones are already downloading
+            "extract_concurrency": "4",
         },
         "Time": {
             "last_db_bu": str(time.time()),
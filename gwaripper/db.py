@@ -7,33 +7,165 @@ import datetime
 import csv
 import re
 import enum
+import queue
+import threading
+import contextlib
 
-from typing import Tuple, Optional, Set, Dict, Sequence, List
+from typing import (
+    Tuple, Optional, Set, Dict, Sequence, List, Iterator, NamedTuple, Callable, Any
+)
 
 from .config import config, write_config_module
 from . import migrate
 from .info import DELETED_USR_FOLDER, UNKNOWN_USR_FOLDER
 from .exceptions import GWARipperError
+from .backup import snapshot_db, PageStore
 
 logger = logging.getLogger(__name__)
 
+# NOTE: WAL lets readers (e.g. the webGUI) continue while a writer (e.g. GWARipper
+# downloading) has a transaction open; it's persistent so once set on the DB
+# file all other connections (also of other processes) use it as well
+# NORMAL is safe in WAL mode, a power loss might only roll back the last transactions
+DB_PRAGMAS: Tuple[Tuple[str, str], ...] = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    # negative -> in KiB so 32MiB
+    ("cache_size", "-32768"),
+    # 256MiB
+    ("mmap_size", "268435456"),
+    ("temp_store", "MEMORY"),
+    # ms to wait for other connections' write locks before raising
+    # "database is locked"
+    ("busy_timeout", "5000"),
+)
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """
+    Applies DB_PRAGMAS and turns on foreign key support; needs to be called
+    outside of a transaction since journal_mode can't be changed inside one
+    """
+    for name, value in DB_PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}")
+    conn.execute("PRAGMA foreign_keys=on")
+
+
+def is_latest_version(conn: sqlite3.Connection) -> bool:
+    """
+    Cheap check whether the DB is on migrate.LATEST_VERSION, so we don't need
+    to set up a migrate.Database (separate connection and reading the version
+    table) for DBs that don't need migrating
+    """
+    try:
+        row = conn.execute(
+            f"SELECT version_id, dirty FROM {migrate.VERSION_TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        # no version table
+        return False
+    return row is not None and row[0] == migrate.LATEST_VERSION and not row[1]
+
+
+# trigram indexes of the normalized artist/alias names for fuzzy matching
+# see migrations/0008_name_trigram.py
+# NOTE: the trigram tokenizer needs SQLite >= 3.34, with older versions (which e.g.
+# some python 3.8/3.9 builds ship with) the tables aren't created and artist~ only
+# matches exact names, see fuzzy_match_names
+NAME_TRIGRAM_MIN_SQLITE_VERSION = (3, 34, 0)
+NAME_TRIGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE Artist_trigram_idx USING fts5(name, tokenize='trigram');
+
+CREATE TRIGGER artist_trigram_ai AFTER INSERT ON Artist
+BEGIN
+    INSERT INTO Artist_trigram_idx(rowid, name)
+    VALUES (new.id, replace(replace(replace(replace(new.name, '_', ''), '-', ''), ' ', ''), '.', ''));
+END;
+
+CREATE TRIGGER artist_trigram_au AFTER UPDATE OF name ON Artist
+BEGIN
+    DELETE FROM Artist_trigram_idx WHERE rowid = old.id;
+    INSERT INTO Artist_trigram_idx(rowid, name)
+    VALUES (new.id, replace(replace(replace(replace(new.name, '_', ''), '-', ''), ' ', ''), '.', ''));
+END;
+
+CREATE TRIGGER artist_trigram_ad AFTER DELETE ON Artist
+BEGIN
+    DELETE FROM Artist_trigram_idx WHERE rowid = old.id;
+END;
+
+CREATE VIRTUAL TABLE Alias_trigram_idx USING fts5(name, tokenize='trigram');
+
+CREATE TRIGGER alias_trigram_ai AFTER INSERT ON Alias
+BEGIN
+    INSERT INTO Alias_trigram_idx(rowid, name)
+    VALUES (new.id, replace(replace(replace(replace(new.name, '_', ''), '-', ''), ' ', ''), '.', ''));
+END;
+
+CREATE TRIGGER alias_trigram_au AFTER UPDATE OF name ON Alias
+BEGIN
+    DELETE FROM Alias_trigram_idx WHERE rowid = old.id;
+    INSERT INTO Alias_trigram_idx(rowid, name)
+    VALUES (new.id, replace(replace(replace(replace(new.name, '_', ''), '-', ''), ' ', ''), '.', ''));
+END;
+
+CREATE TRIGGER alias_trigram_ad AFTER DELETE ON Alias
+BEGIN
+    DELETE FROM Alias_trigram_idx WHERE rowid = old.id;
+END;
+"""
+
+
+def has_trigram_tokenizer() -> bool:
+    return sqlite3.sqlite_version_info >= NAME_TRIGRAM_MIN_SQLITE_VERSION
+
+
+def name_trigram_idx_exists(db_con: sqlite3.Connection) -> bool:
+    return db_con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Artist_trigram_idx'"
+    ).fetchone() is not None
+
+
+def create_name_trigram_idx(db_con: sqlite3.Connection) -> None:
+    """
+    Creates and populates the trigram indexes for DBs that were created/migrated
+    with an SQLite version that didn't support them
+    """
+    logger.info("Creating the trigram indexes of the artist and alias names")
+    with db_con:
+        db_con.executescript(f"""
+            BEGIN IMMEDIATE TRANSACTION;
+            {NAME_TRIGRAM_SCHEMA}
+            INSERT INTO Artist_trigram_idx(rowid, name)
+            SELECT id, replace(replace(replace(replace(name, '_', ''), '-', ''), ' ', ''), '.', '')
+            FROM Artist;
+            INSERT INTO Alias_trigram_idx(rowid, name)
+            SELECT id, replace(replace(replace(replace(name, '_', ''), '-', ''), ' ', ''), '.', '')
+            FROM Alias;
+            COMMIT;
+        """)
+
 
 # E. Langloise: PEP 519 recommends using typing.Union[str, bytes, os.PathLike]
 # for filenames
 # only use str for now
-def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
+def load_or_create_sql_db(filename: str, check_same_thread: bool = True) -> Tuple[
+        sqlite3.Connection, sqlite3.Cursor]:
     """
     Creates connection to sqlite3 db and a cursor object.
     Creates file and tables if it doesn't exist!
 
     :param filename: Filename string/path to file
+    :param check_same_thread: Passed to sqlite3.connect; if False the connection
+                              can be shared between threads, the caller is then
+                              responsible for serializing access to it
     :return: connection to sqlite3 db and cursor instance
     """
     create_new = not os.path.isfile(filename)
     if create_new:
         os.makedirs(os.path.dirname(filename), exist_ok=True)
     conn: sqlite3.Connection = sqlite3.connect(filename,
-                                               detect_types=sqlite3.PARSE_DECLTYPES)
+                                               detect_types=sqlite3.PARSE_DECLTYPES,
+                                               check_same_thread=check_same_thread)
 
     if create_new:
         # context mangaer auto-commits changes or does rollback on exception
@@ -89,6 +221,8 @@ def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cu
 
                 CREATE INDEX alias_artist_id_idx ON Alias(artist_id);
 
+                {NAME_TRIGRAM_SCHEMA if has_trigram_tokenizer() else ''}
+
                 INSERT OR IGNORE INTO Alias(name) VALUES ('{DELETED_USR_FOLDER}');
                 INSERT OR IGNORE INTO Alias(name) VALUES ('{UNKNOWN_USR_FOLDER}');
 
@@ -114,9 +248,11 @@ def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cu
                 CREATE TABLE RedditInfo(
                     id INTEGER PRIMARY KEY ASC,
                     created_utc REAL
-                    -- should we safe the selftext in the db?
-                    -- selftext TEXT
-                );
+                    -- added by migrations/0007_search_fts.py using ALTER TABLE, which
+                    -- is why the comma is on this line
+                    -- selftext_path: path of the selftext file relative to the root dir,
+                    -- added by migrations/0010_selftext_path.py
+                    , selftext TEXT, selftext_path TEXT);
 
                 CREATE TABLE ListenLater (
                   id INTEGER PRIMARY KEY ASC,
@@ -155,91 +291,221 @@ def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cu
                             Alias.name
                      FROM Alias WHERE Alias.id = FileCollection.alias_id) as fcol_alias_name,
                     RedditInfo.created_utc as reddit_created_utc,
-                    EXISTS (SELECT 1 FROM ListenLater WHERE audio_id = AudioFile.id) as listen_later
+                    EXISTS (SELECT 1 FROM ListenLater WHERE audio_id = AudioFile.id) as listen_later,
+                    -- see migrations/0010_selftext_path.py
+                    RedditInfo.selftext_path as reddit_selftext_path
                 FROM AudioFile
                 LEFT JOIN FileCollection ON AudioFile.collection_id = FileCollection.id
                 LEFT JOIN RedditInfo ON FileCollection.reddit_info_id = RedditInfo.id
                 JOIN Alias ON Alias.id = AudioFile.alias_id
                 LEFT JOIN Artist ON Artist.id = Alias.artist_id;
 
-                CREATE VIEW v_audio_and_collection_titles
-                AS
-                SELECT
-                    AudioFile.id as audio_id,
-                    FileCollection.title as collection_title,
-                    AudioFile.title as audio_title
-                FROM AudioFile
-                LEFT JOIN FileCollection ON AudioFile.collection_id = FileCollection.id;
-
-                -- full text-search virtual table
-                -- only stores the idx due to using parameter content='..'
-                -- -> external content table (here using a view)
-                -- but then we have to keep the content table and the idx up-to-date ourselves
-                CREATE VIRTUAL TABLE IF NOT EXISTS Titles_fts_idx USING fts5(
-                  title, collection_title,
-                  content='v_audio_and_collection_titles',
-                  content_rowid='audio_id');
-
-                -- in this case also possible using one trigger with case/when since we're
-                -- inserting into the same table etc.
-                -- WHEN NULL does not work it just appeared to work since the subquery
-                -- with WHERE FileCollection.id = NULL returned no rows which means NULL will
-                -- be inserted (which we could use but then the subquery would be run every time)
-                -- use WHEN new.collection_id IS NULL instead
-                CREATE TRIGGER AudioFile_ai AFTER INSERT ON AudioFile
+                -- materialized v_audio_and_collection_combined kept in sync by triggers
+                -- see migrations/0004_materialize_combined_view.py
+                CREATE TABLE mv_audio_and_collection_combined(
+                    -- same as AudioFile.id
+                    id INTEGER PRIMARY KEY ASC,
+                    collection_id INTEGER,
+                    date DATE,
+                    description TEXT,
+                    filename TEXT,
+                    title TEXT,
+                    url TEXT,
+                    alias_id INTEGER,
+                    rating REAL,
+                    favorite INTEGER,
+                    alias_name TEXT,
+                    artist_name TEXT,
+                    fcol_id INTEGER,
+                    fcol_url TEXT,
+                    fcol_id_on_page TEXT,
+                    fcol_title TEXT,
+                    fcol_subpath TEXT,
+                    fcol_reddit_info_id INTEGER,
+                    fcol_parent_id INTEGER,
+                    fcol_alias_id INTEGER,
+                    fcol_alias_name TEXT,
+                    reddit_created_utc REAL,
+                    listen_later INTEGER
+                    -- added by migrations/0010_selftext_path.py using ALTER TABLE
+                    , reddit_selftext_path TEXT);
+
+                -- see migrations/0005_sort_indexes.py
+                CREATE INDEX mv_combined_sort_rating_idx ON mv_audio_and_collection_combined(IFNULL(rating, -1), id);
+
+                CREATE INDEX mv_combined_sort_date_idx ON mv_audio_and_collection_combined(date, id);
+
+                CREATE INDEX mv_combined_sort_title_idx ON mv_audio_and_collection_combined(IFNULL(title, ''), id);
+
+                CREATE INDEX mv_combined_sort_artist_idx ON mv_audio_and_collection_combined(COALESCE(artist_name, alias_name), id);
+
+                CREATE INDEX mv_combined_collection_id_idx ON mv_audio_and_collection_combined(collection_id);
+
+                -- see migrations/0006_listen_later_index.py
+                CREATE INDEX mv_combined_listen_later_idx ON mv_audio_and_collection_combined(id) WHERE listen_later = 1;
+
+                CREATE INDEX mv_combined_artist_name_idx ON mv_audio_and_collection_combined(artist_name);
+
+                CREATE INDEX mv_combined_alias_name_idx ON mv_audio_and_collection_combined(alias_name);
+
+                CREATE INDEX mv_combined_fcol_alias_name_idx ON mv_audio_and_collection_combined(fcol_alias_name);
+
+                CREATE INDEX mv_combined_url_idx ON mv_audio_and_collection_combined(url);
+
+                CREATE INDEX mv_combined_fcol_url_idx ON mv_audio_and_collection_combined(fcol_url);
+
+                CREATE INDEX mv_combined_fcol_id_on_page_idx ON mv_audio_and_collection_combined(fcol_id_on_page);
+
+                CREATE INDEX listen_later_audio_id_idx ON ListenLater(audio_id);
+
+                CREATE TRIGGER mv_combined_audio_ai AFTER INSERT ON AudioFile
                 BEGIN
-                    INSERT INTO Titles_fts_idx(rowid, title, collection_title)
-                    VALUES (
-                        new.id,
-                        new.title,
-                        (CASE
-                         WHEN new.collection_id IS NULL THEN NULL
-                         ELSE (SELECT title FROM FileCollection WHERE id = new.collection_id)
-                         END)
+                    INSERT OR REPLACE INTO mv_audio_and_collection_combined
+                    SELECT * FROM v_audio_and_collection_combined WHERE id = new.id;
+                END;
+
+                CREATE TRIGGER mv_combined_audio_au AFTER UPDATE ON AudioFile
+                BEGIN
+                    DELETE FROM mv_audio_and_collection_combined WHERE id = old.id;
+                    INSERT OR REPLACE INTO mv_audio_and_collection_combined
+                    SELECT * FROM v_audio_and_collection_combined WHERE id = new.id;
+                END;
+
+                CREATE TRIGGER mv_combined_audio_ad AFTER DELETE ON AudioFile
+                BEGIN
+                    DELETE FROM mv_audio_and_collection_combined WHERE id = old.id;
+                END;
+
+                CREATE TRIGGER mv_combined_fcol_au AFTER UPDATE ON FileCollection
+                BEGIN
+                    INSERT OR REPLACE INTO mv_audio_and_collection_combined
+                    SELECT * FROM v_audio_and_collection_combined
+                    WHERE collection_id IN (old.id, new.id);
+                END;
+
+                CREATE TRIGGER mv_combined_alias_au AFTER UPDATE ON Alias
+                BEGIN
+                    INSERT OR REPLACE INTO mv_audio_and_collection_combined
+                    SELECT * FROM v_audio_and_collection_combined
+                    WHERE id IN (
+                        SELECT id FROM AudioFile WHERE alias_id IN (old.id, new.id)
+                        UNION
+                        SELECT AudioFile.id FROM FileCollection
+                        JOIN AudioFile ON AudioFile.collection_id = FileCollection.id
+                        WHERE FileCollection.alias_id IN (old.id, new.id)
                     );
                 END;
 
-                -- the values inserted into the other columns must match the values
-                -- currently stored in the table otherwise the results may be unpredictable
-                CREATE TRIGGER AudioFile_ad AFTER DELETE ON AudioFile
+                CREATE TRIGGER mv_combined_artist_au AFTER UPDATE ON Artist
                 BEGIN
-                    INSERT INTO Titles_fts_idx(Titles_fts_idx, rowid, title, collection_title)
-                    VALUES(
-                        'delete',
-                        old.id,
-                        old.title,
-                        (CASE
-                         WHEN old.collection_id IS NULL THEN NULL
-                         ELSE (SELECT title FROM FileCollection WHERE id = old.collection_id)
-                         END)
+                    INSERT OR REPLACE INTO mv_audio_and_collection_combined
+                    SELECT * FROM v_audio_and_collection_combined
+                    WHERE id IN (
+                        SELECT AudioFile.id FROM Alias
+                        JOIN AudioFile ON AudioFile.alias_id = Alias.id
+                        WHERE Alias.artist_id IN (old.id, new.id)
                     );
                 END;
 
-                CREATE TRIGGER AudioFile_au AFTER UPDATE ON AudioFile
+                CREATE TRIGGER mv_combined_reddit_info_au AFTER UPDATE ON RedditInfo
+                BEGIN
+                    INSERT OR REPLACE INTO mv_audio_and_collection_combined
+                    SELECT * FROM v_audio_and_collection_combined
+                    WHERE collection_id IN (
+                        SELECT id FROM FileCollection WHERE reddit_info_id IN (old.id, new.id));
+                END;
+
+                CREATE TRIGGER mv_combined_listen_later_ai AFTER INSERT ON ListenLater
                 BEGIN
-                    -- delete old entry
-                    INSERT INTO Titles_fts_idx(Titles_fts_idx, rowid, title, collection_title)
-                    VALUES(
-                        'delete',
-                        old.id,
-                        old.title,
-                        (CASE
-                         WHEN old.collection_id IS NULL THEN NULL
-                         ELSE (SELECT title FROM FileCollection WHERE id = old.collection_id)
-                         END)
+                    UPDATE mv_audio_and_collection_combined SET listen_later = 1
+                    WHERE id = new.audio_id;
+                END;
+
+                CREATE TRIGGER mv_combined_listen_later_au AFTER UPDATE ON ListenLater
+                BEGIN
+                    UPDATE mv_audio_and_collection_combined SET listen_later = EXISTS (
+                        SELECT 1 FROM ListenLater WHERE audio_id = mv_audio_and_collection_combined.id)
+                    WHERE id IN (old.audio_id, new.audio_id);
+                END;
+
+                CREATE TRIGGER mv_combined_listen_later_ad AFTER DELETE ON ListenLater
+                BEGIN
+                    UPDATE mv_audio_and_collection_combined SET listen_later = EXISTS (
+                        SELECT 1 FROM ListenLater WHERE audio_id = old.audio_id)
+                    WHERE id = old.audio_id;
+                END;
+
+                -- full-text search index kept in sync with the materialized view
+                -- see migrations/0007_search_fts.py
+                CREATE VIRTUAL TABLE Search_fts_idx USING fts5(
+                    title, collection_title, description, artist, selftext,
+                    -- speeds up prefix queries like whisp*
+                    prefix='2 3'
+                );
+
+                INSERT INTO Search_fts_idx(Search_fts_idx, rank)
+                VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 5.0, 1.0)');
+
+                CREATE TRIGGER search_fts_mv_ai AFTER INSERT ON mv_audio_and_collection_combined
+                BEGIN
+                    DELETE FROM Search_fts_idx WHERE rowid = new.id;
+                    INSERT INTO Search_fts_idx(rowid, title, collection_title, description, artist, selftext)
+                    VALUES (
+                        new.id, new.title, new.fcol_title, new.description,
+                        new.alias_name || ' ' || IFNULL(new.artist_name, '') || ' ' ||
+                            IFNULL(new.fcol_alias_name, ''),
+                        (SELECT selftext FROM RedditInfo WHERE id = new.fcol_reddit_info_id)
                     );
-                    -- insert new one
-                    INSERT INTO Titles_fts_idx(rowid, title, collection_title)
+                END;
+
+                CREATE TRIGGER search_fts_mv_au AFTER UPDATE OF
+                    title, fcol_title, description, alias_name, artist_name, fcol_alias_name,
+                    fcol_reddit_info_id
+                ON mv_audio_and_collection_combined
+                BEGIN
+                    DELETE FROM Search_fts_idx WHERE rowid = old.id;
+                    INSERT INTO Search_fts_idx(rowid, title, collection_title, description, artist, selftext)
                     VALUES (
-                        new.id,
-                        new.title,
-                        (CASE
-                         WHEN new.collection_id IS NULL THEN NULL
-                         ELSE (SELECT title FROM FileCollection WHERE id = new.collection_id)
-                         END)
+                        new.id, new.title, new.fcol_title, new.description,
+                        new.alias_name || ' ' || IFNULL(new.artist_name, '') || ' ' ||
+                            IFNULL(new.fcol_alias_name, ''),
+                        (SELECT selftext FROM RedditInfo WHERE id = new.fcol_reddit_info_id)
                     );
                 END;
 
+                CREATE TRIGGER search_fts_mv_ad AFTER DELETE ON mv_audio_and_collection_combined
+                BEGIN
+                    DELETE FROM Search_fts_idx WHERE rowid = old.id;
+                END;
+
+                -- sequence nr of the last change of every row of the materialized view
+                -- so exports can append only the rows that changed
+                -- see migrations/0009_audio_change_log.py
+                CREATE TABLE AudioFileChangeLog(
+                    audio_id INTEGER PRIMARY KEY ASC,
+                    change_seq INTEGER NOT NULL
+                );
+
+                CREATE INDEX audio_file_change_log_seq_idx ON AudioFileChangeLog(change_seq);
+
+                CREATE TRIGGER audio_change_log_mv_ai AFTER INSERT ON mv_audio_and_collection_combined
+                BEGIN
+                    INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+                    VALUES (new.id, (SELECT IFNULL(MAX(change_seq), 0) + 1 FROM AudioFileChangeLog));
+                END;
+
+                CREATE TRIGGER audio_change_log_mv_au AFTER UPDATE ON mv_audio_and_collection_combined
+                BEGIN
+                    INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+                    VALUES (new.id, (SELECT IFNULL(MAX(change_seq), 0) + 1 FROM AudioFileChangeLog));
+                END;
+
+                CREATE TRIGGER audio_change_log_mv_ad AFTER DELETE ON mv_audio_and_collection_combined
+                BEGIN
+                    INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+                    VALUES (old.id, (SELECT IFNULL(MAX(change_seq), 0) + 1 FROM AudioFileChangeLog));
+                END;
+
                 -- VERSION TABLE
                 CREATE TABLE IF NOT EXISTS {migrate.VERSION_TABLE} (
                     version_id INTEGER PRIMARY KEY ASC,
@@ -250,7 +516,7 @@ def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cu
                 PRAGMA foreign_keys=on;
                 COMMIT;
             """)
-    else:
+    elif not is_latest_version(conn):
         # NOTE: migrate DB; context manager automatically closes connection
         with migrate.Database(filename) as migration:
             migration_success = migration.upgrade_to_latest()
@@ -259,6 +525,10 @@ def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cu
             raise GWARipperError("Could not migrate DB! Open an issue at "
                                  "github.com/nilfoer/gwaripper")
 
+    if not create_new and has_trigram_tokenizer() and not name_trigram_idx_exists(conn):
+        # DB was created/migrated with an older SQLite version
+        create_name_trigram_idx(conn)
+
     # Row provides both index-based and case-insensitive name-based access
     # to columns with almost no memory overhead
     conn.row_factory = sqlite3.Row
@@ -266,16 +536,175 @@ def load_or_create_sql_db(filename: str) -> Tuple[sqlite3.Connection, sqlite3.Cu
     # make sure foreign key support is activated
     # NOTE: even though i was setting PRAGMA foreign_keys=on in the db creation
     # script it still had the foreign_keys turned off somehow
-    with conn:
-        c = conn.execute("PRAGMA foreign_keys=on")
+    # foreign_keys is a per-connection setting and isn't stored in the DB file
+    configure_connection(conn)
+    c = conn.cursor()
 
     return conn, c
 
 
-def export_table_to_csv(db_con: sqlite3.Connection, filename: str, table_name: str) -> None:
+def connect_db(filename: str, check_same_thread: bool = True,
+               read_only: bool = False) -> sqlite3.Connection:
     """
-    Fetches and writes all rows (with all cols) in db_con's database to the file filename using
-    writerows() from the csv module
+    Connects to an existing DB without creating or migrating it, which
+    has to be done by load_or_create_sql_db first
+
+    :param read_only: Every write using this connection will raise sqlite3.OperationalError
+    """
+    if read_only:
+        conn = sqlite3.connect(f"file:{filename}?mode=ro", uri=True,
+                               detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(filename, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    if read_only:
+        for name, value in DB_PRAGMAS:
+            # journal_mode can't be changed by a read-only connection but was
+            # already set when the DB was opened for writing
+            if name != "journal_mode":
+                conn.execute(f"PRAGMA {name}={value}")
+        conn.execute("PRAGMA query_only=on")
+    else:
+        configure_connection(conn)
+    return conn
+
+
+class ConnectionManager:
+    """
+    Shares one DB file between threads: a single long-lived writer connection,
+    since sqlite only allows one writer at a time anyways, and a pool of
+    read-only connections
+    The DB is only created/migrated once when the manager is created, pooled
+    connections are opened with connect_db, which skips the version check, and
+    are kept open, so checking them out is cheap
+
+    Use as:
+        with manager.reader() as con:
+            con.execute("SELECT ...")
+        # commits on success or rolls back on exception
+        with manager.writer() as con:
+            con.execute("UPDATE ...")
+    """
+
+    def __init__(self, filename: str, pool_size: int = 4, min_readers: int = 0):
+        """
+        :param min_readers: Nr of read connections that are opened up front so
+                            they're not set up while handling the first requests
+        """
+        self.filename = filename
+        self.pool_size = max(1, pool_size)
+        self._writer_lock = threading.RLock()
+        self._readers: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        # nr of read connections that were opened
+        self._nr_readers = 0
+        self._readers_lock = threading.Lock()
+        self.closed = False
+
+        # creates/migrates the DB
+        self._writer, _ = load_or_create_sql_db(filename, check_same_thread=False)
+
+        for conn in [self.acquire_reader() for _ in range(min(min_readers, self.pool_size))]:
+            self.release_reader(conn)
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        return connect_db(self.filename, check_same_thread=False, read_only=True)
+
+    def acquire_reader(self) -> sqlite3.Connection:
+        """
+        Checks out a read-only connection, blocks if pool_size connections are
+        in use; has to be returned using release_reader
+        """
+        if self.closed:
+            raise GWARipperError("ConnectionManager was closed!")
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            create = self._nr_readers < self.pool_size
+            if create:
+                self._nr_readers += 1
+        if create:
+            try:
+                conn = self._connect_reader()
+            except Exception:
+                with self._readers_lock:
+                    self._nr_readers -= 1
+                raise
+            return conn
+
+        return self._readers.get()
+
+    def release_reader(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if self.closed:
+            conn.close()
+        else:
+            self._readers.put(conn)
+
+    @contextlib.contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire_reader()
+        try:
+            yield conn
+        finally:
+            self.release_reader(conn)
+
+    @contextlib.contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Holds the writer connection exclusively (for this process) and wraps
+        the block in a transaction
+        """
+        with self._writer_lock:
+            if self.closed:
+                raise GWARipperError("ConnectionManager was closed!")
+            with self._writer:
+                yield self._writer
+
+    def close(self) -> None:
+        self.closed = True
+        with self._writer_lock:
+            self._writer.close()
+        # NOTE: connections that are still checked out get closed on release
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> 'ConnectionManager':
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+# nr of rows that are fetched and written at once when exporting to csv
+# so memory usage doesn't depend on the size of the table
+CSV_EXPORT_BATCH_SIZE = 1000
+
+
+def _write_csv_rows(csvwriter, c: sqlite3.Cursor, batch_size: int) -> int:
+    nr_rows = 0
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            break
+        csvwriter.writerows(rows)
+        nr_rows += len(rows)
+    return nr_rows
+
+
+def export_table_to_csv(db_con: sqlite3.Connection, filename: str, table_name: str,
+                        batch_size: int = CSV_EXPORT_BATCH_SIZE) -> None:
+    """
+    Writes all rows (with all cols) of table_name in db_con's database to the file
+    filename in batches of batch_size rows using writerows() from the csv module
 
     writer kwargs: dialect='excel', delimiter=";"
 
@@ -289,16 +718,73 @@ def export_table_to_csv(db_con: sqlite3.Connection, filename: str, table_name: s
         # when to quote cells etc.
         csvwriter = csv.writer(csvfile, dialect="excel", delimiter=";")
 
-        # get rows from db
+        # NOTE: the rows are streamed from the cursor instead of using fetchall()
         c = db_con.execute(f"SELECT * FROM {table_name}")
-        rows = c.fetchall()
 
         # cursor.description -> sequence of 7-item sequences each containing
         # info describing one result column
         col_names = [description[0] for description in c.description]
         csvwriter.writerow(col_names)  # header
-        # write the all the rows to the file
-        csvwriter.writerows(rows)
+        _write_csv_rows(csvwriter, c, batch_size)
+
+
+def last_change_seq(db_con: sqlite3.Connection) -> int:
+    """
+    :return: Sequence nr of the last change of mv_audio_and_collection_combined (see
+             migrations/0009_audio_change_log.py) or 0 if nothing changed yet
+    """
+    return db_con.execute(
+        "SELECT IFNULL(MAX(change_seq), 0) FROM AudioFileChangeLog").fetchone()[0]
+
+
+def _csv_header(filename: str) -> Optional[List[str]]:
+    try:
+        with open(filename, "r", newline="", encoding="utf-8") as csvfile:
+            return next(csv.reader(csvfile, dialect="excel", delimiter=";"), None)
+    except FileNotFoundError:
+        return None
+
+
+def export_changes_to_csv(db_con: sqlite3.Connection, filename: str, table_name: str,
+                          since_change_seq: Optional[int] = None,
+                          batch_size: int = CSV_EXPORT_BATCH_SIZE) -> int:
+    """
+    Appends the rows of table_name (whose id column has to be the id of the AudioFile,
+    e.g. v_audio_and_collection_combined) that changed after since_change_seq to the
+    csv file filename, so the last row of an id is its current state
+    Removed rows are only dropped from the file by the next full export
+
+    Does a full export (see export_table_to_csv) instead if since_change_seq is None,
+    the file is missing, its columns don't match or since_change_seq is from a
+    different (e.g. restored) DB
+
+    :return: Sequence nr of the last change that's included in the file; has to be
+             passed as since_change_seq for the next export
+    """
+    # NOTE: read before exporting: rows that change in between might be exported
+    # twice but none get lost
+    change_seq = last_change_seq(db_con)
+    full = since_change_seq is None or since_change_seq > change_seq
+    if not full:
+        c = db_con.execute(f"""
+            SELECT * FROM {table_name} WHERE id IN (
+                SELECT audio_id FROM AudioFileChangeLog WHERE change_seq > ?
+            ) ORDER BY id""", (since_change_seq,))
+        col_names = [description[0] for description in c.description]
+        if _csv_header(filename) != col_names:
+            full = True
+
+    if full:
+        logger.debug("Exporting all rows of %s to %s", table_name, filename)
+        export_table_to_csv(db_con, filename, table_name, batch_size=batch_size)
+        return change_seq
+
+    with open(filename, "a", newline="", encoding="utf-8") as csvfile:
+        csvwriter = csv.writer(csvfile, dialect="excel", delimiter=";")
+        nr_rows = _write_csv_rows(csvwriter, c, batch_size)
+    logger.debug("Appended %d changed rows of %s to %s", nr_rows, table_name, filename)
+
+    return change_seq
 
 
 def convert_or_escape_to_str(column_value):
@@ -435,13 +921,35 @@ def db_to_sql_insert_only(db_con: sqlite3.Connection) -> str:
     return "\n".join(result)
 
 
+# deduplicated snapshots in the backup dir when using the "pages" db_bu_format
+PAGE_STORE_FILENAME = "gwarip_db_snapshots.pagestore"
+
+
+def seconds_until_next_backup(now: Optional[float] = None) -> float:
+    """
+    :return: Time in secs that is needed to reach the next backup (see backup_db),
+             negative if it's due
+    """
+    if now is None:
+        now = time.time()
+    # freq in days convert to secs since utc time is in secs since epoch
+    freq_secs: float = config.getfloat(
+        "Settings", "db_bu_freq", fallback=5.0) * 24 * 60 * 60
+    elapsed_time: float = now - \
+        config.getfloat("Time", "last_db_bu", fallback=0.0)
+    return freq_secs - elapsed_time
+
+
 def backup_db(db_path: str, bu_dir: str,
               csv_path: Optional[str] = None, force_bu: bool = False):
     """
     Backups db_path and csv_path (if not None) to bu_dir if the time since last backup is greater
     than db_bu_freq (in days, also from cfg) or force_bu is True
     Updates last_db_bu time in cfg and deletes oldest backup along with csv (if present) if
-    number of sqlite files in backup dir > max_db_bu in cfg
+    number of backups in backup dir > max_db_bu in cfg
+
+    Backups are copies of the DB file unless db_bu_format in cfg is "pages", then they're
+    snapshots in a PageStore (PAGE_STORE_FILENAME) that only stores changed pages
 
     If next backup isnt due yet announce when next bu will be
 
@@ -454,35 +962,30 @@ def backup_db(db_path: str, bu_dir: str,
     os.makedirs(bu_dir, exist_ok=True)
     # time.time() get utc number
     now = time.time()
-    # freq in days convert to secs since utc time is in secs since epoch
-    freq_secs: float = config.getfloat(
-        "Settings", "db_bu_freq", fallback=5.0) * 24 * 60 * 60
-    elapsed_time: float = now - \
-        config.getfloat("Time", "last_db_bu", fallback=0.0)
+    next_bu = seconds_until_next_backup(now)
 
     # if time since last db bu is greater than frequency in settings or we want to force a bu
     # time.time() is in gmt/utc whereas time.strftime() uses localtime
-    if (elapsed_time > freq_secs) or force_bu:
+    if next_bu < 0 or force_bu:
         time_str = time.strftime("%Y-%m-%d")
         logger.info("Writing backup of database to {}".format(bu_dir))
-        con = sqlite3.connect(db_path)
-
-        # by confused00 https://codereview.stackexchange.com/questions/78643/create-sqlite-backups
-        # Lock database before making a backup
-        # After a BEGIN IMMEDIATE, no other database connection will be able to
-        # write to the database persists until the next COMMIT or ROLLBACK
-        con.execute('begin immediate')
-        # Make new backup file
-        # shutil.copy2 also copies metadata -> ctime (Unix: time of the last
-        # metadata change, Win: creation time for path) doesnt change -> use mtime
-        # for sorting (doesnt change but we can assume oldest bu also has oldest
-        # mtime) whereas ctime could be the same for all) or use shutil.copy ->
-        # only copies permission not m,ctime etc
-        shutil.copy(db_path, os.path.join(
-            bu_dir, "{}_gwarip_db.sqlite".format(time_str)))
-        # Unlock database
-        con.rollback()
-        con.close()
+        # NOTE: uses the sqlite backup API, which copies the DB in steps of a few pages
+        # so e.g. the webGUI can keep reading and writing while the backup runs
+        # (previously the DB was locked using BEGIN IMMEDIATE and then copied)
+        bu_format = config.get("Settings", "db_bu_format", fallback="copy")
+        if bu_format == "pages":
+            # only the pages that changed since the snapshots in the store are added
+            snapshot_path = os.path.join(bu_dir, "snapshot.sqlite.tmp")
+            snapshot_db(db_path, snapshot_path)
+            try:
+                with PageStore(os.path.join(bu_dir, PAGE_STORE_FILENAME)) as store:
+                    nr_pages, nr_new_pages = store.add_snapshot(time_str, snapshot_path)
+                    logger.info("Stored %d of the snapshot's %d pages", nr_new_pages, nr_pages)
+            finally:
+                os.remove(snapshot_path)
+        else:
+            snapshot_db(db_path, os.path.join(
+                bu_dir, "{}_gwarip_db.sqlite".format(time_str)))
 
         if csv_path:
             shutil.copy(csv_path, os.path.join(
@@ -496,31 +999,8 @@ def backup_db(db_path: str, bu_dir: str,
         # write config to file
         write_config_module()
 
-        bu_dir_list = [os.path.join(bu_dir, f) for f in os.listdir(bu_dir)
-                       if f.endswith(".sqlite")]
-
-        # if there are more files than number of bu allowed (2 files per bu atm)
-        if len(bu_dir_list) > (config.getint("Settings", "max_db_bu", fallback=5)):
-            # use creation time (getctime) for sorting, due to how name the
-            # files we could also sort alphabetically
-            bu_dir_list = sorted(bu_dir_list, key=os.path.getctime)
-
-            oldest = os.path.basename(bu_dir_list[0])
-            logger.info(
-                "Too many backups, deleting oldest one: {}".format(oldest))
-
-            os.remove(bu_dir_list[0])
-            # try to delete csv of same day, since bu of csv is optional
-            try:
-                os.remove(os.path.join(bu_dir, oldest[:-7] + "_exp.csv"))
-            except FileNotFoundError:
-                logger.debug("No csv file backup of that day")
-            else:
-                logger.info(
-                    "Also deleted csv backup, that was created on the same day!")
+        prune_backups(bu_dir, bu_format)
     else:
-        # time in sec that is needed to reach next backup
-        next_bu = freq_secs - elapsed_time
         logger.info("The last backup date is not yet {} days old! "
                     "The next backup will be in {: .2f} days!".format(
                         config.getfloat(
@@ -528,6 +1008,46 @@ def backup_db(db_path: str, bu_dir: str,
                         next_bu / 24 / 60 / 60))
 
 
+def prune_backups(bu_dir: str, bu_format: str = "copy") -> None:
+    """
+    Deletes the oldest backups (and the csv file of the same day if present) until
+    there are at most max_db_bu (from cfg) left
+    """
+    max_db_bu = config.getint("Settings", "max_db_bu", fallback=5)
+    if bu_format == "pages":
+        store_path = os.path.join(bu_dir, PAGE_STORE_FILENAME)
+        if not os.path.isfile(store_path):
+            return
+        with PageStore(store_path) as store:
+            snapshots = store.snapshots()
+            for name in snapshots[:max(0, len(snapshots) - max_db_bu)]:
+                logger.info("Too many backups, deleting oldest one: %s", name)
+                store.remove_snapshot(name)
+                _remove_csv_backup(bu_dir, f"{name}_gwarip_db")
+        return
+
+    # NOTE: sorted by name instead of getctime, which is the same for files that were
+    # e.g. copied over together; names start with the date of the backup
+    bu_dir_list = sorted(f for f in os.listdir(bu_dir) if f.endswith(".sqlite"))
+    for oldest in bu_dir_list[:max(0, len(bu_dir_list) - max_db_bu)]:
+        logger.info(
+            "Too many backups, deleting oldest one: {}".format(oldest))
+        os.remove(os.path.join(bu_dir, oldest))
+        # remove .sqlite
+        _remove_csv_backup(bu_dir, oldest[:-7])
+
+
+def _remove_csv_backup(bu_dir: str, bu_name: str) -> None:
+    # try to delete csv of same day, since bu of csv is optional
+    try:
+        os.remove(os.path.join(bu_dir, bu_name + "_exp.csv"))
+    except FileNotFoundError:
+        logger.debug("No csv file backup of that day")
+    else:
+        logger.info(
+            "Also deleted csv backup, that was created on the same day!")
+
+
 def set_favorite_entry(db_con: sqlite3.Connection, _id: int, fav_intbool: int) -> None:
     with db_con:
         db_con.execute(
@@ -565,6 +1085,10 @@ def remove_entry(db_con: sqlite3.Connection, _id: int, root_dir: str):
 
 # helper class to turn attribute-based acces into dict-like acces on sqlite3.Row
 class RowData:
+    # excerpt of the best matching column when the row is the result of a full-text
+    # search, see add_snippets
+    snippet: Optional[str] = None
+
     def __init__(self, row: sqlite3.Row):
         self.row = row
 
@@ -576,15 +1100,16 @@ def get_x_entries(con: sqlite3.Connection, x: int,
                   after: Optional[int] = None, before: Optional[int] = None,
                   order_by: str = "AudioFile.id DESC"):
     # order by has to come b4 limit/offset
-    # alias the view v_.. as AudioFile so we can use regular order_by
+    # alias the materialized view mv_.. as AudioFile so we can use regular order_by
     # with the actual table name
+    order_by = without_relevance_sort(order_by)
     query = f"""
-            SELECT * FROM v_audio_and_collection_combined AudioFile
+            SELECT * FROM mv_audio_and_collection_combined AudioFile
             ORDER BY {order_by}
             LIMIT ?"""
     query, vals_in_order = keyset_pagination_statment(
         query, [], after=after, before=before,
-        order_by=order_by, first_cond=True)
+        order_by=order_by, first_cond=True, limit=x)
     c = con.execute(query, (*vals_in_order, x))
     rows = c.fetchall()
 
@@ -598,16 +1123,17 @@ def get_x_listen_later_entries(con: sqlite3.Connection, x: int,
                                after: Optional[int] = None, before: Optional[int] = None,
                                order_by: str = "AudioFile.id DESC"):
     # order by has to come b4 limit/offset
-    # alias the view v_.. as AudioFile so we can use regular order_by
+    # alias the materialized view mv_.. as AudioFile so we can use regular order_by
     # with the actual table name
+    order_by = without_relevance_sort(order_by)
     query = f"""
-        SELECT AudioFile.* FROM ListenLater
-        LEFT JOIN v_audio_and_collection_combined AS AudioFile ON AudioFile.id = ListenLater.audio_id
+        SELECT * FROM mv_audio_and_collection_combined AudioFile
+        WHERE AudioFile.listen_later = 1
         ORDER BY {order_by}
         LIMIT ?"""
     query, vals_in_order = keyset_pagination_statment(
         query, [], after=after, before=before,
-        order_by=order_by, first_cond=True)
+        order_by=order_by, first_cond=False, limit=x)
     c = con.execute(query, (*vals_in_order, x))
     rows = c.fetchall()
 
@@ -617,8 +1143,60 @@ def get_x_listen_later_entries(con: sqlite3.Connection, x: int,
         return None
 
 
-VALID_ORDER_BY = {"ASC", "DESC", "AudioFile.id",
-                  "AudioFile.rating", "id", "rating"}
+class SortColumn(NamedTuple):
+    # expression that gets sorted by; it's never NULL so keyset pagination only needs
+    # plain comparisons that can be answered from the matching index on
+    # mv_audio_and_collection_combined (see migrations/0005_sort_indexes.py)
+    expression: str
+    # converts keyset values e.g. from query strings to the type of the expression
+    # since expressions don't have a type affinity that would do that for us
+    convert: Callable[[Any], Any]
+    # value of the expression for NULLs
+    null_value: Any
+    # value of the expression for a row of mv_audio_and_collection_combined
+    row_value: Callable[['RowData'], Any]
+
+
+SORT_COLUMNS: Dict[str, SortColumn] = {
+    # ratings are 0-10 so NULLs are still sorted first in ascending order
+    "rating": SortColumn("IFNULL(AudioFile.rating, -1)", float, -1.0,
+                         lambda row: row.rating if row.rating is not None else -1.0),
+    # NOT NULL in AudioFile
+    "date": SortColumn("AudioFile.date", str, "",
+                       lambda row: str(row.date)),
+    "title": SortColumn("IFNULL(AudioFile.title, '')", str, "",
+                        lambda row: row.title or ""),
+    # same as the name that's displayed; alias_name is never NULL
+    "artist": SortColumn("COALESCE(AudioFile.artist_name, AudioFile.alias_name)", str, "",
+                         lambda row: row.artist_name or row.alias_name),
+    # result column that's only available when searching with a full-text or fuzzy
+    # artist query (see search_normal_columns), all other queries sort by id instead
+    "relevance": SortColumn("relevance", float, 0.0, lambda row: row.relevance),
+}
+
+VALID_ORDER_BY = {"ASC", "DESC", "AudioFile.id", "id"} | {
+    name for col in SORT_COLUMNS for name in (col, f"AudioFile.{col}")}
+
+
+def sort_column_value(row: 'RowData', order_by_col: str) -> Any:
+    """
+    :return: Value of the sort column order_by_col (see SORT_COLUMNS) for row that
+             has to be passed as after/before for keyset pagination
+    """
+    if order_by_col == "id":
+        return row.id
+    return SORT_COLUMNS[order_by_col].row_value(row)
+
+
+def without_relevance_sort(order_by: str) -> str:
+    """
+    :return: order_by with sorting by relevance replaced by sorting by id, since
+             relevance needs a full-text query
+    """
+    col, asc = parse_order_by(order_by)
+    if col == "relevance":
+        return f"AudioFile.id {'ASC' if asc else 'DESC'}"
+    return order_by
 
 
 def validate_order_by_str(order_by):
@@ -636,7 +1214,7 @@ WORD_RE = re.compile(r'([^"^\s]+)\s*|"([^"]+)"\s*')
 
 
 VALID_SEARCH_COLS: Set[str] = {
-    "title", "rating", "favorite", "artist", "url", "reddit_id"
+    "title", "rating", "favorite", "artist", "artist~", "url", "reddit_id"
 }
 
 
@@ -646,6 +1224,8 @@ VALID_SEARCH_COLS: Set[str] = {
 # flattened (just make sure that it does!)
 # only true since we need the join anyway populating an object for the collection
 # once and then storing that reference for the children would speed it up
+# NOTE: we now search mv_audio_and_collection_combined, a materialized version of the
+# view that's kept in sync by triggers, so no joins are needed at all
 #
 # search in view
 # SELECT * FROM v_audio_and_collection_combined WHERE alias_id = 3 OR url = '...'
@@ -673,13 +1253,17 @@ class ConditionalOp(enum.Enum):
 
 # these should later probably emit the search expression string themselves
 class SearchColumnExpression:
-    __slots__ = ('conditional_op', 'column_name', 'search_value')
+    __slots__ = ('conditional_op', 'column_name', 'search_value', 'fuzzy')
 
     def __init__(self, conditional_op: ConditionalOp,
-                 column_name: str, search_value: Optional[str] = None):
+                 column_name: str, search_value: Optional[str] = None,
+                 fuzzy: bool = False):
         self.conditional_op = conditional_op
         self.column_name = column_name
         self.search_value = search_value
+        # column is an artist/alias name that gets matched using fuzzy_match_names
+        # instead of testing for equality, see FUZZY_NAME_SOURCES
+        self.fuzzy = fuzzy
 
 
 class SearchExpression:
@@ -698,6 +1282,10 @@ SEARCH_COL_TRANSFORM: Dict[str, SearchExpression] = {
         SearchColumnExpression(ConditionalOp.NONE, "artist_name"),
         SearchColumnExpression(ConditionalOp.OR, "alias_name"),
         SearchColumnExpression(ConditionalOp.OR, "fcol_alias_name")]),
+    "artist~": SearchExpression(ConditionalOp.AND, [
+        SearchColumnExpression(ConditionalOp.NONE, "artist_name", fuzzy=True),
+        SearchColumnExpression(ConditionalOp.OR, "alias_name", fuzzy=True),
+        SearchColumnExpression(ConditionalOp.OR, "fcol_alias_name", fuzzy=True)]),
     "url": SearchExpression(ConditionalOp.AND, [
         SearchColumnExpression(ConditionalOp.NONE, "url"),
         SearchColumnExpression(ConditionalOp.OR, "fcol_url")]),
@@ -777,16 +1365,157 @@ def search(db_con, query, order_by="AudioFile.id DESC", **kwargs):
     search_expressions, title_search_str = search_sytnax_parser(
         query, **kwargs)
 
-    if search_expressions or title_search_str:
-        rows = search_normal_columns(
-            db_con, search_expressions, title_search_str,
-            order_by=order_by, **kwargs)
-        if rows is None:
-            return None
-        else:
-            return [RowData(row) for row in rows]
+    # NOTE: also used if the query only consists of unsupported columns, so the
+    # additional_conditions still apply
+    rows = search_normal_columns(
+        db_con, search_expressions, title_search_str,
+        order_by=order_by, **kwargs)
+    if rows is None:
+        return None
     else:
-        return get_x_entries(kwargs.pop("limit", 60), order_by=order_by, **kwargs)
+        entries = [RowData(row) for row in rows]
+        if title_search_str and entries:
+            add_snippets(db_con, entries, title_search_str)
+        return entries
+
+
+# surround the matched terms in snippets; control chars so they can't be confused
+# with the text itself and e.g. the webGUI can replace them after escaping the snippet
+SNIPPET_HIGHLIGHT = ("\x02", "\x03")
+# nr of tokens in a snippet
+SNIPPET_TOKENS = 16
+
+
+def fts_query_string(title_search_str: str) -> str:
+    # wrap search str in double quotes so "-" can be used inside it
+    return " ".join(f'"{word}"' if "-" in word else word
+                    for word in title_search_str.split(" "))
+
+
+def add_snippets(db_con: sqlite3.Connection, entries: List[RowData],
+                 title_search_str: str) -> None:
+    """
+    Sets RowData.snippet of entries (results of the full-text query title_search_str)
+    to an excerpt of the best matching column with the matched terms being surrounded
+    by SNIPPET_HIGHLIGHT
+    """
+    # NOTE: computed separately for the rows on the page instead of in the search
+    # query, where they'd be computed for every match before applying the limit
+    ids = [entry.id for entry in entries]
+    c = db_con.execute(f"""
+        SELECT rowid, snippet(Search_fts_idx, -1, ?, ?, '…', ?)
+        FROM Search_fts_idx
+        WHERE Search_fts_idx MATCH ? AND rowid IN ({', '.join('?' * len(ids))})""",
+        (*SNIPPET_HIGHLIGHT, SNIPPET_TOKENS, fts_query_string(title_search_str), *ids))
+    snippets = dict(c.fetchall())
+    for entry in entries:
+        entry.snippet = snippets.get(entry.id)
+
+
+# characters that are ignored when fuzzily matching artist/alias names so e.g. sweetaud
+# matches sweet_audio; has to match the normalization of the indexed names in
+# migrations/0008_name_trigram.py
+NAME_SEPARATORS_RE = re.compile(r"[_\-. ]")
+# trigram indexes (rowid is the id of the row in the source table) by source table
+NAME_TRIGRAM_INDEXES: Dict[str, str] = {
+    "Artist": "Artist_trigram_idx",
+    "Alias": "Alias_trigram_idx",
+}
+# source table of the fuzzily matched names by column of mv_audio_and_collection_combined
+FUZZY_NAME_SOURCES: Dict[str, str] = {
+    "artist_name": "Artist",
+    "alias_name": "Alias",
+    "fcol_alias_name": "Alias",
+}
+# fraction of the query's trigrams a name has to contain
+FUZZY_MIN_CONTAINMENT = 0.5
+# nr of candidates (ranked by bm25) that get re-ranked by similarity
+FUZZY_CANDIDATES = 200
+FUZZY_MAX_NAMES = 25
+
+
+class FuzzyMatch(NamedTuple):
+    name: str
+    # 0-1; 1 for names that are equal to the query after normalization
+    similarity: float
+
+
+def normalize_name(name: str) -> str:
+    return NAME_SEPARATORS_RE.sub("", name).lower()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def fuzzy_match_names(db_con: sqlite3.Connection, query: str, table: str = "Artist",
+                      limit: int = FUZZY_MAX_NAMES) -> List[FuzzyMatch]:
+    """
+    Finds the names of table (Artist or Alias) that are similar to query using
+    its trigram index, e.g. sweetaud or swetaudio both match sweet_audio
+
+    The similarity is the mean of the fraction of the query's trigrams that are found
+    in the name (so prefixes of a name are a good match when typing) and the
+    jaccard index of both trigram sets (so shorter names are preferred)
+
+    Without the trigram index (SQLite < 3.34) only the exact name matches like
+    with artist:
+
+    :return: Up to limit matches ordered by descending similarity
+    """
+    index = NAME_TRIGRAM_INDEXES[table]
+    if not name_trigram_idx_exists(db_con):
+        c = db_con.execute(f"SELECT name FROM {table} WHERE name = ? LIMIT 1", (query,))
+        return [FuzzyMatch(name, 1.0) for name, in c.fetchall()]
+
+    normalized = normalize_name(query)
+    if not normalized:
+        return []
+
+    query_trigrams = trigrams(normalized)
+    if not query_trigrams:
+        # trigram index can't match less than 3 chars -> scan for names starting
+        # with them instead, which is fine since there aren't that many names
+        c = db_con.execute(f"""
+            SELECT {table}.name, idx.name FROM {index} idx
+            JOIN {table} ON {table}.id = idx.rowid
+            WHERE substr(idx.name, 1, ?) = ? COLLATE NOCASE
+            LIMIT ?""", (len(normalized), normalized, FUZZY_CANDIDATES))
+        matches = [FuzzyMatch(name, len(normalized) / len(indexed))
+                   for name, indexed in c.fetchall()]
+    else:
+        # names that share at least one trigram with the query
+        # NOTE: double quotes are escaped in fts5 strings by doubling them
+        match_expr = " OR ".join('"' + t.replace('"', '""') + '"' for t in query_trigrams)
+        c = db_con.execute(f"""
+            SELECT {table}.name, idx.name FROM {index} idx
+            JOIN {table} ON {table}.id = idx.rowid
+            WHERE {index} MATCH ?
+            ORDER BY idx.rank
+            LIMIT ?""", (match_expr, FUZZY_CANDIDATES))
+
+        matches = []
+        for name, indexed in c.fetchall():
+            name_trigrams = trigrams(indexed.lower())
+            shared = len(query_trigrams & name_trigrams)
+            containment = shared / len(query_trigrams)
+            if containment < FUZZY_MIN_CONTAINMENT:
+                continue
+            jaccard = shared / len(query_trigrams | name_trigrams)
+            matches.append(FuzzyMatch(name, (containment + jaccard) / 2))
+
+    matches.sort(key=lambda m: (-m.similarity, m.name))
+    return matches[:limit]
+
+
+def has_relevance(search_expressions: List[SearchExpression], title_search_str: str) -> bool:
+    """
+    :return: Whether the results of the search can be sorted by relevance, which needs
+             a full-text or fuzzy query
+    """
+    return bool(title_search_str) or any(
+        col_expr.fuzzy and col_expr.search_value
+        for expr in search_expressions for col_expr in expr.column_expressions)
 
 
 def search_normal_columns(
@@ -805,43 +1534,94 @@ def search_normal_columns(
     vals_in_order = []
     # build conditionals for select string
 
+    # NOTE: alias materialized view as AudioFile so we can keep other parts of this function
+    # unchanged
+    from_clause = "mv_audio_and_collection_combined AudioFile"
+    relevance_col = ""
+    # values of the parameters in relevance_col, which come before the ones of the
+    # conditions
+    relevance_vals: List[Any] = []
     if title_search_str:
-        # wrap search str in double quotes so "-" can be used inside it
-        title_search_str = " ".join(f'"{word}"' if "-" in word else word
-                                    for word in title_search_str.split(" "))
-        # use full-text-search for titles
+        # use full-text-search for titles, descriptions, artists and selftexts
+        # NOTE: CROSS JOIN so sqlite always loops over the matches first
+        from_clause = (
+            "Search_fts_idx CROSS JOIN mv_audio_and_collection_combined AudioFile "
+            "ON AudioFile.id = Search_fts_idx.rowid")
+        # rank is bm25 with the weights set in migrations/0007_search_fts.py,
+        # which is negative and smaller for better matches
+        relevance_col = ", -Search_fts_idx.rank AS relevance"
         cond_statements.append(
-            f"{'AND' if cond_statements else 'WHERE'} AudioFile.id IN "
-            "(SELECT rowid FROM Titles_fts_idx WHERE Titles_fts_idx MATCH ?)")
-        vals_in_order.append(title_search_str)
-
+            f"{'AND' if cond_statements else 'WHERE'} Search_fts_idx MATCH ?")
+        vals_in_order.append(fts_query_string(title_search_str))
+    elif not has_relevance(search_expressions, title_search_str):
+        order_by = without_relevance_sort(order_by)
+
+    # fuzzy matches by (source table, search value) so names are only looked up once
+    # for e.g. alias_name and fcol_alias_name
+    fuzzy_matches: Dict[Tuple[str, str], List[FuzzyMatch]] = {}
+    # CASE expressions that turn the matched name of a column into its similarity
+    similarity_exprs: List[str] = []
     for search_expr in search_expressions:
         sub_expression = []
         for search_column_expr in search_expr.column_expressions:
             if not search_column_expr.search_value:
                 continue
+            column = f"AudioFile.{search_column_expr.column_name}"
+            if search_column_expr.fuzzy:
+                key = (FUZZY_NAME_SOURCES[search_column_expr.column_name],
+                       search_column_expr.search_value)
+                if key not in fuzzy_matches:
+                    fuzzy_matches[key] = fuzzy_match_names(db_con, key[1], table=key[0])
+                matches = fuzzy_matches[key]
+                # NOTE: leave out columns without matches, since sqlite won't use the
+                # indexes for the other columns of the OR if there's an x IN () or
+                # a constant
+                if not matches:
+                    continue
+                condition = f"{column} IN ({', '.join('?' * len(matches))})"
+                vals_in_order.extend(m.name for m in matches)
+                similarity_exprs.append(
+                    f"CASE {column} {' '.join('WHEN ? THEN ?' for _ in matches)} "
+                    "ELSE 0.0 END")
+                relevance_vals.extend(v for m in matches for v in m)
+            else:
+                condition = f"{column} = ?"
+                vals_in_order.append(search_column_expr.search_value)
+
             # NOTE: enum members all evaluate to True
             cond_op = search_column_expr.conditional_op
-            if cond_op != ConditionalOp.NONE:
+            if cond_op != ConditionalOp.NONE and sub_expression:
                 sub_expression.append('AND' if cond_op ==
                                       ConditionalOp.AND else 'OR')
-            sub_expression.append(
-                f"AudioFile.{search_column_expr.column_name} = ?")
-            vals_in_order.append(search_column_expr.search_value)
+            sub_expression.append(condition)
 
         cond_statements.append(
-            f"{'AND' if cond_statements else 'WHERE'} ({' '.join(sub_expression)})")
+            f"{'AND' if cond_statements else 'WHERE'} "
+            # no fuzzy matches -> no results
+            f"({' '.join(sub_expression) if sub_expression else '0'})")
+
+    if not title_search_str and has_relevance(search_expressions, title_search_str):
+        # rank by the similarity of the best matching name; when there's also a
+        # full-text query the bm25 rank is used and the names are only filtered
+        if not similarity_exprs:
+            relevance_col = ", 0.0 AS relevance"
+        elif len(similarity_exprs) == 1:
+            relevance_col = f", {similarity_exprs[0]} AS relevance"
+        else:
+            # NOTE: MAX with multiple args is the scalar function
+            relevance_col = f", MAX({', '.join(similarity_exprs)}) AS relevance"
+    else:
+        relevance_vals = []
+    vals_in_order = [*relevance_vals, *vals_in_order]
 
     if additional_conditions:
         cond_statements.append(
             f"{'AND' if cond_statements else 'WHERE'} ({additional_conditions})")
     cond_statements_str = "\n".join(cond_statements)
 
-    # NOTE: alias view as AudioFile so we can keep other parts of this function
-    # unchanged
     query = f"""
-            SELECT AudioFile.*
-            FROM v_audio_and_collection_combined AudioFile
+            SELECT AudioFile.*{relevance_col}
+            FROM {from_clause}
             {cond_statements_str}
             ORDER BY {order_by}
             LIMIT ?"""
@@ -849,7 +1629,7 @@ def search_normal_columns(
     # keyset param in sql substitution)
     query, vals_in_order = keyset_pagination_statment(
         query, vals_in_order, after=after, before=before,
-        order_by=order_by, first_cond=not bool(cond_statements)
+        order_by=order_by, first_cond=not bool(cond_statements), limit=limit
     )
     try:
         c = db_con.execute(query, (*vals_in_order, limit))
@@ -874,135 +1654,132 @@ def search_normal_columns(
     return rows
 
 
+def parse_order_by(order_by: str) -> Tuple[str, bool]:
+    """
+    :param order_by: e.g. AudioFile.rating DESC
+    :return: Name of the sort column (key of SORT_COLUMNS or id) and whether it's ascending
+    """
+    col, direction = order_by.split(" ")
+    return col.rsplit(".", 1)[-1].lower(), direction.upper() == "ASC"
+
+
+def order_by_clause(order_by: str, table_name: str = "AudioFile", reverse: bool = False) -> str:
+    # also sort by id secondly so order by is unique (unless were already using id)
+    col, asc = parse_order_by(order_by)
+    if reverse:
+        asc = not asc
+    direction = "ASC" if asc else "DESC"
+    if col == "id":
+        return f"ORDER BY {table_name}.id {direction}"
+    expression = SORT_COLUMNS[col].expression.replace("AudioFile.", f"{table_name}.")
+    return f"ORDER BY {expression} {direction}, {table_name}.id {direction}"
+
+
 def insert_order_by_id(query, order_by="AudioFile.id DESC"):
     # !! Assumes SQL statements are written in UPPER CASE !!
-    # also sort by id secondly so order by is unique (unless were already using id)
-    if "audiofile.id" not in order_by.lower():
-        query = query.splitlines()
-        # if we have subqueries take last order by to insert; strip line of whitespace since
-        # we might have indentation
-        order_by_i = [i for i, ln in enumerate(
-            query) if ln.strip().startswith("ORDER BY")][-1]
-        inserted = f"ORDER BY {order_by}, {order_by.split('.')[0]}.id {order_by.split(' ')[1]}"
-        query[order_by_i] = inserted
-        query = "\n".join(query)
-    return query
+    # replaces the last ORDER BY with one that sorts by the (never NULL) expression
+    # of the sort column and then by id so the order is unique
+    query = query.splitlines()
+    # if we have subqueries take last order by to insert; strip line of whitespace since
+    # we might have indentation
+    order_by_i = [i for i, ln in enumerate(
+        query) if ln.strip().startswith("ORDER BY")][-1]
+    query[order_by_i] = order_by_clause(order_by)
+    return "\n".join(query)
 
 
 def keyset_pagination_statment(query, vals_in_order, after=None, before=None,
-                               order_by="AudioFile.id DESC", first_cond=False):
+                               order_by="AudioFile.id DESC", first_cond=False,
+                               limit: Optional[int] = None):
     """Finalizes query by inserting keyset pagination statement
     Must be added/called last!
-    !! Assumes SQL statements are written in UPPER CASE !!
+    !! Assumes SQL statements are written in UPPER CASE and that ORDER BY is followed
+    by a LIMIT ? only !!
     :param query: Query string
     :param vals_in_order: List of values that come before id after/before in terms of parameter
-                          substitution; Might be None if caller wants to handle it himself
-    :param order_by: primary column to sort by and the sorting order e.g. Books.id DESC
+                          substitution
+    :param after: (id,) when sorting by id otherwise (value of sort column, id) of the
+                  last row on the current page; value might be None for NULLs
+    :param order_by: primary column to sort by and the sorting order e.g. AudioFile.id DESC
     :param first_cond: If the clause were inserting will be the first condition in the statment
+    :param limit: Value of the query's LIMIT, needed for the sub-queries when not sorting
+                  by id (the LIMIT itself still has to be substituted by the caller)
     :return: Returns finalized query and vals_in_order"""
-    # CAREFUL order_by needs to be unique for keyset pagination, possible to add rnd cols
-    # to make it unique
     if after is not None and before is not None:
         raise ValueError(
             "Either after or before can be supplied but not both!")
     elif after is None and before is None:
         return insert_order_by_id(query, order_by), vals_in_order
 
-    result = None
-    asc = True if order_by.lower().endswith("asc") else False
+    col, asc = parse_order_by(order_by)
     if after is not None:
         comp = ">" if asc else "<"
     else:
         comp = "<" if asc else ">"
+    # going backwards: get the limit nr of rows before the first one of the current page
+    # in reversed order and then restore the order below
+    reverse = before is not None
+    where = 'WHERE' if first_cond else 'AND'
 
     # @Cleanup assuming upper case sqlite statements
-    lines = [l.strip() for l in query.splitlines()]
-    insert_before = [i for i, l in enumerate(lines) if l.startswith("GROUP BY") or
-                     l.startswith("ORDER BY")][0]
-    un_unique_sort_col = "audiofile.id" not in order_by.lower()
-    if un_unique_sort_col:
-        order_by_col = order_by.split(' ')[0]
-        # 2-tuple of (primary, secondary)
-        primary, secondary = after if after is not None else before
-        # if primary is NULL we need IS NULL as "equals comparison operator" since
-        # normal comparisons with NULL are always False
-        if primary is None:
-            equal_comp = "IS NULL"
-        else:
-            equal_comp = "== ?"
-        # for ASCENDING order:
-        # slqite sorts NULLS first by default -> when e.g. going forwards in ASC order
-        # and we have a NULL value for primary sorting col as last row/book on page
-        # we need to include IS NOT NULL condition so we include rows with not-null values
-        # if the NULL isnt the last row/book we can go forward normallly
-        # if we go backwards we always need to include OR IS NULL since there might be a
-        # NULL on the next page
-        # if the NULL is first on the page then we need IS NULL and compare the id
-        # other way around for DESC order
-        # also other way around if sqlite sorted NULLs last (we could also emulate that with
-        # ORDER BY (CASE WHEN null_column IS NULL THEN 1 ELSE 0 END) ASC, primary ASC, id ASC)
-
-        # longer but more explicit if clauses
-        # if before is not None:
-        #     if asc:
-        #         # include NULLs when going backwards unless we already had a NULL on the page
-        #         null_clause = f"OR ({order_by_col} IS NULL)" if primary is not None else ""
-        #     else:
-        #         # include NOT NULLs when going backwards unless we already had a
-        #         # NOT NULL on the page
-        #         null_clause = f"OR ({order_by_col} IS NOT NULL)" if primary is None else ""
-        # else:
-        #     if asc:
-        #         # include NULLs when going forwards unless we already had a NOT NULL on the page
-        #         null_clause = f"OR ({order_by_col} IS NOT NULL)" if primary is None else ""
-        #     else:
-        #         # include NULLs when going forwards unless we already had a NULL on the page
-        #         null_clause = f"OR ({order_by_col} IS NULL)" if primary is not None else ""
-        if (before is not None and asc) or (after is not None and not asc):
-            # ASC: include NULLs when going backwards unless we already had a NULL on the page
-            # DESC: include NULLs when going forwards unless we already had a NULL on the page
-            null_clause = f"OR ({order_by_col} IS NULL)" if primary is not None else ""
-        elif (before is not None and not asc) or (after is not None and asc):
-            # ASC: include NULLs when going forwards unless we already had a NOT NULL on the page
-            # DESC: include NOT NULLs when going backwards unless we already had a
-            #       NOT NULL on the page
-            null_clause = f"OR ({order_by_col} IS NOT NULL)" if primary is None else ""
-
-        # since we sort by both the primary order by and the id to make the sort unique
-        # we need to check for rows matching the value of the sort col -> then we use the id to
-        # have a correct sort
-        # parentheses around the whole statement important otherwise rows fullfilling the OR
-        # statement will get included when searching even if they dont fullfill the rest
-        keyset_pagination = (f"{'WHERE' if first_cond else 'AND'} ({order_by_col} {comp} ? "
-                             f"OR ({order_by_col} {equal_comp} AND AudioFile.id {comp} ?) "
-                             f"{null_clause})")
-        # we only need primare 2 times if we compare by a value with ==
-        vals_in_order.extend((primary, primary, secondary) if equal_comp.startswith("==")
-                             else (primary, secondary))
+    lines = query.splitlines()
+    order_by_i = [i for i, ln in enumerate(lines) if ln.strip().startswith("ORDER BY")][-1]
+    # everything before ORDER BY: SELECT .. FROM .. WHERE ..
+    base = "\n".join(lines[:order_by_i])
+
+    if col == "id":
+        result = "\n".join((
+            base,
+            f"{where} AudioFile.id {comp} ?",
+            order_by_clause(order_by, reverse=reverse),
+            "LIMIT ?"))
+        vals_in_order.append(int(after[0] if after is not None else before[0]))
     else:
-        keyset_pagination = f"{'WHERE' if first_cond else 'AND'} AudioFile.id {comp} ?"
-        # if vals_in_order is not None:
-        vals_in_order.append(after[0] if after is not None else before[0])
-    lines.insert(insert_before, keyset_pagination)
-    result = "\n".join(lines)
-    if un_unique_sort_col:
-        result = insert_order_by_id(result, order_by)
-
-    if before is not None:
-        # @Cleanup assuming upper case order statment
-        # need to reverse order in query to not get results starting from first one possible
-        # to before(id) but rather to get limit nr of results starting from before(id)
-        result = result.replace(
-            f"{' ASC' if asc else ' DESC'}", f"{' DESC' if asc else ' ASC'}")
+        sort_col = SORT_COLUMNS[col]
+        primary, secondary = after if after is not None else before
+        primary = sort_col.null_value if primary is None else sort_col.convert(primary)
+        secondary = int(secondary)
+        # NOTE: sqlite only uses the first column of a row value comparison like
+        # (rating, id) < (?, ?) to seek in the (rating, id) index, which means all rows
+        # with the same rating had to be scanned on deep pages
+        # -> split into rows with the same value of the sort column but a smaller/bigger id
+        # and the rows after that value; both are a single seek in the index
+        # (the sort expression is never NULL, see SORT_COLUMNS)
+        # NOTE: the arms need their own LIMIT, otherwise sqlite is free to drop the
+        # ORDER BY of the sub-queries; the ORDER BY of the 1st arm is only by id since
+        # sqlite would otherwise sort it in a temp b-tree instead of walking the index
+        # the outer ORDER BY then only has to sort at most 2*limit rows
+        if limit is None:
+            raise ValueError("limit is required when not sorting by id")
+        direction = "DESC" if asc == reverse else "ASC"
+        result = "\n".join((
+            "SELECT * FROM (",
+            "SELECT * FROM (",
+            base,
+            f"{where} {sort_col.expression} = ? AND AudioFile.id {comp} ?",
+            f"ORDER BY AudioFile.id {direction}",
+            "LIMIT ?",
+            ")",
+            "UNION ALL",
+            "SELECT * FROM (",
+            base,
+            f"{where} {sort_col.expression} {comp} ?",
+            order_by_clause(order_by, reverse=reverse),
+            "LIMIT ?",
+            ")",
+            ") AS u",
+            order_by_clause(order_by, table_name="u", reverse=reverse),
+            "LIMIT ?"))
+        vals_in_order = [*vals_in_order, primary, secondary, limit,
+                         *vals_in_order, primary, limit]
+
+    if reverse:
+        # since were using a subquery we need to modify our order by to use the AS tablename
         result = f"""
             SELECT *
             FROM (
                 {result}
             ) AS t
-            ORDER BY {order_by.replace('AudioFile.', 't.')}"""
-        if un_unique_sort_col:
-            # since were using a subquery we need to modify our order by to use the AS tablename
-            result = insert_order_by_id(
-                result, order_by.replace("AudioFile.", "t."))
+            {order_by_clause(order_by, table_name="t")}"""
 
     return result, vals_in_order
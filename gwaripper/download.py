@@ -1,18 +1,29 @@
 import sys
 import os
+import io
+import ssl
 import urllib.request
 import urllib.error
+import urllib.parse
+import http.client
+import threading
 import logging
 import subprocess
 import re
 import time
 import shutil
+import hashlib
+import tempfile
+import contextlib
+import collections
+import concurrent.futures
 
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, List, Iterator, Deque, IO, cast
 from enum import Enum, auto, unique
 from urllib.error import ContentTooShortError
 
 from . import config
+from .ratelimit import get_scheduler, host_key
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +31,9 @@ DEFAULT_HEADERS = {
     'User-Agent':
     'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:12.0) Gecko/20100101 Firefox/12.0'
 }
+# lower-case names of the request headers that aren't sent along when a redirect
+# leads to a different host
+CREDENTIAL_HEADERS = frozenset(("authorization", "proxy-authorization", "cookie"))
 
 
 @unique
@@ -83,6 +97,246 @@ HTTP_ERR_TO_DL_ERR: Dict[int, DownloadErrorCode] = {
 }
 
 
+class PooledResponse:
+    """
+    Wraps a http.client.HTTPResponse so it can be used like the response
+    returned by urllib.request.urlopen
+
+    Once the body was read completely the connection is handed back to the
+    pool, otherwise closing the response closes the connection
+    """
+
+    def __init__(self, pool: 'HTTPConnectionPool', key: Tuple[str, str, int],
+                 conn: http.client.HTTPConnection, response: http.client.HTTPResponse,
+                 url: str):
+        self._pool = pool
+        self._key = key
+        self._conn: Optional[http.client.HTTPConnection] = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        # scheduler slot of the host the response came from if it differs from the
+        # one of the requested url, see HTTPConnectionPool.urlopen
+        self.slot: Optional[contextlib.ExitStack] = None
+
+    def info(self) -> http.client.HTTPMessage:
+        return self.headers
+
+    def geturl(self) -> str:
+        return self.url
+
+    def getcode(self) -> int:
+        return self.status
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        data = self._response.read(amt)
+        if self._response.isclosed():
+            # body was read completely
+            self._release()
+        return data
+
+    def _release_slot(self) -> None:
+        if self.slot is not None:
+            self.slot.close()
+            self.slot = None
+
+    def _release(self) -> None:
+        self._release_slot()
+        if self._conn is None:
+            return
+        conn = self._conn
+        self._conn = None
+        if self._response.will_close:
+            conn.close()
+        else:
+            self._pool._put(self._key, conn)
+
+    def close(self) -> None:
+        self._release_slot()
+        if self._conn is None:
+            return
+        if not self._response.isclosed():
+            # unread data left on the connection -> can't be re-used
+            self._response.close()
+            self._conn.close()
+            self._conn = None
+        else:
+            self._release()
+
+    def __enter__(self) -> 'PooledResponse':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class HTTPConnectionPool:
+    """
+    Thread-safe pool of keep-alive connections per (scheme, host, port) so
+    consecutive requests to the same host (e.g. HLS segments, API calls of
+    a batch) don't need a new TCP and TLS handshake
+
+    Raises the same exceptions as urllib.request.urlopen (HTTPError for
+    status codes >= 400, URLError if the connection couldn't be established)
+    Falls back to urllib if a proxy is configured for the scheme
+
+    Callers hold the scheduler slot of the requested url's host, so redirects
+    to other hosts acquire a slot of their own for every hop
+    """
+
+    MAX_REDIRECTS = 10
+
+    def __init__(self, max_idle_per_host: int = 4, timeout: Optional[float] = 60):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        # created lazily since cli.setup_cacerts sets SSL_CERT_FILE which
+        # is read when the default context is created
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    def _get(self, key: Tuple[str, str, int]) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        :return: Tuple of the connection and whether it was re-used from the pool
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.hits += 1
+                return idle.pop(), True
+            self.misses += 1
+
+        scheme, host, port = key
+        conn: http.client.HTTPConnection
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=self._get_ssl_context())
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        return conn, False
+
+    def _put(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            idle_conns = [c for conns in self._idle.values() for c in conns]
+            self._idle.clear()
+        for conn in idle_conns:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "idle": sum(len(c) for c in self._idle.values())}
+
+    def urlopen(self, url: str, headers: Optional[Dict[str, str]] = None,
+                method: str = "GET") -> PooledResponse:
+        headers = dict(headers) if headers else {}
+        origin_hostname = urllib.parse.urlsplit(url).hostname
+        scheduled_host = host_key(url)
+        for _ in range(self.MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            scheme = parts.scheme.lower()
+            if parts.hostname != origin_hostname:
+                # don't leak credentials to other hosts
+                headers = {k: v for k, v in headers.items()
+                           if k.lower() not in CREDENTIAL_HEADERS}
+
+            slot = contextlib.ExitStack()
+            if host_key(url) != scheduled_host:
+                slot.enter_context(get_scheduler().request(url))
+            try:
+                if scheme not in ("http", "https") or scheme in urllib.request.getproxies():
+                    # let urllib handle proxies and anything that isn't http(s)
+                    # NOTE: it follows the redirects itself
+                    with slot:
+                        return cast(PooledResponse, urllib.request.urlopen(
+                            urllib.request.Request(url, headers=headers, method=method),
+                            timeout=self.timeout))
+
+                host = parts.hostname or ""
+                port = parts.port or (443 if scheme == "https" else 80)
+                key = (scheme, host, port)
+                selector = parts.path or "/"
+                if parts.query:
+                    selector = f"{selector}?{parts.query}"
+
+                resp = self._request(key, method, selector, headers, url)
+
+                if resp.status in (301, 302, 303, 307, 308) and resp.headers.get("Location"):
+                    # drain body so the connection can be re-used
+                    resp.read()
+                    resp.close()
+                    slot.close()
+                    url = urllib.parse.urljoin(url, resp.headers["Location"])
+                    if resp.status == 303:
+                        method = "GET"
+                    continue
+
+                if resp.status >= 400:
+                    body = resp.read()
+                    resp.close()
+                    raise urllib.error.HTTPError(url, resp.status, resp.reason,
+                                                 resp.headers, io.BytesIO(body))
+            except BaseException:
+                # passes the error on to the scheduler so it can back off on 429/503
+                slot.__exit__(*sys.exc_info())
+                raise
+
+            # slot is held until the body was read or the response is closed
+            resp.slot = slot
+            return resp
+
+        raise urllib.error.URLError(f"Too many redirects (last url: {url})")
+
+    def _request(self, key: Tuple[str, str, int], method: str, selector: str,
+                 headers: Dict[str, str], url: str) -> PooledResponse:
+        while True:
+            conn, reused = self._get(key)
+            try:
+                conn.request(method, selector, headers=headers)
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException) as err:
+                conn.close()
+                if reused:
+                    # most likely the server closed the idle keep-alive connection
+                    # -> retry on a new one
+                    continue
+                raise urllib.error.URLError(err)
+
+            return PooledResponse(self, key, conn, response, url)
+
+
+_pool = HTTPConnectionPool()
+
+
+def get_pool() -> HTTPConnectionPool:
+    return _pool
+
+
+def urlopen(url: str, headers: Optional[Dict[str, str]] = None,
+            method: str = "GET") -> PooledResponse:
+    """
+    Opens url using the shared HTTPConnectionPool
+    """
+    return _pool.urlopen(url, headers=headers, method=method)
+
+
 def download(url: str, dl_path: str):
     """
     Will download the file to dl_path, return True on success
@@ -98,8 +352,10 @@ def download(url: str, dl_path: str):
         os.makedirs(dirpath, exist_ok=True)
 
     try:
-        _, headers = urllib.request.urlretrieve(
-            url, dl_path)  # reporthook=prog_bar_dl)
+        with get_scheduler().request(url), urlopen(url, DEFAULT_HEADERS) as response:
+            headers = response.info()
+            with open(dl_path, "wb") as w:
+                shutil.copyfileobj(response, w)
     except urllib.error.HTTPError as err:
         # catch this more detailed first then broader one (HTTPError is subclass of URLError)
         logger.warning("HTTP Error %s: %s: \"%s\"", err.code, err.reason, url)
@@ -111,9 +367,113 @@ def download(url: str, dl_path: str):
         return True, headers
 
 
+CONTENT_RANGE_RE = re.compile(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)", re.IGNORECASE)
+
+
+def parse_content_range(value: Optional[str]) -> Tuple[Optional[int], int]:
+    """
+    Parses a Content-Range header like `bytes 100-999/1000` or `bytes */1000`
+
+    :return: Tuple of first byte position (None for unsatisfied ranges) and
+             the complete length (-1 if unknown)
+    """
+    m = CONTENT_RANGE_RE.match(value.strip()) if value else None
+    if not m:
+        return None, -1
+    start = int(m.group(1)) if m.group(1) is not None else None
+    total = int(m.group(2)) if m.group(2) != "*" else -1
+    return start, total
+
+
+def part_filename(filename: str, url: str) -> str:
+    """
+    Filename of the partial download of url to filename
+    Includes a hash of the url (without the query, since that might contain
+    expiring tokens) so we never resume from a partial file of another url
+    """
+    parts = urllib.parse.urlsplit(url)
+    url_hash = hashlib.sha1(
+        f"{parts.netloc}{parts.path}".encode("utf-8")).hexdigest()[:8]
+    return f"{filename}.{url_hash}.part"
+
+
+def part_validator_filename(part_fn: str) -> str:
+    """
+    File next to the .part file that stores the validator (strong ETag or
+    Last-Modified) of the response the .part file was started with
+    """
+    return f"{part_fn}.validator"
+
+
+def response_validator(meta: http.client.HTTPMessage) -> Optional[str]:
+    """
+    :return: Value for an If-Range header that only matches the same version of
+             the file or None if the response has no usable validator
+    """
+    etag = meta.get("ETag")
+    # If-Range needs a strong comparison, so weak etags never match
+    if etag and not etag.strip().startswith("W/"):
+        return etag.strip()
+    return meta.get("Last-Modified")
+
+
+def read_part_validator(part_fn: str) -> Optional[str]:
+    try:
+        with open(part_validator_filename(part_fn), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_part_validator(part_fn: str, validator: Optional[str]) -> None:
+    if validator is None:
+        _remove_if_exists(part_validator_filename(part_fn))
+        return
+    with open(part_validator_filename(part_fn), "w", encoding="utf-8") as f:
+        f.write(validator)
+
+
+def _remove_if_exists(fn: str) -> None:
+    try:
+        os.remove(fn)
+    except FileNotFoundError:
+        pass
+
+
+def remove_part_file(part_fn: str) -> None:
+    _remove_if_exists(part_fn)
+    _remove_if_exists(part_validator_filename(part_fn))
+
+
+def finish_part_file(part_fn: str, filename: str) -> None:
+    # atomic if on the same filesystem, which is always the case here
+    os.replace(part_fn, filename)
+    _remove_if_exists(part_validator_filename(part_fn))
+
+
 def download_in_chunks(url: str, filename: str,
                        headers: Optional[Dict[str, str]] = None,
-                       prog_bar: bool = False) -> int:
+                       prog_bar: bool = False,
+                       max_resumes: int = 3) -> int:
+    """
+    Downloads url to filename by writing to a .part file (see part_filename) first,
+    which is renamed to filename once the download is complete
+
+    If there already is a .part file or the connection gets interrupted the download
+    is resumed using a Range request (up to max_resumes times per call) if the server
+    supports it
+    The Range request is sent with an If-Range header containing the validator
+    (ETag or Last-Modified) of the response the .part file was started with, so the
+    server sends the whole file instead if it changed since; .part files of previous
+    calls without a validator are discarded, since they can't be checked
+    A .part file is kept on failure so the next call resumes from there, unless the
+    server doesn't support ranges
+
+    Raises ContentTooShortError if less data than reported was received
+    and the download couldn't be resumed
+
+    :return: Size of the complete file in bytes
+    """
     # get head (everythin b4 last part of path ("/" last -> tail empty,
     # filename or dir(without /) -> tail)) of path; no slash in path -> head empty
     dirpath, fn = os.path.split(filename)
@@ -122,53 +482,159 @@ def download_in_chunks(url: str, filename: str,
 
     # merge headers
     headers = {**DEFAULT_HEADERS, **headers} if headers else DEFAULT_HEADERS
-    req = urllib.request.Request(url, headers=headers)
-    # urlretrieve uses block-size of 8192
-    # Before response.read() is called, the contents are not downloaded.
-    with urllib.request.urlopen(req) as response:
-        meta = response.info()
-        reported_file_size = int(meta["Content-Length"])
-        # by Alex Martelli
-        # Experiment a bit with various CHUNK sizes to find the "sweet spot" for your requirements
-        # CHUNK = 16 * 1024
+    part_fn = part_filename(filename, url)
+    offset = os.path.getsize(part_fn) if os.path.isfile(part_fn) else 0
+    validator = read_part_validator(part_fn) if offset else None
+    if offset and validator is None:
+        logger.info("Partial download of %s can't be validated, restarting", fn)
+        offset = 0
+    elif offset:
+        logger.info("Resuming download of %s at %d bytes", fn, offset)
+    supports_ranges = False
+    resumes = 0
+
+    while True:
+        req_headers = headers
+        if offset:
+            req_headers = {**headers, "Range": f"bytes={offset}-"}
+            # NOTE: without a validator (server didn't send one) the download is
+            # only resumed within this call
+            if validator is not None:
+                req_headers["If-Range"] = validator
+        # -1 if unknown
+        reported_file_size = -1
         file_size_dl = 0
-        chunk_size = 8192
-        block_num = 0
-        with open(filename, 'wb') as w:
-            while True:
-                chunk = response.read(chunk_size)
-
-                if not chunk:
-                    break
-
-                # not chunk_size since the last chunk will probably not be of size chunk_size
-                file_size_dl += len(chunk)
-                w.write(chunk)
-                block_num += 1
-                # copy behaviour of urlretrieve reporthook
-                if prog_bar:
-                    prog_bar_dl(block_num, chunk_size, reported_file_size)
-
-    # from urlretrieve doc: urlretrieve() will raise ContentTooShortError when
-    # it detects that the amount of data available was less than the expected
-    # amount (which is the size reported by a Content-Length header). This can
-    # occur, for example, when the download is interrupted.
-    # The Content-Length is treated as a lower bound: if there’s more data to
-    # read, urlretrieve reads more data, but if less data is available, it
-    # raises the exception.
-    if file_size_dl < reported_file_size:
+        interrupted = False
+        try:
+            # urlretrieve uses block-size of 8192
+            # Before response.read() is called, the contents are not downloaded.
+            # NOTE: the host's connection slot is held for the whole transfer
+            with get_scheduler().request(url), urlopen(url, req_headers) as response:
+                meta = response.info()
+                if offset and response.status == 206:
+                    supports_ranges = True
+                    start, reported_file_size = parse_content_range(meta["Content-Range"])
+                    if reported_file_size < 0 and meta["Content-Length"] is not None:
+                        # complete length unknown (*) -> end of the requested range
+                        reported_file_size = offset + int(meta["Content-Length"])
+                    if start != offset:
+                        logger.warning("Server sent the wrong range for %s, restarting "
+                                       "the download", url)
+                        remove_part_file(part_fn)
+                        offset = 0
+                        resumes += 1
+                        if resumes > max_resumes:
+                            raise ContentTooShortError(
+                                f"Server sent the wrong range for \"{url}\"", None)
+                        continue
+                else:
+                    # full content -> server ignored the range, the file changed
+                    # since the .part file was started (If-Range didn't match)
+                    # or we didn't send one
+                    if offset:
+                        logger.info("Server sent the whole file for %s, restarting "
+                                    "the download", fn)
+                    offset = 0
+                    supports_ranges = (
+                        meta.get("Accept-Ranges", "").strip().lower() == "bytes")
+                    validator = response_validator(meta)
+                    write_part_validator(part_fn, validator)
+                    if meta["Content-Length"] is not None:
+                        reported_file_size = int(meta["Content-Length"])
+
+                # by Alex Martelli
+                # Experiment a bit with various CHUNK sizes to find the "sweet spot" for
+                # your requirements
+                # CHUNK = 16 * 1024
+                file_size_dl = offset
+                chunk_size = 8192
+                with open(part_fn, 'ab' if offset else 'wb') as w:
+                    try:
+                        while True:
+                            chunk = response.read(chunk_size)
+
+                            if not chunk:
+                                break
+
+                            # not chunk_size since the last chunk will probably not be of
+                            # size chunk_size
+                            file_size_dl += len(chunk)
+                            w.write(chunk)
+                            # copy behaviour of urlretrieve reporthook
+                            if prog_bar:
+                                prog_bar_dl(1, file_size_dl, reported_file_size)
+                    except (OSError, http.client.HTTPException) as err:
+                        # connection got interrupted -> handled as short read below
+                        interrupted = True
+                        logger.debug("Connection interrupted while downloading %s: %s",
+                                     url, err)
+        except urllib.error.HTTPError as err:
+            if err.code != 416 or not offset:
+                raise
+            # requested range not satisfiable: either the .part file is already
+            # complete or it's stale
+            _, total = parse_content_range(err.headers.get("Content-Range"))
+            if total == offset:
+                finish_part_file(part_fn, filename)
+                return offset
+            logger.warning("Partial download of %s doesn't match, restarting", fn)
+            remove_part_file(part_fn)
+            offset = 0
+            resumes += 1
+            if resumes > max_resumes:
+                raise
+            continue
+
+        # from urlretrieve doc: urlretrieve() will raise ContentTooShortError when
+        # it detects that the amount of data available was less than the expected
+        # amount (which is the size reported by a Content-Length header). This can
+        # occur, for example, when the download is interrupted.
+        # The Content-Length is treated as a lower bound: if there’s more data to
+        # read, urlretrieve reads more data, but if less data is available, it
+        # raises the exception.
+        # without a reported size only a clean end of the response means the
+        # file is complete
+        if (file_size_dl >= reported_file_size if reported_file_size >= 0
+                else not interrupted):
+            finish_part_file(part_fn, filename)
+            return file_size_dl
+
+        if supports_ranges and resumes < max_resumes:
+            resumes += 1
+            logger.info("Download of %s was interrupted at %d of %d bytes, resuming...",
+                        fn, file_size_dl, reported_file_size)
+            offset = file_size_dl
+            continue
+
+        if not supports_ranges:
+            # can't be resumed anyway
+            remove_part_file(part_fn)
         raise ContentTooShortError(
             f"Downloaded file's size is samller than the reported size for \"{url}\"",
             None)
-    else:
-        return file_size_dl
 
 
 def get_url_file_size(url: str) -> int:
-    """Returns file size in bytes that is reported in Content-Length Header"""
-    with urllib.request.urlopen(url) as response:
-        reported_file_size = int(response.info()["Content-Length"])
-    return reported_file_size
+    """
+    Returns file size in bytes that is reported in Content-Length Header
+    or -1 if the server doesn't report it
+
+    Falls back to a GET request (only the headers are read) if the server doesn't
+    support HEAD or doesn't send a Content-Length for it
+    """
+    try:
+        with get_scheduler().request(url), \
+                urlopen(url, DEFAULT_HEADERS, method="HEAD") as response:
+            content_length = response.info()["Content-Length"]
+    except urllib.error.HTTPError as err:
+        logger.debug("HEAD request failed with HTTP Error %s: \"%s\"", err.code, url)
+        content_length = None
+
+    if content_length is None:
+        # closing the response without reading the body aborts the download
+        with get_scheduler().request(url), urlopen(url, DEFAULT_HEADERS) as response:
+            content_length = response.info()["Content-Length"]
+    return int(content_length) if content_length is not None else -1
 
 
 def prog_bar_dl(blocknum: int, blocksize: int, totalsize: int) -> None:
@@ -228,16 +694,147 @@ if getattr(sys, 'frozen', False):
         ffmpeg_exe = ffmpeg_base + ".exe"
         BUNDLED_FFMPEG = shutil.which(ffmpeg_exe)
 
+# NOTE: default of 1 seems to work for erocast, which results in a sleep time of 0.5s
+# after the first failure; in seconds
+HLS_BACKOFF_FACTOR = 1
+# in seconds
+HLS_MAX_BACKOFF = 64
+HLS_MAX_RETRIES = 8
 
-def download_hls_ffmpeg(
-    m3u8_url, filename,
-    show_progress: bool = True,
+
+def download_bytes(url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+    """
+    Downloads url into memory, meant for small files like HLS segments
+
+    :raises ContentTooShortError: if the connection dropped before the whole
+                                  body was received
+    """
+    with get_scheduler().request(url), \
+            urlopen(url, headers if headers is not None else DEFAULT_HEADERS) as response:
+        reported_size = int(response.headers.get("Content-Length", -1))
+        try:
+            data = response.read()
+        except http.client.IncompleteRead as err:
+            data = err.partial
+        except (OSError, http.client.HTTPException):
+            data = b""
+
+    if not data or (reported_size >= 0 and len(data) < reported_size):
+        raise ContentTooShortError(
+            f"Download incomplete: Got only {len(data)} out of {reported_size} bytes",
+            data)
+    return data
+
+
+def fetch_hls_segment(url: str,
+                      max_retries: int = HLS_MAX_RETRIES,
+                      backoff_factor: float = HLS_BACKOFF_FACTOR,
+                      max_backoff: float = HLS_MAX_BACKOFF) -> bytes:
+    """
+    Downloads a single HLS segment into memory, only sleeping (with exponential
+    backoff) after failed attempts
+    Re-raises the last exception once max_retries is exceeded or for HTTPErrors
+    that won't go away by retrying
+    """
+    retries = 0
+    while True:
+        try:
+            return download_bytes(url)
+        except urllib.error.HTTPError as err:
+            if err.code not in (429, 500, 502, 503, 504) or retries >= max_retries:
+                raise
+            if err.code == 429:
+                logger.debug("Hit request limit while downloading... backing off...")
+        except (ContentTooShortError, urllib.error.URLError):
+            if retries >= max_retries:
+                raise
+
+        retries += 1
+        time.sleep(min(max_backoff, backoff_factor * 2 ** (retries - 1)))
+
+
+def iter_hls_segments(parts: List[str], concurrency: int = 1,
+                      show_progress: bool = True) -> Iterator[bytes]:
+    """
+    Downloads the segments `parts` using `concurrency` threads and yields their
+    contents in playlist order, independent of the order the downloads finish in
+
+    At most 2 * concurrency segments are buffered in memory, so a slow consumer
+    (e.g. the disk or ffmpeg) throttles the downloads
+    Closing the generator early cancels the segments that haven't been started yet
+    """
+    num_parts = len(parts)
+    concurrency = max(1, concurrency)
+    window = 2 * concurrency
+    pending: Deque[concurrent.futures.Future] = collections.deque()
+
+    if show_progress:
+        print("Downloading TS-parts of the m3u8 playlist:")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        next_part = 0
+        try:
+            for i in range(num_parts):
+                while next_part < num_parts and len(pending) < window:
+                    pending.append(executor.submit(fetch_hls_segment, parts[next_part]))
+                    next_part += 1
+
+                data = pending.popleft().result()
+                if show_progress:
+                    print(f"\r{i + 1}/{num_parts}", end="")
+                yield data
+        finally:
+            # fail fast: don't start the remaining segments
+            for fut in pending:
+                fut.cancel()
+
+    if show_progress:
+        print()
+
+
+def hls_needs_remux(filename: str) -> bool:
+    """
+    Whether the concatenated MPEG-TS segments need to be put into a different
+    container, which we can't do in-process, to be saved as filename
+    """
+    return os.path.splitext(filename)[1].lower() not in (".ts", ".m2ts", ".mts")
+
+
+def find_ffmpeg(ffmpeg_executable: Optional[str] = None) -> Optional[str]:
     # prefer the bundled ffmpeg by default
-    ffmpeg_executable: str = BUNDLED_FFMPEG or 'ffmpeg'
+    return shutil.which(ffmpeg_executable or BUNDLED_FFMPEG or 'ffmpeg')
+
+
+def download_hls(
+    m3u8_url: str, filename: str,
+    show_progress: bool = True,
+    ffmpeg_executable: Optional[str] = None,
+    concurrency: Optional[int] = None
 ) -> bool:
-    if shutil.which(ffmpeg_executable) is None:
-        logger.error("No ffmpeg executable found! Aborting download!")
-        return False
+    """
+    Downloads the HLS stream `m3u8_url` to filename
+
+    MPEG-TS segments can just be concatenated, so the segments are streamed straight
+    into the output file while they're being downloaded if filename has a .ts extension
+    Otherwise ffmpeg is only used for remuxing into the target container, with the
+    segments piped into its stdin, so the segments never touch the disk
+
+    :param concurrency: Number of segments that are downloaded concurrently; uses
+                        the [Settings] option hls_concurrency if None
+    :raises: HTTPError, URLError or ContentTooShortError if a segment couldn't be
+             downloaded
+    :return: False if the playlist couldn't be retrieved or ffmpeg failed/is missing
+    """
+    ffmpeg = None
+    if hls_needs_remux(filename):
+        ffmpeg = find_ffmpeg(ffmpeg_executable)
+        if ffmpeg is None:
+            logger.error("No ffmpeg executable found, which is needed for saving a "
+                         "HLS stream as %s! Aborting download!",
+                         os.path.splitext(filename)[1])
+            return False
+
+    if concurrency is None:
+        concurrency = config.config.getint("Settings", "hls_concurrency", fallback=4)
 
     # TODO: add max retries or timeout
     res, err_code = download_text(DEFAULT_HEADERS, m3u8_url)
@@ -246,90 +843,83 @@ def download_hls_ffmpeg(
         return False
 
     parts = PARTS_RE.findall(res)
-
-    i = 0
-    num_parts = len(parts)
-    # NOTE: default of 1 seems to work for erocast, which results in a default sleep time of 0.5s
-    # in seconds
-    backoff_factor = 1
-    retries = 0
-    # in seconds
-    max_backoff = 64
-
-    tmp_dir = os.path.join(config.get_root(), "_tmp")
-    os.makedirs(tmp_dir, exist_ok=True)
-    ts_files = []
-
-    print("Downloading TS-parts of the m3u8 playlist:")
-    while i < num_parts:
-        url = parts[i]
-        rel_fn = url.rsplit("/", 1)[1]
-        full_fn = os.path.join(tmp_dir, rel_fn)
-
-        if show_progress:
-            print(f"\r{i + 1}/{num_parts}", end="")
-
-        try:
-            download_in_chunks(url, full_fn, headers=DEFAULT_HEADERS)
-        except ContentTooShortError:
-            # retry
-            retries += 1
-        except urllib.error.HTTPError as e:
-            if e.code == 429:
-                logger.debug(
-                    "Hit request limit while downloading... backing off...", )
-                # too many requests -> sleep more and retry
-                retries += 1
-            else:
-                raise e
+    segments = iter_hls_segments(parts, concurrency=concurrency,
+                                 show_progress=show_progress)
+    try:
+        if ffmpeg is None:
+            _concat_segments(segments, filename)
+            return True
         else:
-            i += 1
-            # a successful attempt decrease the retries and thus the sleeping time
-            # otherwise we might be stuck at the max_backoff
-            retries = max(0, retries - 1)
-            # add to ts_files after successful download
-            ts_files.append(rel_fn)
+            return _remux_segments_ffmpeg(segments, filename, ffmpeg)
+    finally:
+        segments.close()
 
-        time_to_sleep = min(max_backoff, backoff_factor * 2 ** (retries - 1))
-        time.sleep(time_to_sleep)
 
-    if show_progress:
-        print("\nMerging parts with ffmpeg")
-
-    # write concatenation list for ffmpeg
-    # passing it through stdin using -i pipe: is wonky
-    # NOTE: we need to use paths relative to the concat file list, since / and \ etc.
-    # are not considered safe characters
-    concat_list_fn = os.path.join(tmp_dir, "parts_list.txt")
-    with open(concat_list_fn, "w", encoding="utf-8") as f:
-        f.write("\n".join(f"file '{ts}'" for ts in ts_files))
-
-    # -vn: no vieo; -acodec copy: copy audio codec
-    # NOTE: the path to the concat file apparently needs to use all / even on Windows
-    args = [ffmpeg_executable, '-hide_banner', '-f', 'concat', '-i',
-            concat_list_fn.replace("\\", "/"), '-vn', '-acodec', 'copy',
-            filename]
-    ffmpeg_success = False
+def _concat_segments(segments: Iterator[bytes], filename: str) -> None:
+    # write to a tmp file first so an aborted download doesn't leave a truncated
+    # file that looks complete
+    tmp_filename = f"{filename}.part"
     try:
-        subprocess.run(args, capture_output=True, check=True)
-    except FileNotFoundError:
-        logger.error("Missing ffmpeg executable! Aborting merge...")
-    except subprocess.CalledProcessError as err:
-        logger.error("FFmpeg concatentation error: %s", str(err))
-        logger.debug("FFmpeg stdout: %s", err.stdout)
-        logger.debug("FFmpeg stderr: %s", err.stderr)
-    else:
-        ffmpeg_success = True
+        with open(tmp_filename, "wb") as f:
+            for data in segments:
+                f.write(data)
+    except BaseException:
+        _remove_silently(tmp_filename)
+        raise
+
+    os.replace(tmp_filename, filename)
+
+
+def _remux_segments_ffmpeg(segments: Iterator[bytes], filename: str, ffmpeg: str) -> bool:
+    # -f mpegts -i pipe:0: read the concatenated segments from stdin
+    # -vn: no video; -acodec copy: copy audio codec
+    args = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'mpegts', '-i', 'pipe:0', '-vn', '-acodec', 'copy', filename]
+    # NOTE: stderr goes to a file, since nobody would read from a pipe while we're
+    # writing to stdin -> ffmpeg could block once the pipe buffer is full
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            proc = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                    stdout=subprocess.DEVNULL, stderr=stderr)
+        except OSError:
+            logger.error("Missing ffmpeg executable! Aborting merge...")
+            return False
 
-    # clean up
-    os.remove(concat_list_fn)
-    for ts in ts_files:
+        proc_stdin = cast(IO[bytes], proc.stdin)
         try:
-            os.remove(os.path.join(tmp_dir, ts))
-        except FileNotFoundError:
-            pass
+            try:
+                for data in segments:
+                    proc_stdin.write(data)
+            except BrokenPipeError:
+                # ffmpeg exited early, error gets reported below
+                pass
+            finally:
+                try:
+                    proc_stdin.close()
+                except BrokenPipeError:
+                    pass
+            returncode = proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            _remove_silently(filename)
+            raise
+
+        if returncode != 0:
+            stderr.seek(0)
+            logger.error("FFmpeg remuxing error: exit code %d", returncode)
+            logger.debug("FFmpeg stderr: %s", stderr.read())
+            _remove_silently(filename)
+            return False
 
-    return ffmpeg_success
+    return True
+
+
+def _remove_silently(filename: str) -> None:
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
 
 
 def download_text(headers, url: str,
@@ -338,13 +928,12 @@ def download_text(headers, url: str,
     res: Optional[str] = None
     http_code: Optional[int] = None
 
-    req = urllib.request.Request(url, headers=headers)
     if additional_headers is not None:
-        for k, v in additional_headers.items():
-            req.add_header(k, v)
+        headers = {**headers, **additional_headers}
 
     try:
-        site = urllib.request.urlopen(req)
+        with get_scheduler().request(url), urlopen(url, headers) as site:
+            response = site.read()
     except urllib.error.HTTPError as err:
         http_code = err.code
         logger.warning("HTTP Error %s: %s: \"%s\"", err.code, err.reason, url)
@@ -354,9 +943,6 @@ def download_text(headers, url: str,
         # doesn’t exist
         logger.warning("URL Error: %s (url: %s)", err.reason, url)
     else:
-        response = site.read()
-        site.close()
-
         # try to read encoding from headers otherwise use utf-8 as fallback
         encoding = site.headers.get_content_charset()
         res = response.decode(encoding.lower() if encoding else "utf-8")
@@ -1,7 +1,9 @@
+import functools
+
 from enum import Enum, unique, auto
-from typing import Type, Optional, Sequence, Dict
+from typing import Type, Optional, Sequence, Dict, Tuple
 
-from .base import BaseExtractor
+from .base import BaseExtractor, url_domain
 from .reddit import RedditExtractor
 from .soundgasm import SoundgasmExtractor, SoundgasmUserExtractor
 from .eraudica import EraudicaExtractor
@@ -51,8 +53,28 @@ EXTRACTOR_TO_HOST: Dict[Type[BaseExtractor], AudioHost] = {
 }
 
 
+def _build_host_index(
+        extractors: Sequence[Type[BaseExtractor]]) -> Dict[str, Tuple[Type[BaseExtractor], ...]]:
+    index: Dict[str, Tuple[Type[BaseExtractor], ...]] = {}
+    for extractor in extractors:
+        key = url_domain(extractor.BASE_URL)
+        # keeps the order of AVAILABLE_EXTRACTORS for extractors sharing a domain
+        index[key] = index.get(key, ()) + (extractor,)
+    return index
+
+
+# NOTE: IMPORTANT extractors must only be compatible with urls on the domain
+# (sub-domains included) of their BASE_URL, since find_extractor only tries the
+# extractors that are registered for the domain of the url
+HOST_TO_EXTRACTORS: Dict[str, Tuple[Type[BaseExtractor], ...]] = _build_host_index(
+    AVAILABLE_EXTRACTORS)
+
+
+# cached since e.g. reddit submissions often link the same urls and RedditExtractor
+# looks up every link in the selftext multiple times
+@functools.lru_cache(maxsize=16384)
 def find_extractor(url: str) -> Optional[Type[BaseExtractor]]:
-    for extractor in AVAILABLE_EXTRACTORS:
+    for extractor in HOST_TO_EXTRACTORS.get(url_domain(url), ()):
         if extractor.is_compatible(url):
             return extractor
     return None
@@ -2,10 +2,12 @@ import urllib.request
 import urllib.error
 import logging
 import re
+import itertools
+import concurrent.futures
 
 from typing import (
         Optional, Dict, Union, ClassVar, Tuple, List, Any, TypeVar, Generic,
-        Pattern
+        Pattern, AbstractSet, Match, cast, Sequence, Type, Generator
         )
 from enum import Enum, auto, unique
 
@@ -82,6 +84,57 @@ class ExtractorReport:
         self.children = []
 
 
+# optional scheme and user info followed by the hostname
+URL_HOST_RE: Pattern = re.compile(r"^(?:[A-Za-z][-A-Za-z0-9+.]*:)?(?://)?(?:[^/?#@]*@)?([^/?#:]*)")
+
+
+def url_domain(url: str) -> str:
+    """
+    Returns the last two labels of url's lower-cased hostname, which is what urls
+    get dispatched on; also works for urls without a scheme like BASE_URL
+    NOTE: faster than ratelimit.host_key (matters when dispatching thousands of
+    links) but doesn't validate the url
+    """
+    host = cast(Match, URL_HOST_RE.match(url)).group(1)
+    return ".".join(host.lower().rsplit(".", 2)[-2:])
+
+
+# :PreflightKnownUrls
+# URLs of files that are already in the DB, set by GWARipper.download_all so
+# extractors can skip them _before_ fetching anything from the network; empty
+# means nothing gets skipped
+# NOTE: collections aren't included, since a collection is added to the DB as soon
+# as one of its files was downloaded, so children that failed would never be retried
+_known_urls: AbstractSet[str] = frozenset()
+
+
+def set_known_urls(urls: Optional[AbstractSet[str]]) -> None:
+    global _known_urls
+    _known_urls = urls if urls is not None else frozenset()
+
+
+def is_known_url(url: str) -> bool:
+    return url in _known_urls
+
+
+def known_url_report(url: str) -> ExtractorReport:
+    logger.info("Skipping already downloaded URL: %s", url)
+    return ExtractorReport(url, ExtractorErrorCode.NO_ERRORS,
+                           DownloadErrorCode.SKIPPED_DUPLICATE)
+
+
+def known_file_result(url: str, extractor: Type['BaseExtractor']) -> Tuple[
+        'info.FileInfo', ExtractorReport]:
+    """
+    Placeholder for a known file in a collection, so the collection keeps the same
+    children (and the same file numbering and sub-directory) as when all of them
+    are extracted; the file is skipped as duplicate when downloading
+    """
+    fi = info.FileInfo(extractor, True, "", url, url, None, None, None, None)
+    fi.downloaded = DownloadErrorCode.SKIPPED_DUPLICATE
+    return fi, known_url_report(url)
+
+
 T = TypeVar('T')
 
 
@@ -114,6 +167,11 @@ class BaseExtractor(Generic[T]):
     # should be considered broken
     is_broken: ClassVar[bool] = False
 
+    # whether a top-level URL that is already in the DB can be skipped without
+    # extracting it, see :PreflightKnownUrls
+    # False for extractors whose result can change over time, e.g. user pages
+    skip_known_urls: ClassVar[bool] = True
+
     # message for logging error codes
     err_value_msg: Dict[int, str] = {
         ExtractorErrorCode.BROKEN_EXTRACTOR.value: "",
@@ -135,19 +193,32 @@ class BaseExtractor(Generic[T]):
 
     # known URL patterns that can contain audio sources but are not yet supported
     # used to include them in the ExtractorReport as unsupported audio links
-    FILTER_URLS_RE: ClassVar[List[Pattern]] = [
-            re.compile(r"^(?:https?://)?(?:www\.)?soundcloud\.com/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?clyp.it/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?(?:youtube\.com|youtu\.be)/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?vocaroo\.com/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?sndup\.net/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?patreon\.com/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?psstaudio\.com/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?literotica\.com/", re.IGNORECASE),
-            re.compile(r"^(?:https?://)?(?:www\.)?newgrounds\.com/audio/", re.IGNORECASE),
+    # keyed by the url_domain of the domain(s) they match, so is_unsupported_audio_url
+    # only needs to try the patterns of the url's domain
+    FILTER_URLS_BY_HOST: ClassVar[Dict[str, List[Pattern]]] = {
+            "soundcloud.com": [
+                re.compile(r"^(?:https?://)?(?:www\.)?soundcloud\.com/", re.IGNORECASE)],
+            "clyp.it": [re.compile(r"^(?:https?://)?(?:www\.)?clyp.it/", re.IGNORECASE)],
+            "youtube.com": [re.compile(
+                r"^(?:https?://)?(?:www\.)?(?:youtube\.com|youtu\.be)/", re.IGNORECASE)],
+            "vocaroo.com": [
+                re.compile(r"^(?:https?://)?(?:www\.)?vocaroo\.com/", re.IGNORECASE)],
+            "sndup.net": [re.compile(r"^(?:https?://)?(?:www\.)?sndup\.net/", re.IGNORECASE)],
+            "patreon.com": [
+                re.compile(r"^(?:https?://)?(?:www\.)?patreon\.com/", re.IGNORECASE)],
+            "psstaudio.com": [
+                re.compile(r"^(?:https?://)?(?:www\.)?psstaudio\.com/", re.IGNORECASE)],
+            "literotica.com": [
+                re.compile(r"^(?:https?://)?(?:www\.)?literotica\.com/", re.IGNORECASE)],
+            "newgrounds.com": [
+                re.compile(r"^(?:https?://)?(?:www\.)?newgrounds\.com/audio/", re.IGNORECASE)],
             # NOTE: so users can see there should be an audio on patreon
-            re.compile(r"^(?:https?://)?(?:www\.)?skittykat\.cc/exclusive/$", re.IGNORECASE),
-            ]
+            "skittykat.cc": [
+                re.compile(r"^(?:https?://)?(?:www\.)?skittykat\.cc/exclusive/$", re.IGNORECASE)],
+            }
+    FILTER_URLS_BY_HOST["youtu.be"] = FILTER_URLS_BY_HOST["youtube.com"]
+    FILTER_URLS_RE: ClassVar[List[Pattern]] = list(dict.fromkeys(
+        itertools.chain.from_iterable(FILTER_URLS_BY_HOST.values())))
 
 
     # NOTE: workaround to get type checking to work with passing differently
@@ -196,7 +267,12 @@ class BaseExtractor(Generic[T]):
         report = ExtractorReport(url, ExtractorErrorCode.BROKEN_EXTRACTOR)
         result: Optional[Union['info.FileInfo', 'info.FileCollection']] = None
 
-        if cls.is_broken:
+        if parent is None and cls.skip_known_urls and is_known_url(url):
+            # NOTE: only top-level urls are skipped here, since skipping children
+            # would change the numbering of the files in a collection or which mirror
+            # gets chosen; extractors check their children themselves
+            report = known_url_report(url)
+        elif cls.is_broken:
             logger.warning("Skipping URL '%s' due to broken extractor: %s",
                            url, cls.EXTRACTOR_NAME)
         else:
@@ -229,6 +305,14 @@ class BaseExtractor(Generic[T]):
                 # only log/print if no exc was raised since exc already get logged above
                 cls.log_report(report)
 
+        BaseExtractor.attach_result(result, report, parent, parent_report)
+        return result, report
+
+    @staticmethod
+    def attach_result(result: Optional[Union['info.FileInfo', 'info.FileCollection']],
+                      report: ExtractorReport,
+                      parent: Optional['info.FileCollection'] = None,
+                      parent_report: Optional[ExtractorReport] = None) -> None:
         if result is not None:
             if parent is not None:
                 if isinstance(result, info.FileCollection):
@@ -243,7 +327,6 @@ class BaseExtractor(Generic[T]):
             if (report.err_code != ExtractorErrorCode.NO_ERRORS and
                     parent_report.err_code == ExtractorErrorCode.NO_ERRORS):
                 parent_report.err_code = ExtractorErrorCode.ERROR_IN_CHILDREN
-        return result, report
 
     @classmethod
     def log_report(cls, report: ExtractorReport):
@@ -280,7 +363,7 @@ class BaseExtractor(Generic[T]):
     @classmethod
     def is_unsupported_audio_url(cls, url: str) -> bool:
         return any(filtered_re.match(url) for filtered_re in
-                   cls.FILTER_URLS_RE)
+                   cls.FILTER_URLS_BY_HOST.get(url_domain(url), ()))
 
     @classmethod
     def get_html(cls, url: str,
@@ -289,6 +372,57 @@ class BaseExtractor(Generic[T]):
         return download_text(cls.headers, url, additional_headers=additional_headers)
 
 
+def extract_children(
+        parent: 'info.FileCollection', parent_report: ExtractorReport,
+        children: Sequence[Tuple[str, Type[BaseExtractor]]],
+        max_workers: Optional[int] = None) -> None:
+    """
+    Starts extracting `children` (url, extractor) on a thread pool and makes them
+    pending children of parent, so the ones that were already extracted can be
+    downloaded while the rest is still being extracted
+    Results get attached to parent and parent_report in the order of `children`
+    (see FileCollection.iter_children)
+
+    NOTE: children that were already downloaded aren't extracted (:PreflightKnownUrls),
+    so only use this for collections of files that are independent of each other
+    NOTE: must not be used for reddit submissions, see
+    FileCollection.get_preferred_author_name
+
+    :param max_workers: Uses [Settings] extract_concurrency if None
+    """
+    if max_workers is None:
+        max_workers = config.config.getint("Settings", "extract_concurrency", fallback=4)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers))
+    # NOTE: workers only extract, attaching happens when the parent's pending
+    # children are advanced, so the FileCollection is only ever modified by
+    # the thread that consumes it
+    futures: List['concurrent.futures.Future'] = []
+    for url, extractor in children:
+        if is_known_url(url):
+            # known files keep their place in the collection without fetching their page
+            fut: 'concurrent.futures.Future' = concurrent.futures.Future()
+            fut.set_result(known_file_result(url, extractor))
+        else:
+            fut = executor.submit(extractor.extract, url)
+        futures.append(fut)
+    # queued futures still run, the threads exit once they're done
+    executor.shutdown(wait=False)
+
+    def attach_in_order() -> Generator[None, None, None]:
+        try:
+            for fut in futures:
+                result, report = fut.result()
+                BaseExtractor.attach_result(result, report, parent, parent_report)
+                yield
+        finally:
+            # cancel the extractions that haven't started yet if the consumer stopped
+            for fut in futures:
+                fut.cancel()
+
+    parent.set_pending_children(attach_in_order())
+
+
 def title_has_banned_tag(
         title: str, keywordlist: List[str] = config.KEYWORDLIST,
         tag1_but_not_2: Optional[
@@ -8,13 +8,17 @@ from typing import Optional, cast, Pattern, ClassVar, List, Tuple, Type, TypeVar
 
 from praw.models import Submission
 
-from .base import BaseExtractor, ExtractorErrorCode, ExtractorReport, title_has_banned_tag
+from .base import (
+    BaseExtractor, ExtractorErrorCode, ExtractorReport, title_has_banned_tag,
+    is_known_url, known_url_report
+)
 from .soundgasm import SoundgasmUserExtractor
 # NOTE: IMPORTANT need to be imported as "import foo" rather than "from foo import bar"
 # see :GlobalConfigImport
 from .. import config
 from gwaripper import info
 from ..reddit import reddit_praw, redirect_xpost
+from ..download import DownloadErrorCode
 from ..exceptions import InfoExtractingError
 
 logger = logging.getLogger(__name__)
@@ -124,7 +128,12 @@ class RedditExtractor(BaseExtractor[Submission]):
                 # mb this would only return a list of found links?
                 extractor: Optional[Type[BaseExtractor]] = find_extractor(sub_url)
 
-                if extractor is not None:
+                if extractor is not None and is_known_url(sub_url):
+                    # :PreflightKnownUrls
+                    report.download_error_code = DownloadErrorCode.SKIPPED_DUPLICATE
+                    report.children.append(known_url_report(sub_url))
+                    return None, report
+                elif extractor is not None:
                     logger.info("%s link found in URL of: %s", extractor.EXTRACTOR_NAME,
                                 submission.permalink)
                     fi, child_report = extractor.extract(sub_url, parent=ri,
@@ -150,6 +159,18 @@ class RedditExtractor(BaseExtractor[Submission]):
                 # css selector -> tag a with set href attribute
                 links = soup.select('a[href]')
 
+                # :PreflightKnownUrls
+                # only skip the submission if _all_ supported links are known, otherwise
+                # mirror selection and file numbering would differ from a full extraction
+                supported_hrefs = [
+                    link["href"] for link in links
+                    if find_extractor(link["href"]) not in (
+                        None, type(self), SoundgasmUserExtractor)]
+                if supported_hrefs and all(is_known_url(href) for href in supported_hrefs):
+                    report.download_error_code = DownloadErrorCode.SKIPPED_DUPLICATE
+                    report.children.extend(known_url_report(href) for href in supported_hrefs)
+                    return None, report
+
                 # TODO i.redd.it is always a direct link append FileInfo for it here
                 # without extractor?
                 for link in links:
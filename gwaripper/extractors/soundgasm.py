@@ -4,7 +4,10 @@ import bs4
 
 from typing import Optional, Union, cast, Match, ClassVar, Pattern, Tuple, Any
 
-from .base import BaseExtractor, ExtractorReport, ExtractorErrorCode, title_has_banned_tag
+from .base import (
+    BaseExtractor, ExtractorReport, ExtractorErrorCode, title_has_banned_tag,
+    extract_children
+)
 from gwaripper import info
 from ..exceptions import InfoExtractingError
 
@@ -72,6 +75,9 @@ class SoundgasmUserExtractor(BaseExtractor):
             r"(?:https?://)?(?:www\.)?soundgasm\.net/(?:u|user)/([-A-Za-z0-9_]+)/?",
             re.IGNORECASE)
 
+    # user might have uploaded new files since
+    skip_known_urls: ClassVar[bool] = False
+
     # NOTE: dont use init_from unless you change base class to BaseExtractor[type of init_from]
     def __init__(self, url: str, init_from: Optional[Any] = None):
         super().__init__(url, init_from)
@@ -113,8 +119,10 @@ class SoundgasmUserExtractor(BaseExtractor):
 
         report = ExtractorReport(self.url, ExtractorErrorCode.NO_ERRORS)
         fcol = info.FileCollection(self.__class__, self.url, self.author, self.author, self.author)
-        for url in user_files:
-            fi, extr_report = SoundgasmExtractor.extract(url, parent=fcol,
-                                                         parent_report=report)
+        # files get extracted in the background so the first ones can already
+        # be downloaded while the rest of the (possibly hundreds of) pages are fetched
+        # NOTE: files are independent of each other so known ones get skipped
+        # without fetching their pages
+        extract_children(fcol, report, [(url, SoundgasmExtractor) for url in user_files])
 
         return fcol, report
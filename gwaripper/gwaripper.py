@@ -8,6 +8,8 @@ import urllib.request
 import urllib.error
 import dataclasses
 import sqlite3
+import threading
+import concurrent.futures
 
 import praw
 
@@ -24,10 +26,11 @@ from .info import (
 from . import download as dl
 from . import exceptions
 from .reddit import reddit_praw
-from .db import load_or_create_sql_db, export_table_to_csv, backup_db
+from .db import (
+    load_or_create_sql_db, export_changes_to_csv, backup_db, seconds_until_next_backup
+)
 from .file_tags import update_meta_tags
-
-rqd = utils.RequestDelayer(0.25, 0.75)
+from .ratelimit import get_scheduler
 
 # configure logging
 # logfn = time.strftime("%Y-%m-%d.log")
@@ -121,6 +124,7 @@ class GWARipper:
     skip_non_audio: Final[bool]
     only_one_mirror: Final[bool]
     host_priority: Final[List['extr.AudioHost']]
+    max_workers: Final[int]
 
     # we can only omit -> None if at least one arg is typed otherwise it is
     # considered an untyped method
@@ -129,11 +133,31 @@ class GWARipper:
                  skip_non_audio: bool = False,
                  dont_write_selftext: bool = False,
                  only_one_mirror: bool = False,
-                 host_priority: Optional[List['extr.AudioHost']] = None) -> None:
+                 host_priority: Optional[List['extr.AudioHost']] = None,
+                 max_workers: int = 1) -> None:
         # TODO @CleanUp remove all dependencies on config, the class should be passed all the relevant
         # setting through init -> easiert to test, more robust etc.
+
+        # NOTE: max_workers > 1 means that download_all extracts and downloads the
+        # passed in urls/submissions concurrently using a thread pool
+        # the db connection will then be shared between the worker threads
+        # and all access to it has to be serialized using self._db_lock
+        # (single writer) since the sqlite3 module only serializes
+        # calls on the C-level but not our transactions
+        self.max_workers = max(1, max_workers)
         self.db_con, _ = load_or_create_sql_db(
-            os.path.join(config.get_root(), "gwarip_db.sqlite"))
+            os.path.join(config.get_root(), "gwarip_db.sqlite"),
+            check_same_thread=self.max_workers == 1)
+        # RLock since set_missing_reddit_db gets called from already_downloaded
+        self._db_lock = threading.RLock()
+        # guards filenames that were chosen by a worker but might not be
+        # on disk yet, so two workers don't pick the same filename
+        self._fs_lock = threading.Lock()
+        self._reserved_paths: Set[str] = set()
+        # page urls that are currently being downloaded by one of the workers
+        # so the same file isn't downloaded twice when it's
+        # e.g. linked in two different submissions
+        self._claimed_urls: Set[str] = set()
         self.urls: List[str] = []
         self.nr_urls: int = 0
         self.extractor_reports: List[extr.base.ExtractorReport] = []
@@ -154,10 +178,7 @@ class GWARipper:
         # suppress the exception by returning a true value from this method. If
         # you don't want to suppress errors then you can return a value that
         # evaluates to False.
-        export_table_to_csv(
-            self.db_con,
-            os.path.join(config.get_root(), "gwarip_db_exp.csv"),
-            "v_audio_and_collection_combined")
+        self.export_csv()
         self.db_con.close()
 
         # so download report will always be written even on KeyboardInterrupt
@@ -165,34 +186,63 @@ class GWARipper:
             self.write_report(self.extractor_reports)
             logger.info("Download report was written to folder _reports")
 
+        get_scheduler().log_stats()
+        logger.debug("HTTP connection pool: %s", dl.get_pool().stats())
+
         # auto backup
         backup_db(os.path.join(config.get_root(), "gwarip_db.sqlite"),
                   os.path.join(config.get_root(), "_db-autobu"))
         return None
 
+    def export_csv(self) -> None:
+        """
+        Appends the files that changed since the last export to gwarip_db_exp.csv;
+        re-writes the whole file (dropping outdated and removed rows) when the
+        DB backup is due, see backup_db
+        """
+        since_change_seq: Optional[int] = None
+        if seconds_until_next_backup() >= 0:
+            since_change_seq = config.config.getint(
+                "Time", "last_csv_export_change", fallback=None)
+        change_seq = export_changes_to_csv(
+            self.db_con,
+            os.path.join(config.get_root(), "gwarip_db_exp.csv"),
+            "v_audio_and_collection_combined", since_change_seq)
+        if config.config.has_section("Time"):
+            config.config["Time"]["last_csv_export_change"] = str(change_seq)
+        else:
+            config.config["Time"] = {"last_csv_export_change": str(change_seq)}
+        config.write_config_module()
+
     def set_urls(self, urls: List[str]):
-        # NOTE: deduplicates urls
-        self.urls = list(set(urls))
+        # NOTE: deduplicates urls while keeping the order they were passed in
+        # so the order of the reports is stable
+        self.urls = list(dict.fromkeys(urls))
         self.nr_urls = len(self.urls)
 
     def extract_and_download(self, url: str) -> None:
+        self.extractor_reports.append(self._extract_and_download(url))
+
+    def _extract_and_download(self, url: str) -> extr.base.ExtractorReport:
         extractor = extr.find_extractor(url)
         if extractor is None:
-            self.extractor_reports.append(
-                extr.base.ExtractorReport(url, extr.base.ExtractorErrorCode.NO_EXTRACTOR))
             logger.warning("Found no extractor for URL: %s", url)
-            return None
+            return extr.base.ExtractorReport(url, extr.base.ExtractorErrorCode.NO_EXTRACTOR)
 
         info, extr_report = extractor.extract(url)
-        if info is None:
-            self.extractor_reports.append(extr_report)
-            return None
+        if info is not None:
+            self.download(info)
 
-        self.download(info)
-        self.extractor_reports.append(extr_report)
+        return extr_report
 
     def parse_and_download_submission(self, sub: praw.models.Submission,
                                       reddit_url: str = "https://www.reddit.com") -> None:
+        self.extractor_reports.append(
+            self._parse_and_download_submission(sub, reddit_url=reddit_url))
+
+    def _parse_and_download_submission(
+            self, sub: praw.models.Submission,
+            reddit_url: str = "https://www.reddit.com") -> extr.base.ExtractorReport:
         url = f"{reddit_url}{sub.permalink}"
         # init_from not type-checked for Submission since praw doesn't have
         # type hints
@@ -200,7 +250,7 @@ class GWARipper:
             url, init_from=sub)
         if info is not None:
             self.download(info)
-        self.extractor_reports.append(extr_report)
+        return extr_report
 
     def write_report(self, reports: List[extr.base.ExtractorReport]):
         # parsing report!
@@ -304,18 +354,96 @@ class GWARipper:
                         "from reddit if they were previously downloaded from the site "
                         "directly. You can disable this in the settings")
 
-        if sub_list is None:
-            for idx, url in enumerate(self.urls):
-                logger.info("Processing URL %d of %d: %s",
-                            idx + 1, self.nr_urls, url)
-                self.extract_and_download(url)
-        else:
-            nr_subs = len(sub_list)
-            idx = 1
-            for sub in sub_list:
-                logger.info("Processing submission %d of %d: %s",
-                            idx, nr_subs, sub.permalink)
-                self.parse_and_download_submission(sub)
+        if not self.download_duplicates:
+            # pre-flight: known urls get skipped by the extractors before any
+            # html is fetched, see :PreflightKnownUrls
+            extr.base.set_known_urls(self.load_known_urls())
+        try:
+            if self.max_workers > 1:
+                self._download_all_concurrent(sub_list)
+                return
+
+            if sub_list is None:
+                for idx, url in enumerate(self.urls):
+                    logger.info("Processing URL %d of %d: %s",
+                                idx + 1, self.nr_urls, url)
+                    self.extract_and_download(url)
+            else:
+                nr_subs = len(sub_list)
+                for idx, sub in enumerate(sub_list):
+                    logger.info("Processing submission %d of %d: %s",
+                                idx + 1, nr_subs, sub.permalink)
+                    self.parse_and_download_submission(sub)
+        finally:
+            extr.base.set_known_urls(None)
+
+    def load_known_urls(self) -> Set[str]:
+        """
+        Loads the urls of all files in the DB using a single query
+
+        NOTE: collection urls aren't loaded, since a collection is in the DB once any
+        of its files was downloaded; its files are checked one by one instead
+
+        If the setting set_missing_reddit is enabled, files that aren't part of a
+        collection are excluded, since they still might need to be updated with
+        reddit info when encountered in a submission
+        """
+        set_missing_reddit = config.config.getboolean(
+            "Settings", "set_missing_reddit", fallback=False)
+        with self._db_lock:
+            c = self.db_con.execute(f"""
+            SELECT url FROM AudioFile WHERE url IS NOT NULL
+                {'AND collection_id IS NOT NULL' if set_missing_reddit else ''}""")
+            known_urls = {row[0] for row in c}
+
+        logger.debug("Loaded %d known urls from the DB", len(known_urls))
+        return known_urls
+
+    def _download_all_concurrent(
+            self, sub_list: Optional[List[praw.models.Submission]] = None) -> None:
+        """
+        Same as download_all but runs the extraction and download of the
+        urls/submissions on a pool of self.max_workers threads
+
+        Reports are appended in the order the urls/submissions were passed in
+        and not in the order they finish, so the report stays the same as
+        in sequential mode
+        """
+        def process_url(idx: int, url: str) -> extr.base.ExtractorReport:
+            logger.info("Processing URL %d of %d: %s",
+                        idx + 1, self.nr_urls, url)
+            return self._extract_and_download(url)
+
+        def process_sub(idx: int, sub: praw.models.Submission) -> extr.base.ExtractorReport:
+            logger.info("Processing submission %d of %d: %s",
+                        idx + 1, nr_subs, sub.permalink)
+            return self._parse_and_download_submission(sub)
+
+        nr_subs = len(sub_list) if sub_list is not None else 0
+        futures: List[concurrent.futures.Future] = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                if sub_list is None:
+                    for idx, url in enumerate(self.urls):
+                        futures.append(executor.submit(process_url, idx, url))
+                else:
+                    for idx, sub in enumerate(sub_list):
+                        futures.append(executor.submit(process_sub, idx, sub))
+
+                # re-raises exceptions from the workers in the main thread
+                for fut in futures:
+                    fut.result()
+            except KeyboardInterrupt:
+                # only the ones that haven't started yet can be cancelled
+                # the executor will still wait on the running ones
+                for fut in futures:
+                    fut.cancel()
+                raise
+            finally:
+                # so the report contains all finished urls even on KeyboardInterrupt
+                self.extractor_reports.extend(
+                    fut.result() for fut in futures
+                    if fut.done() and not fut.cancelled() and fut.exception() is None)
 
     def download(self, info: Union[FileInfo, FileCollection]):
         if isinstance(info, FileInfo):
@@ -324,7 +452,12 @@ class GWARipper:
             self._download_collection(info, None)
 
     @staticmethod
-    def _pad_filename_if_exists(dirpath: str, filename: str, ext: str):
+    def _pad_filename_if_exists(dirpath: str, filename: str, ext: str,
+                                reserved: Optional[Set[str]] = None):
+        """
+        :param reserved: Set of full paths that should be treated as if they were
+                         already present on disk
+        """
         filename_old = filename
         i = 1
 
@@ -333,7 +466,8 @@ class GWARipper:
         # dont exceed win path limit)
         # count up i till file doesnt exist anymore
         # isfile works without checking if dir exists first
-        while os.path.isfile(os.path.join(dirpath, f"{filename}.{ext}")):
+        while (os.path.isfile(os.path.join(dirpath, f"{filename}.{ext}")) or (
+                reserved is not None and os.path.join(dirpath, f"{filename}.{ext}") in reserved)):
             i += 1
             # :02d -> pad number with 0 to a width of 2, d -> digit(int)
             filename = f"{filename_old}_{i:02d}"
@@ -343,7 +477,9 @@ class GWARipper:
 
     def _download_file(self, info: FileInfo, author_name: Optional[str],
                        top_collection: Optional[FileCollection], file_index: int = 0,
-                       dl_idx: int = 1, dl_max: int = 1) -> Optional[str]:
+                       dl_idx: int = 1, dl_max: int = 1,
+                       deferred_tags: Optional[List[Tuple[str, FileInfo]]] = None
+                       ) -> Optional[str]:
         """
         Will download the file to dl_root in a subfolder named like the reddit user name
         if that one is not available the extracted (from the page) author of the file gets
@@ -368,12 +504,27 @@ class GWARipper:
         if not author_name:
             author_name = UNKNOWN_USR_FOLDER
 
+        if (info.download_type == DownloadType.HLS and dl.hls_needs_remux(f"_.{info.ext}")
+                and dl.find_ffmpeg() is None):
+            # segments can be merged without ffmpeg as long as we keep the MPEG-TS container
+            logger.warning("No ffmpeg executable found! Saving HLS stream as .ts "
+                           "instead of .%s", info.ext)
+            info.ext = "ts"
+
         subpath, filename, ext = info.generate_filename(
             top_collection, file_index)
 
         mypath = os.path.join(config.get_root(), author_name, subpath)
         os.makedirs(mypath, exist_ok=True)
-        filename = self._pad_filename_if_exists(mypath, filename, ext)
+        if self.max_workers > 1:
+            # another worker might have picked the same filename but the file
+            # might not have been created yet
+            with self._fs_lock:
+                filename = self._pad_filename_if_exists(
+                    mypath, filename, ext, reserved=self._reserved_paths)
+                self._reserved_paths.add(os.path.join(mypath, f"{filename}.{ext}"))
+        else:
+            filename = self._pad_filename_if_exists(mypath, filename, ext)
         filename = f"{filename}.{ext}"
 
         logger.info("Downloading: %s..., File %d of %d", filename,
@@ -386,7 +537,14 @@ class GWARipper:
         # well as non-audio files if self.skip_non_audio was True
         # -> this just needs to branch on audio vs non-audio with regards to adding it to the DB
         try:
-            if info.is_audio and not already_downloaded:
+            if info.is_audio and not already_downloaded and self.max_workers > 1:
+                # NOTE: we can't hold on to the single writer for the whole transfer
+                # otherwise the workers would be serialized again
+                # -> only add the file to the DB once it was successfully downloaded
+                dl_function(info, mypath, filename)
+                with self._db_lock, self.db_con:
+                    file_info_id_in_db = self._add_to_db(info, None, filename)
+            elif info.is_audio and not already_downloaded:
                 # automatically commits changes to db_con if everything succeeds or does a rollback
                 # if an exception is raised; exception is still raised and must be caught
                 with self.db_con:
@@ -409,8 +567,8 @@ class GWARipper:
             logger.warning(err.reason)
             logger.warning("File information was not added to DB! Reddit selftext might "
                            "not be written if this was the only file! "
-                           "It's recommended to manually delete and re-download the file "
-                           "using GWARipper!")
+                           "Re-downloading the file using GWARipper will resume the "
+                           "download if the host supports it!")
             info.downloaded = dl.DownloadErrorCode.HTTP_ERROR_OTHER
 
             if info.parent:
@@ -432,19 +590,27 @@ class GWARipper:
             info.id_in_db = file_info_id_in_db
 
             if info.is_audio:
-                try:
-                    update_meta_tags(os.path.join(
-                        mypath, filename), info, top_collection)
-                except Exception:
-                    # don't fail the download due to errors when updating the
-                    # file tags
-                    logger.warning("Failed to write file tags for file %s",
-                                   os.path.join(mypath, filename))
+                if (deferred_tags is not None and top_collection is not None
+                        and top_collection.extraction_pending):
+                    # track number/total need all files of the collection
+                    deferred_tags.append((os.path.join(mypath, filename), info))
+                else:
+                    self._update_meta_tags(os.path.join(mypath, filename), info, top_collection)
 
             return subpath
 
         return None
 
+    @staticmethod
+    def _update_meta_tags(path: str, info: FileInfo,
+                          top_collection: Optional[FileCollection]) -> None:
+        try:
+            update_meta_tags(path, info, top_collection)
+        except Exception:
+            # don't fail the download due to errors when updating the
+            # file tags
+            logger.warning("Failed to write file tags for file %s", path)
+
     def _download_file_http(self, info: FileInfo, mypath: str, filename: str):
         # TODO retries etc. or use requests lib?
         # func passed as kwarg reporthook gets called once on establishment
@@ -454,20 +620,44 @@ class GWARipper:
         # total size is -1 if unknown
         dl.download_in_chunks(info.direct_url,
                               os.path.abspath(os.path.join(mypath, filename)),
-                              prog_bar=True,
+                              # progress bars of multiple workers would overwrite each other
+                              prog_bar=self.max_workers == 1,
                               headers=info.additional_headers)
 
     def _download_file_hls(self, info: FileInfo, mypath: str, filename: str):
 
-        if not dl.download_hls_ffmpeg(info.direct_url, os.path.abspath(os.path.join(mypath, filename))):
-            raise exceptions.ExternalError("FFmpeg concatenation failed!")
+        if not dl.download_hls(info.direct_url, os.path.abspath(os.path.join(mypath, filename)),
+                               # progress of multiple workers would overwrite each other
+                               show_progress=self.max_workers == 1):
+            raise exceptions.ExternalError("Merging HLS segments failed!")
 
-    def _download_collection(self, info: FileCollection, top_collection: Optional[FileCollection],
-                             dl_idx: int = 1) -> DownloadCollectionResult:
+    def _download_collection(
+            self, info: FileCollection, top_collection: Optional[FileCollection],
+            dl_idx: int = 1,
+            deferred_tags: Optional[List[Tuple[str, FileInfo]]] = None) -> DownloadCollectionResult:
+        """
+        :param deferred_tags: Files whose tags can only be written once all files
+                              of the top collection were extracted; None for the
+                              top collection
+        """
         logger.info("Starting download of collection: %s", info.url)
 
+        is_top_collection = top_collection is None
         if top_collection is None:
             top_collection = info
+        if deferred_tags is None:
+            deferred_tags = []
+
+        # NOTE: children of e.g. soundgasm user pages are still being extracted in the
+        # background (see extractors.base.extract_children) and we start downloading
+        # the ones that are available
+        # but the file numbering and whether files get a sub-directory depend
+        # on the nr of files, which is only final once it reaches 3, so wait till then
+        # nested collections and choosing mirrors need the whole collection
+        if self.only_one_mirror or not is_top_collection:
+            info.finish_extraction()
+        else:
+            info.finish_extraction(min_files=3)
 
         # top collection determines best author_name to use
         # priority is 1. reddit 2. file collection author 3. file author 4. fallbacks
@@ -485,53 +675,66 @@ class GWARipper:
         any_audio_downloads = False
         with_file_idx = info.nr_files > 1
         rel_idx = 1
-        for fi_or_fc in info.children:
-            if fi_or_fc.downloaded is dl.DownloadErrorCode.CHOSE_OTHER_HOST:
-                logger.info("Skipped URL %s in favor of a prioritized host!",
-                            fi_or_fc.url if isinstance(fi_or_fc, FileCollection) else fi_or_fc.page_url)
-                continue
-
-            # add FileCollections to DB here
-            if isinstance(fi_or_fc, FileCollection):
-                # recursive call
-                dl_collection_result = self._download_collection(
-                    fi_or_fc, top_collection, dl_idx=dl_idx)
-                dl_idx = dl_collection_result.dl_idx
-                any_audio_downloads = any_audio_downloads or dl_collection_result.any_audio_downloads
-                if dl_collection_result.error_code != dl.DownloadErrorCode.NO_ERRORS:
-                    download_err_code = dl.DownloadErrorCode.ERROR_IN_CHILDREN
-            else:
-                fi: FileInfo = fi_or_fc
-                # rel_idx is 0-based
-                self._download_file(
-                    fi, author_name, top_collection,
-                    rel_idx if with_file_idx else 0,
-                    dl_idx=dl_idx, dl_max=top_collection.nr_files)
-                if fi.is_audio and fi.downloaded is dl.DownloadErrorCode.DOWNLOADED:
-                    any_audio_downloads = True
-                rel_idx += 1
-                dl_idx += 1
+        try:
+            for fi_or_fc in info.iter_children():
+                if fi_or_fc.downloaded is dl.DownloadErrorCode.CHOSE_OTHER_HOST:
+                    logger.info("Skipped URL %s in favor of a prioritized host!",
+                                fi_or_fc.url if isinstance(fi_or_fc, FileCollection) else fi_or_fc.page_url)
+                    continue
 
-                if fi.downloaded not in (
-                        dl.DownloadErrorCode.DOWNLOADED, dl.DownloadErrorCode.SKIPPED_DUPLICATE):
-                    download_err_code = dl.DownloadErrorCode.ERROR_IN_CHILDREN
+                # add FileCollections to DB here
+                if isinstance(fi_or_fc, FileCollection):
+                    # recursive call
+                    dl_collection_result = self._download_collection(
+                        fi_or_fc, top_collection, dl_idx=dl_idx, deferred_tags=deferred_tags)
+                    dl_idx = dl_collection_result.dl_idx
+                    any_audio_downloads = any_audio_downloads or dl_collection_result.any_audio_downloads
+                    if dl_collection_result.error_code != dl.DownloadErrorCode.NO_ERRORS:
+                        download_err_code = dl.DownloadErrorCode.ERROR_IN_CHILDREN
+                else:
+                    fi: FileInfo = fi_or_fc
+                    # rel_idx is 0-based
+                    self._download_file(
+                        fi, author_name, top_collection,
+                        rel_idx if with_file_idx else 0,
+                        dl_idx=dl_idx, dl_max=top_collection.nr_files,
+                        deferred_tags=deferred_tags)
+                    if fi.is_audio and fi.downloaded is dl.DownloadErrorCode.DOWNLOADED:
+                        any_audio_downloads = True
+                    rel_idx += 1
+                    dl_idx += 1
+
+                    if fi.downloaded not in (
+                            dl.DownloadErrorCode.DOWNLOADED, dl.DownloadErrorCode.SKIPPED_DUPLICATE):
+                        download_err_code = dl.DownloadErrorCode.ERROR_IN_CHILDREN
+        finally:
+            # e.g. on KeyboardInterrupt: don't keep extracting the remaining children
+            info.cancel_extraction()
 
         # set download status once a collection is finished
         info.downloaded = download_err_code
 
+        if is_top_collection:
+            # all children are extracted now
+            for path, fi in deferred_tags:
+                self._update_meta_tags(path, fi, top_collection)
+
         # only file collections containing audio files get added to db
         if any_audio_downloads:
             if isinstance(info, RedditInfo):
-                with self.db_con:
+                with self._db_lock, self.db_con:
                     self._add_to_db_ri(cast(RedditInfo, info))
 
                 subpath = top_collection.subpath if top_collection is not None else ""
                 # :PassSubpathSelftext
                 if not self.dont_write_selftext:
-                    cast(RedditInfo, info).write_selftext_file(
+                    selftext_path = cast(RedditInfo, info).write_selftext_file(
                         config.get_root(), os.path.join(author_name, subpath))
+                    if selftext_path:
+                        with self._db_lock, self.db_con:
+                            self._set_selftext_path(cast(RedditInfo, info), selftext_path)
             else:
-                with self.db_con:
+                with self._db_lock, self.db_con:
                     self._add_to_db_collection(info, author_name)
 
         return DownloadCollectionResult(any_audio_downloads, dl_idx, download_err_code)
@@ -628,8 +831,9 @@ class GWARipper:
 
         # TODO get rid of RedditInfo entirely and add the columns (there's only one) to FileCollection
         if not was_in_db:
-            c.execute("INSERT INTO RedditInfo(created_utc) VALUES (?)",
-                      (r_info.created_utc,))
+            # selftext is stored so it's included in the full-text search
+            c.execute("INSERT INTO RedditInfo(created_utc, selftext) VALUES (?, ?)",
+                      (r_info.created_utc, r_info.selftext))
             r_info_id = c.lastrowid
             # assign reddit info to collection
             c.execute("UPDATE FileCollection SET reddit_info_id = ? WHERE id = ?",
@@ -637,6 +841,14 @@ class GWARipper:
 
         return cast(int, r_info.id_in_db), author if was_in_db else reddit_author
 
+    def _set_selftext_path(self, r_info: RedditInfo, selftext_path: str) -> None:
+        # stored so the webGUI doesn't have to re-construct the filename (which
+        # depends on the version that wrote it) for every displayed row
+        self.db_con.execute("""
+        UPDATE RedditInfo SET selftext_path = ?
+        WHERE id = (SELECT reddit_info_id FROM FileCollection WHERE id = ?)""",
+                            (selftext_path, r_info.id_in_db))
+
     def _add_to_db(self, info: FileInfo, collection_id: Optional[int], filename: str) -> int:
         return self.add_to_db(self.db_con, info, collection_id, filename)
 
@@ -701,14 +913,25 @@ class GWARipper:
         Checks by querying for info.page_url and info.direct_url in DB if a file
         was downloaded before
         """
-        # check both url and url_file since some rows only have the url_file set
-        c = self.db_con.execute("SELECT id, collection_id FROM AudioFile WHERE url = ?"
-                                "OR url = ?", (info.page_url, info.direct_url))
-        duplicate = c.fetchone()
-
-        if (info.reddit_info and duplicate and not duplicate['collection_id'] and
-                config.config.getboolean("Settings", "set_missing_reddit", fallback=False)):
-            self.set_missing_reddit_db(duplicate['id'], info)
+        with self._db_lock:
+            # check both url and url_file since some rows only have the url_file set
+            c = self.db_con.execute("SELECT id, collection_id FROM AudioFile WHERE url = ?"
+                                    "OR url = ?", (info.page_url, info.direct_url))
+            duplicate = c.fetchone()
+
+            if (info.reddit_info and duplicate and not duplicate['collection_id'] and
+                    config.config.getboolean("Settings", "set_missing_reddit", fallback=False)):
+                self.set_missing_reddit_db(duplicate['id'], info)
+
+            if not duplicate and self.max_workers > 1:
+                # file is not in the DB yet but another worker might be downloading it
+                # right now; the first worker to get here claims the url
+                if info.page_url in self._claimed_urls:
+                    logger.debug("URL is being downloaded by another worker: %s",
+                                 info.page_url)
+                    duplicate = True
+                else:
+                    self._claimed_urls.add(info.page_url)
 
         if duplicate:
             info.downloaded = dl.DownloadErrorCode.SKIPPED_DUPLICATE
@@ -736,7 +959,7 @@ class GWARipper:
         if own_index != 0:
             return
 
-        with self.db_con:
+        with self._db_lock, self.db_con:
             collection_id, reddit_author = self._add_to_db_ri(info.reddit_info)
 
             c = self.db_con.execute("""
@@ -784,5 +1007,7 @@ class GWARipper:
             # by RedditInfo since this file was downloaded without it
             file_path = os.path.join(author_subdir, filename_local)
             if not self.dont_write_selftext:
-                info.reddit_info.write_selftext_file(
+                selftext_path = info.reddit_info.write_selftext_file(
                     config.get_root(), file_path, force_path=True)
+                if selftext_path:
+                    self._set_selftext_path(info.reddit_info, selftext_path)
@@ -6,7 +6,7 @@ from enum import Enum, auto, unique
 
 from typing import (
     Optional, Union, List, Type, Tuple, Iterator, Sequence,
-    Deque, TYPE_CHECKING, cast, overload, Dict, Set
+    Deque, TYPE_CHECKING, cast, overload, Dict, Set, Generator
 )
 from typing_extensions import Literal
 
@@ -419,6 +419,10 @@ class FileCollection:
         self._nr_files: int = sum(1 for _, _ in
                                   children_iter_dfs(self._children, file_info_only=True))
 
+        # advancing it attaches the next child that was extracted in the background
+        # see set_pending_children
+        self._pending: Optional[Generator[None, None, None]] = None
+
         self._parent: Optional[FileCollection] = None
         # NOTE: a collection only counts as downloaded if all of it's children were downloaded
         # (including previous runs/already downloaded children)
@@ -436,8 +440,71 @@ class FileCollection:
 
     @property
     def children(self) -> List[Union[FileInfo, 'FileCollection']]:
+        # NOTE: blocks till all children were extracted, use iter_children to
+        # get them as soon as they're available
+        self.finish_extraction()
         return self._children
 
+    def set_pending_children(self, pending: Generator[None, None, None]) -> None:
+        """
+        Sets children that are still being extracted in the background
+        Every time `pending` is advanced it attaches (at most) one more child using
+        add_file/add_collection, it's exhausted once all children were extracted
+        """
+        self._pending = pending
+
+    @property
+    def extraction_pending(self) -> bool:
+        return self._pending is not None
+
+    def _advance_pending(self) -> bool:
+        if self._pending is None:
+            return False
+        try:
+            next(self._pending)
+        except BaseException:
+            # StopIteration: all children were attached
+            # otherwise don't leave a broken iterator around
+            self._pending = None
+            raise
+        return True
+
+    def _try_advance_pending(self) -> bool:
+        try:
+            return self._advance_pending()
+        except StopIteration:
+            return False
+
+    def finish_extraction(self, min_files: Optional[int] = None) -> None:
+        """
+        Blocks till all children were extracted or till the collection has at
+        least `min_files` files
+        """
+        while self._pending is not None and (min_files is None or self.nr_files < min_files):
+            self._try_advance_pending()
+
+    def cancel_extraction(self) -> None:
+        """
+        Stops attaching children that are still being extracted and cancels the
+        extractions that haven't started yet
+        """
+        if self._pending is not None:
+            pending = self._pending
+            self._pending = None
+            pending.close()
+
+    def iter_children(self) -> Iterator[Union[FileInfo, 'FileCollection']]:
+        """
+        Yields the children in order as soon as they were extracted
+        """
+        i = 0
+        while True:
+            while i >= len(self._children):
+                if not self._try_advance_pending():
+                    return
+            yield self._children[i]
+            i += 1
+
     @property
     def nr_files(self) -> int:
         return self._nr_files
@@ -524,6 +591,13 @@ class FileCollection:
                 child.reddit_info = parent
 
     def get_preferred_author_name(self) -> str:
+        if self.author and self.extraction_pending:
+            # NOTE: only children that are reddit submissions could take precedence over
+            # our own author, but those are never extracted in the background
+            # (see extractors.base.extract_children)
+            # -> don't block till all children were extracted
+            return self.author
+
         names = [self.author]
 
         # bfs yields the names in level order level0 then level1 etc.
@@ -617,27 +691,41 @@ class RedditInfo(FileCollection):
     def full_url(self):
         return f"https://www.reddit.com{self.permalink}"
 
-    def write_selftext_file(self, root_dir: str, subpath: str, force_path: bool = False):
+    def selftext_path(self, subpath: str, force_path: bool = False) -> str:
+        """
+        Path of the selftext file relative to the GWARipper root using forward slashes,
+        which is how it's stored in the DB (RedditInfo.selftext_path)
+
+        :param subpath: Relative path from the root to the subfolder where files of
+                        RedditInfo collection are stored
+        :param force_path: Use passed in :subpath: as base for the selftext filename
+        """
+        if force_path:
+            selftext_fn = f"{subpath}.txt"
+        else:
+            filename = sanitize_filename(subpath, self.title)
+            # path.join works with joining empty strings
+            selftext_fn = f"{os.path.join(subpath, filename)}.txt"
+        return selftext_fn.replace('\\', '/')
+
+    def write_selftext_file(self, root_dir: str, subpath: str,
+                            force_path: bool = False) -> Optional[str]:
         """
         Write selftext to a text file if not None
         Doesnt overwrite already existing selftext file!
 
         :param root_dir: Absolute path to GWARipper root
-        :param user_path: Relative path from root_dir to subfolder where files of
-                          RedditInfo collection are stored
+        :param subpath: Relative path from root_dir to subfolder where files of
+                        RedditInfo collection are stored
         :param force_path: Use passed in :subpath: as base for the selftext filename
-        :return: None
+        :return: Path of the selftext file relative to root_dir (see selftext_path)
+                 or None if there is no selftext
         """
         if not self.selftext:
             return None
 
-        if force_path:
-            selftext_fn = os.path.join(root_dir, f"{subpath}.txt")
-        else:
-            filename = sanitize_filename(subpath, self.title)
-            # path.join works with joining empty strings
-            filename = os.path.join(root_dir, subpath, filename)
-            selftext_fn = f"{filename}.txt"
+        rel_path = self.selftext_path(subpath, force_path=force_path)
+        selftext_fn = os.path.join(root_dir, rel_path)
 
         if not os.path.isfile(selftext_fn):
             # create path since user might have downloaded the file and the moved it
@@ -647,6 +735,8 @@ class RedditInfo(FileCollection):
                 w.write(f"Title: {self.title}\nPermalink: {self.permalink}\n"
                         f"Selftext:\n\n{self.selftext}")
 
+        return rel_path
+
 
 def pick_host_based_on_priority_list(
     available_hosts: Set['extr.AudioHost'],
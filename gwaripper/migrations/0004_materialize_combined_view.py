@@ -0,0 +1,147 @@
+import sqlite3
+
+date = '2026-10-18'
+
+# NOTE: v_audio_and_collection_combined has 4 joins, a correlated subquery for
+# fcol_alias_name and an EXISTS on ListenLater per row, so sorting by e.g. rating
+# had to compute the whole view
+# -> materialize it into a table that is kept in sync by triggers and read from that
+# instead; the view stays the single source of truth: the triggers just re-select
+# the affected rows from it
+MATERIALIZED_TABLE_STATEMENTS = [
+    """
+    CREATE TABLE mv_audio_and_collection_combined(
+        -- same as AudioFile.id
+        id INTEGER PRIMARY KEY ASC,
+        collection_id INTEGER,
+        date DATE,
+        description TEXT,
+        filename TEXT,
+        title TEXT,
+        url TEXT,
+        alias_id INTEGER,
+        rating REAL,
+        favorite INTEGER,
+        alias_name TEXT,
+        artist_name TEXT,
+        fcol_id INTEGER,
+        fcol_url TEXT,
+        fcol_id_on_page TEXT,
+        fcol_title TEXT,
+        fcol_subpath TEXT,
+        fcol_reddit_info_id INTEGER,
+        fcol_parent_id INTEGER,
+        fcol_alias_id INTEGER,
+        fcol_alias_name TEXT,
+        reddit_created_utc REAL,
+        listen_later INTEGER
+    )""",
+    # sorting (id is the tie-breaker for keyset pagination) and equality searches
+    # of db.SEARCH_COL_TRANSFORM
+    "CREATE INDEX mv_combined_rating_idx ON mv_audio_and_collection_combined(rating, id)",
+    "CREATE INDEX mv_combined_collection_id_idx ON mv_audio_and_collection_combined(collection_id)",
+    "CREATE INDEX mv_combined_artist_name_idx ON mv_audio_and_collection_combined(artist_name)",
+    "CREATE INDEX mv_combined_alias_name_idx ON mv_audio_and_collection_combined(alias_name)",
+    "CREATE INDEX mv_combined_fcol_alias_name_idx ON mv_audio_and_collection_combined(fcol_alias_name)",
+    "CREATE INDEX mv_combined_url_idx ON mv_audio_and_collection_combined(url)",
+    "CREATE INDEX mv_combined_fcol_url_idx ON mv_audio_and_collection_combined(fcol_url)",
+    "CREATE INDEX mv_combined_fcol_id_on_page_idx ON mv_audio_and_collection_combined(fcol_id_on_page)",
+    # otherwise every row refresh has to scan ListenLater for the listen_later column
+    "CREATE INDEX listen_later_audio_id_idx ON ListenLater(audio_id)",
+    # NOTE: IMPORTANT! migrations that re-create one of the source tables (rename to temp,
+    # create, copy, drop) drop these triggers and have to re-create them
+    """
+    CREATE TRIGGER mv_combined_audio_ai AFTER INSERT ON AudioFile
+    BEGIN
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined WHERE id = new.id;
+    END""",
+    """
+    CREATE TRIGGER mv_combined_audio_au AFTER UPDATE ON AudioFile
+    BEGIN
+        DELETE FROM mv_audio_and_collection_combined WHERE id = old.id;
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined WHERE id = new.id;
+    END""",
+    """
+    CREATE TRIGGER mv_combined_audio_ad AFTER DELETE ON AudioFile
+    BEGIN
+        DELETE FROM mv_audio_and_collection_combined WHERE id = old.id;
+    END""",
+    # inserting or deleting FileCollections, Aliases, Artists and RedditInfo can't affect
+    # existing rows (they're either not referenced yet or foreign keys prevent deleting them)
+    """
+    CREATE TRIGGER mv_combined_fcol_au AFTER UPDATE ON FileCollection
+    BEGIN
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined
+        WHERE collection_id IN (old.id, new.id);
+    END""",
+    """
+    CREATE TRIGGER mv_combined_alias_au AFTER UPDATE ON Alias
+    BEGIN
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined
+        WHERE id IN (
+            SELECT id FROM AudioFile WHERE alias_id IN (old.id, new.id)
+            UNION
+            SELECT AudioFile.id FROM FileCollection
+            JOIN AudioFile ON AudioFile.collection_id = FileCollection.id
+            WHERE FileCollection.alias_id IN (old.id, new.id)
+        );
+    END""",
+    """
+    CREATE TRIGGER mv_combined_artist_au AFTER UPDATE ON Artist
+    BEGIN
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined
+        WHERE id IN (
+            SELECT AudioFile.id FROM Alias
+            JOIN AudioFile ON AudioFile.alias_id = Alias.id
+            WHERE Alias.artist_id IN (old.id, new.id)
+        );
+    END""",
+    """
+    CREATE TRIGGER mv_combined_reddit_info_au AFTER UPDATE ON RedditInfo
+    BEGIN
+        INSERT OR REPLACE INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined
+        WHERE collection_id IN (
+            SELECT id FROM FileCollection WHERE reddit_info_id IN (old.id, new.id));
+    END""",
+    """
+    CREATE TRIGGER mv_combined_listen_later_ai AFTER INSERT ON ListenLater
+    BEGIN
+        UPDATE mv_audio_and_collection_combined SET listen_later = 1
+        WHERE id = new.audio_id;
+    END""",
+    """
+    CREATE TRIGGER mv_combined_listen_later_au AFTER UPDATE ON ListenLater
+    BEGIN
+        UPDATE mv_audio_and_collection_combined SET listen_later = EXISTS (
+            SELECT 1 FROM ListenLater WHERE audio_id = mv_audio_and_collection_combined.id)
+        WHERE id IN (old.audio_id, new.audio_id);
+    END""",
+    """
+    CREATE TRIGGER mv_combined_listen_later_ad AFTER DELETE ON ListenLater
+    BEGIN
+        UPDATE mv_audio_and_collection_combined SET listen_later = EXISTS (
+            SELECT 1 FROM ListenLater WHERE audio_id = old.audio_id)
+        WHERE id = old.audio_id;
+    END""",
+]
+
+
+def upgrade(db_con):
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    # NOTE: not using executescript since it commits first and migrations must not commit
+    for stmt in MATERIALIZED_TABLE_STATEMENTS:
+        c.execute(stmt)
+
+    c.execute("""
+        INSERT INTO mv_audio_and_collection_combined
+        SELECT * FROM v_audio_and_collection_combined""")
@@ -0,0 +1,28 @@
+import sqlite3
+
+date = '2026-10-18'
+
+# one index per sort column of db.SORT_COLUMNS with the id as tie-breaker, so every
+# page, no matter how deep, is a seek in the index when using keyset pagination
+# NOTE: the expressions have to match db.SORT_COLUMNS exactly otherwise sqlite won't use them
+SORT_INDEX_STATEMENTS = [
+    "CREATE INDEX mv_combined_sort_rating_idx ON mv_audio_and_collection_combined("
+    "IFNULL(rating, -1), id)",
+    "CREATE INDEX mv_combined_sort_date_idx ON mv_audio_and_collection_combined(date, id)",
+    "CREATE INDEX mv_combined_sort_title_idx ON mv_audio_and_collection_combined("
+    "IFNULL(title, ''), id)",
+    "CREATE INDEX mv_combined_sort_artist_idx ON mv_audio_and_collection_combined("
+    "COALESCE(artist_name, alias_name), id)",
+]
+
+
+def upgrade(db_con):
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    # replaced by the index on the NULL-free expression
+    c.execute("DROP INDEX mv_combined_rating_idx")
+    for stmt in SORT_INDEX_STATEMENTS:
+        c.execute(stmt)
@@ -0,0 +1,19 @@
+import sqlite3
+
+date = '2026-10-18'
+
+# only a small fraction of all files is on the listen later list, so the first
+# page sorted by id had to walk through (potentially) the whole table to find them
+# -> partial index on just those rows
+LISTEN_LATER_INDEX_STATEMENT = (
+    "CREATE INDEX mv_combined_listen_later_idx ON mv_audio_and_collection_combined(id) "
+    "WHERE listen_later = 1")
+
+
+def upgrade(db_con):
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    c.execute(LISTEN_LATER_INDEX_STATEMENT)
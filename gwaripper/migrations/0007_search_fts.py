@@ -0,0 +1,90 @@
+import sqlite3
+
+date = '2026-10-18'
+
+# NOTE: Titles_fts_idx only covered the titles (and wasn't updated when the title of a
+# collection changed), so descriptions, artists and the reddit selftext could only
+# be searched using unindexed equality comparisons
+# -> one FTS index over all of them, ranked by bm25
+# it's a regular FTS5 table (storing its own copy of the text) instead of an external
+# content one, since the rows of the materialized view it's kept in sync with get
+# replaced using INSERT OR REPLACE, which means the old values (that are needed to
+# delete rows from an external content index) aren't available anymore
+SEARCH_FTS_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE Search_fts_idx USING fts5(
+        title, collection_title, description, artist, selftext,
+        -- speeds up prefix queries like whisp*
+        prefix='2 3'
+    )""",
+    # persistent default for the rank column that results are sorted by
+    # weights of the columns in the order they were defined above
+    """
+    INSERT INTO Search_fts_idx(Search_fts_idx, rank)
+    VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 5.0, 1.0)')""",
+    # mv_audio_and_collection_combined already gets refreshed whenever one of the indexed
+    # columns changes (including RedditInfo.selftext), so we only need triggers on it
+    # NOTE: INSERT OR REPLACE doesn't fire the DELETE trigger
+    """
+    CREATE TRIGGER search_fts_mv_ai AFTER INSERT ON mv_audio_and_collection_combined
+    BEGIN
+        DELETE FROM Search_fts_idx WHERE rowid = new.id;
+        INSERT INTO Search_fts_idx(rowid, title, collection_title, description, artist, selftext)
+        VALUES (
+            new.id, new.title, new.fcol_title, new.description,
+            new.alias_name || ' ' || IFNULL(new.artist_name, '') || ' ' ||
+                IFNULL(new.fcol_alias_name, ''),
+            (SELECT selftext FROM RedditInfo WHERE id = new.fcol_reddit_info_id)
+        );
+    END""",
+    """
+    CREATE TRIGGER search_fts_mv_au AFTER UPDATE OF
+        title, fcol_title, description, alias_name, artist_name, fcol_alias_name,
+        fcol_reddit_info_id
+    ON mv_audio_and_collection_combined
+    BEGIN
+        DELETE FROM Search_fts_idx WHERE rowid = old.id;
+        INSERT INTO Search_fts_idx(rowid, title, collection_title, description, artist, selftext)
+        VALUES (
+            new.id, new.title, new.fcol_title, new.description,
+            new.alias_name || ' ' || IFNULL(new.artist_name, '') || ' ' ||
+                IFNULL(new.fcol_alias_name, ''),
+            (SELECT selftext FROM RedditInfo WHERE id = new.fcol_reddit_info_id)
+        );
+    END""",
+    """
+    CREATE TRIGGER search_fts_mv_ad AFTER DELETE ON mv_audio_and_collection_combined
+    BEGIN
+        DELETE FROM Search_fts_idx WHERE rowid = old.id;
+    END""",
+]
+
+
+def upgrade(db_con):
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    c.execute("DROP TRIGGER IF EXISTS AudioFile_ai")
+    c.execute("DROP TRIGGER IF EXISTS AudioFile_ad")
+    c.execute("DROP TRIGGER IF EXISTS AudioFile_au")
+    c.execute("DROP TABLE IF EXISTS Titles_fts_idx")
+    c.execute("DROP VIEW IF EXISTS v_audio_and_collection_titles")
+
+    # selftexts of existing rows only exist as the .txt files written by
+    # RedditInfo.write_selftext_file
+    c.execute("ALTER TABLE RedditInfo ADD COLUMN selftext TEXT")
+
+    for stmt in SEARCH_FTS_STATEMENTS:
+        c.execute(stmt)
+
+    c.execute("""
+        INSERT INTO Search_fts_idx(rowid, title, collection_title, description, artist, selftext)
+        SELECT
+            mv.id, mv.title, mv.fcol_title, mv.description,
+            mv.alias_name || ' ' || IFNULL(mv.artist_name, '') || ' ' ||
+                IFNULL(mv.fcol_alias_name, ''),
+            RedditInfo.selftext
+        FROM mv_audio_and_collection_combined mv
+        LEFT JOIN RedditInfo ON RedditInfo.id = mv.fcol_reddit_info_id""")
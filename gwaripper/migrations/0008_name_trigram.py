@@ -0,0 +1,57 @@
+import sqlite3
+
+date = '2026-10-18'
+
+# NOTE: artist searches only matched the exact artist/alias name, so finding sweet_audio
+# when typing sweetaud meant going through all the artists by hand
+# -> trigram indexes of the artist and alias names that db.fuzzy_match_names uses to
+# find candidates, which are then ranked by their similarity to the query
+# the indexed names are normalized by removing the separators of db.NAME_SEPARATORS_RE
+# (the tokenizer already folds the case) so they have to stay in sync
+# rowid is the id of the Artist/Alias; regular FTS5 tables since the normalized name
+# isn't a column of the source tables
+NORMALIZED_NAME_SQL = "replace(replace(replace(replace({}, '_', ''), '-', ''), ' ', ''), '.', '')"
+
+NAME_TRIGRAM_STATEMENTS = []
+for table in ("Artist", "Alias"):
+    NAME_TRIGRAM_STATEMENTS.extend([
+        f"CREATE VIRTUAL TABLE {table}_trigram_idx USING fts5(name, tokenize='trigram')",
+        f"""
+        CREATE TRIGGER {table.lower()}_trigram_ai AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {table}_trigram_idx(rowid, name)
+            VALUES (new.id, {NORMALIZED_NAME_SQL.format('new.name')});
+        END""",
+        f"""
+        CREATE TRIGGER {table.lower()}_trigram_au AFTER UPDATE OF name ON {table}
+        BEGIN
+            DELETE FROM {table}_trigram_idx WHERE rowid = old.id;
+            INSERT INTO {table}_trigram_idx(rowid, name)
+            VALUES (new.id, {NORMALIZED_NAME_SQL.format('new.name')});
+        END""",
+        f"""
+        CREATE TRIGGER {table.lower()}_trigram_ad AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM {table}_trigram_idx WHERE rowid = old.id;
+        END""",
+    ])
+
+
+def upgrade(db_con):
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        # trigram tokenizer isn't available, db.load_or_create_sql_db creates the
+        # indexes once the DB is opened with a newer SQLite version
+        return
+
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    for stmt in NAME_TRIGRAM_STATEMENTS:
+        c.execute(stmt)
+
+    for table in ("Artist", "Alias"):
+        c.execute(f"""
+            INSERT INTO {table}_trigram_idx(rowid, name)
+            SELECT id, {NORMALIZED_NAME_SQL.format('name')} FROM {table}""")
@@ -0,0 +1,50 @@
+import sqlite3
+
+date = '2026-10-18'
+
+# NOTE: the csv export on exit always re-wrote the whole library
+# -> log which rows of mv_audio_and_collection_combined changed, so only those need to
+# be appended (see db.export_changes_to_csv)
+# one row per AudioFile (so the log doesn't grow with every change) with the sequence
+# nr of its last change; sequence nrs only ever increase, so everything that changed
+# after an export has a bigger one than the highest nr at the time of the export
+# rows of deleted files are kept so their deletion is logged as well
+# NOTE: it's not populated here, files without a row haven't changed since this
+# migration ran
+CHANGE_LOG_STATEMENTS = [
+    """
+    CREATE TABLE AudioFileChangeLog(
+        audio_id INTEGER PRIMARY KEY ASC,
+        change_seq INTEGER NOT NULL
+    )""",
+    "CREATE INDEX audio_file_change_log_seq_idx ON AudioFileChangeLog(change_seq)",
+    # NOTE: INSERT OR REPLACE on the materialized view only fires the INSERT trigger
+    """
+    CREATE TRIGGER audio_change_log_mv_ai AFTER INSERT ON mv_audio_and_collection_combined
+    BEGIN
+        INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+        VALUES (new.id, (SELECT IFNULL(MAX(change_seq), 0) + 1 FROM AudioFileChangeLog));
+    END""",
+    """
+    CREATE TRIGGER audio_change_log_mv_au AFTER UPDATE ON mv_audio_and_collection_combined
+    BEGIN
+        INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+        VALUES (new.id, (SELECT IFNULL(MAX(change_seq), 0) + 1 FROM AudioFileChangeLog));
+    END""",
+    """
+    CREATE TRIGGER audio_change_log_mv_ad AFTER DELETE ON mv_audio_and_collection_combined
+    BEGIN
+        INSERT OR REPLACE INTO AudioFileChangeLog(audio_id, change_seq)
+        VALUES (old.id, (SELECT IFNULL(MAX(change_seq), 0) + 1 FROM AudioFileChangeLog));
+    END""",
+]
+
+
+def upgrade(db_con):
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    for stmt in CHANGE_LOG_STATEMENTS:
+        c.execute(stmt)
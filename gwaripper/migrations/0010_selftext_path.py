@@ -0,0 +1,147 @@
+import os
+import sqlite3
+
+from gwaripper.info import sanitize_filename
+
+date = '2026-10-18'
+
+# NOTE: the webGUI re-constructed the filename of the selftext for every displayed row
+# branching on the date the version that wrote it was released, which was wrong
+# if e.g. the title changed after the file was written
+# -> RedditInfo.write_selftext_file returns the path it wrote to, which is stored in
+# RedditInfo.selftext_path and exposed as reddit_selftext_path by the combined view
+# existing rows are backfilled by scanning the library (the dir the DB is in) once
+# for the .txt files any of the versions might've written; this also fills in
+# the selftext of rows downloaded before it was stored in the DB
+# (see 0007_search_fts.py)
+
+# same as before plus reddit_selftext_path at the end, since
+# the materialized view is filled using SELECT *
+COMBINED_VIEW = """
+    CREATE VIEW v_audio_and_collection_combined
+    AS
+    SELECT
+        AudioFile.id,
+        AudioFile.collection_id,
+        AudioFile.date,
+        AudioFile.description,
+        AudioFile.filename,
+        AudioFile.title,
+        AudioFile.url,
+        AudioFile.alias_id,
+        AudioFile.rating,
+        AudioFile.favorite,
+        Alias.name as alias_name,
+        Artist.name as artist_name,
+        FileCollection.id as fcol_id,
+        FileCollection.url as fcol_url,
+        FileCollection.id_on_page as fcol_id_on_page,
+        FileCollection.title as fcol_title,
+        FileCollection.subpath as fcol_subpath,
+        FileCollection.reddit_info_id as fcol_reddit_info_id,
+        FileCollection.parent_id as fcol_parent_id,
+        FileCollection.alias_id as fcol_alias_id,
+        (SELECT
+                Alias.name
+         FROM Alias WHERE Alias.id = FileCollection.alias_id) as fcol_alias_name,
+        RedditInfo.created_utc as reddit_created_utc,
+        EXISTS (SELECT 1 FROM ListenLater WHERE audio_id = AudioFile.id) as listen_later,
+        RedditInfo.selftext_path as reddit_selftext_path
+    FROM AudioFile
+    LEFT JOIN FileCollection ON AudioFile.collection_id = FileCollection.id
+    LEFT JOIN RedditInfo ON FileCollection.reddit_info_id = RedditInfo.id
+    JOIN Alias ON Alias.id = AudioFile.alias_id
+    LEFT JOIN Artist ON Artist.id = Alias.artist_id"""
+
+# separator between the header and the selftext in the files written by
+# RedditInfo.write_selftext_file
+SELFTEXT_HEADER_END = "\nSelftext:\n\n"
+
+
+def _rel_path(*parts: str) -> str:
+    return os.path.join(*parts).replace('\\', '/')
+
+
+def selftext_path_candidates(row: sqlite3.Row):
+    """
+    Paths (relative to the root dir) a selftext of the file in row might have been
+    written to by the different versions, most likely first
+    """
+    author_subdir = row['fcol_alias_name']
+    subpath = row['fcol_subpath'] or ""
+    # >v0.3: sanitized title of the reddit submission in the dir of the collection
+    if row['fcol_title'] and author_subdir:
+        try:
+            yield _rel_path(author_subdir, subpath, sanitize_filename(
+                os.path.join(author_subdir, subpath), row['fcol_title']) + '.txt')
+        except AssertionError:
+            # path too long or starts/ends with spaces, so this version couldn't
+            # have written it
+            pass
+    if row['filename']:
+        # <=v0.3 audio file name + '.txt'
+        if author_subdir:
+            yield _rel_path(author_subdir, subpath, f"{row['filename']}.txt")
+        # GWARipper.set_missing_reddit_db writes next to the audio file
+        yield _rel_path(row['alias_name'], f"{row['filename']}.txt")
+
+
+def read_selftext(path: str):
+    try:
+        with open(path, "r", encoding="UTF-8", errors="replace") as f:
+            content = f.read()
+    except OSError:
+        return None
+    _, sep, selftext = content.partition(SELFTEXT_HEADER_END)
+    return selftext if sep else content
+
+
+def upgrade(db_con):
+    rf = db_con.row_factory
+    db_con.row_factory = sqlite3.Row
+    c = db_con.cursor()
+    db_con.row_factory = rf
+
+    c.execute("ALTER TABLE RedditInfo ADD COLUMN selftext_path TEXT")
+    # NOTE: the triggers that re-select rows from the view are only compiled when
+    # they fire, so they don't have to be re-created
+    c.execute("DROP VIEW v_audio_and_collection_combined")
+    c.execute(COMBINED_VIEW)
+    c.execute("ALTER TABLE mv_audio_and_collection_combined "
+              "ADD COLUMN reddit_selftext_path TEXT")
+
+    # "" for in-memory DBs
+    db_path = next(row['file'] for row in c.execute("PRAGMA database_list")
+                   if row['name'] == 'main')
+    if not db_path:
+        return
+    root_dir = os.path.dirname(db_path)
+
+    # only stat-ing the whole library once instead of every candidate
+    txt_files = set()
+    for dirpath, _, filenames in os.walk(root_dir):
+        for fn in filenames:
+            if fn.endswith('.txt'):
+                txt_files.add(_rel_path(os.path.relpath(os.path.join(dirpath, fn), root_dir)))
+
+    found = {}
+    for row in c.execute("""
+            SELECT fcol_reddit_info_id, fcol_alias_name, fcol_subpath, fcol_title,
+                   filename, alias_name
+            FROM mv_audio_and_collection_combined
+            WHERE fcol_reddit_info_id IS NOT NULL
+            ORDER BY id""").fetchall():
+        if row['fcol_reddit_info_id'] in found:
+            continue
+        path = next((p for p in selftext_path_candidates(row) if p in txt_files), None)
+        if path is not None:
+            found[row['fcol_reddit_info_id']] = path
+
+    for reddit_info_id, path in found.items():
+        # NOTE: the update also refreshes the materialized view and the full-text index
+        c.execute("""
+            UPDATE RedditInfo SET
+                selftext_path = ?,
+                selftext = IFNULL(selftext, ?)
+            WHERE id = ?""",
+                  (path, read_selftext(os.path.join(root_dir, path)), reddit_info_id))
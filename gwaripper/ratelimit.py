@@ -0,0 +1,332 @@
+"""
+Per-host request pacing for all HTTP requests made by gwaripper.download
+
+Every host (keyed on the registered domain, e.g. media.soundgasm.net and
+soundgasm.net share one budget) gets its own token bucket, a limit for the
+number of concurrent connections and an adaptive backoff that is driven
+by HTTP 429/503 responses and their Retry-After header
+-> a slow or rate-limiting host only stalls requests to itself and not the
+   rest of a batch
+"""
+
+import time
+import threading
+import logging
+import contextlib
+import datetime
+import email.utils
+import ipaddress
+import urllib.error
+import urllib.parse
+
+from typing import Optional, Dict, Iterator, NamedTuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# used when neither the host nor the defaults are configured in [Settings]
+DEFAULT_RATE = 4.0
+DEFAULT_BURST = 8
+DEFAULT_MAX_CONNECTIONS = 4
+# in seconds
+MAX_BACKOFF = 64.0
+# rate won't be lowered below this by the adaptive backoff
+MIN_RATE = 0.1
+
+
+class HostLimits(NamedTuple):
+    # requests per second; <= 0 means no rate limit
+    rate: float
+    # max. nr of requests that can be made in a burst
+    burst: int
+    max_connections: int
+
+
+class HostStats(NamedTuple):
+    requests: int
+    # total time in seconds requests to this host had to wait
+    throttled: float
+    # nr of 429/503 responses
+    backoffs: int
+
+
+def host_key(url: str) -> str:
+    """
+    Returns the key a URL is scheduled under: the last two labels of the
+    hostname, so sub-domains like CDNs count towards the same budget
+    Also works for URLs without a scheme like BaseExtractor.BASE_URL
+    """
+    if "//" not in url:
+        url = f"//{url}"
+    hostname = urllib.parse.urlsplit(url).hostname or ""
+    try:
+        ipaddress.ip_address(hostname)
+    except ValueError:
+        return ".".join(hostname.split(".")[-2:])
+    else:
+        return hostname
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses the value of a Retry-After header which is either a number of seconds
+    or a HTTP-date
+
+    :return: Seconds to wait or None if it couldn't be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that allows a burst of `capacity` requests and then
+    refills at `rate` tokens per second
+
+    Tokens can go negative, which means they were reserved by waiting callers,
+    so callers are served in the order they called reserve
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens: float = self.capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns the time in seconds the caller has to wait
+        before it may use it
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class _HostState:
+
+    def __init__(self, limits: HostLimits):
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self.connections = threading.BoundedSemaphore(max(1, limits.max_connections))
+        self.lock = threading.Lock()
+        # time.monotonic() until which no new requests are started
+        self.backoff_until = 0.0
+        self.backoff_level = 0
+
+        self.requests = 0
+        self.throttled = 0.0
+        self.backoffs = 0
+
+
+class HostScheduler:
+    """
+    Paces requests per host using HostLimits from `host_limits` (keyed on host_key)
+    or `default_limits` for all other hosts
+
+    Use as:
+        with scheduler.request(url):
+            urllib.request.urlopen(..)
+    """
+
+    def __init__(self, default_limits: HostLimits,
+                 host_limits: Optional[Dict[str, HostLimits]] = None):
+        self.default_limits = default_limits
+        self.host_limits = host_limits if host_limits is not None else {}
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _get_state(self, key: str) -> _HostState:
+        with self._lock:
+            try:
+                return self._hosts[key]
+            except KeyError:
+                state = _HostState(self.host_limits.get(key, self.default_limits))
+                self._hosts[key] = state
+                return state
+
+    @contextlib.contextmanager
+    def request(self, url: str) -> Iterator[None]:
+        """
+        Blocks until a request to url's host may be started and holds one of
+        the host's connection slots until the context is exited
+        HTTPErrors 429 and 503 raised inside the context make the host back off
+        (they're still re-raised)
+        """
+        key = host_key(url)
+        state = self._get_state(key)
+
+        started = time.monotonic()
+        state.connections.acquire()
+        try:
+            wait = state.bucket.reserve()
+            with state.lock:
+                wait = max(wait, state.backoff_until - time.monotonic())
+            if wait > 0:
+                logger.debug("Throttling request to %s by %.2fs", key, wait)
+                time.sleep(wait)
+
+            with state.lock:
+                state.requests += 1
+                state.throttled += time.monotonic() - started
+
+            try:
+                yield
+            except urllib.error.HTTPError as err:
+                if err.code in (429, 503):
+                    self.backoff(key, parse_retry_after(
+                        err.headers.get("Retry-After") if err.headers else None))
+                raise
+            else:
+                self._recover(state)
+        finally:
+            state.connections.release()
+
+    def backoff(self, key: str, retry_after: Optional[float] = None) -> float:
+        """
+        Makes host `key` back off: no new requests are started for retry_after
+        seconds or an exponentially growing time if that's None; also halves the
+        request rate of the host
+
+        :return: Time in seconds the host will back off
+        """
+        state = self._get_state(key)
+        with state.lock:
+            state.backoffs += 1
+            state.backoff_level += 1
+            if retry_after is None:
+                delay = min(MAX_BACKOFF, 2 ** (state.backoff_level - 1))
+            else:
+                delay = retry_after
+            state.backoff_until = max(state.backoff_until, time.monotonic() + delay)
+            if state.bucket.rate > 0:
+                state.bucket.rate = max(MIN_RATE, state.bucket.rate / 2)
+
+        logger.info("Host %s is rate limiting us, backing off for %.1fs", key, delay)
+        return delay
+
+    @staticmethod
+    def _recover(state: _HostState) -> None:
+        # successful request -> slowly go back to the configured rate
+        if not state.backoff_level:
+            return
+        with state.lock:
+            state.backoff_level = max(0, state.backoff_level - 1)
+            if state.limits.rate > 0:
+                state.bucket.rate = min(state.limits.rate, state.bucket.rate * 1.5)
+
+    def stats(self) -> Dict[str, HostStats]:
+        with self._lock:
+            hosts = list(self._hosts.items())
+        result = {}
+        for key, state in hosts:
+            with state.lock:
+                result[key] = HostStats(state.requests, state.throttled, state.backoffs)
+        return result
+
+    def log_stats(self) -> None:
+        for key, st in self.stats().items():
+            if st.throttled >= 0.01 or st.backoffs:
+                logger.info("Host %s: %d requests, throttled for %.2fs, backed off %d times",
+                            key, st.requests, st.throttled, st.backoffs)
+            else:
+                logger.debug("Host %s: %d requests", key, st.requests)
+
+
+def _parse_limits(value: str, fallback: HostLimits) -> HostLimits:
+    # rate:burst:max_connections where trailing values can be omitted
+    parts = [p.strip() for p in value.split(":")]
+    rate = float(parts[0]) if parts[0] else fallback.rate
+    burst = int(parts[1]) if len(parts) > 1 and parts[1] else fallback.burst
+    max_conns = int(parts[2]) if len(parts) > 2 and parts[2] else fallback.max_connections
+    return HostLimits(rate, burst, max_conns)
+
+
+def scheduler_from_config() -> HostScheduler:
+    """
+    Builds a HostScheduler from the [Settings] section:
+        host_rate_limit = rate:burst:max_connections
+            defaults for all hosts e.g. 4:8:4
+        host_rate_limits = HOST=rate:burst:max_connections, ...
+            per host limits where HOST is either an AudioHost name (e.g. SOUNDGASM),
+            which uses the domain of the extractor's BASE_URL, or a domain
+            e.g. SOUNDGASM=2:4:2, i.imgur.com=1
+    """
+    # import in function due to circular imports
+    from gwaripper import extractors
+
+    default = HostLimits(DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_CONNECTIONS)
+    try:
+        default = _parse_limits(
+            config.config.get("Settings", "host_rate_limit", fallback=""), default)
+    except ValueError:
+        logger.warning("Malformed host_rate_limit setting! Using defaults")
+
+    host_limits: Dict[str, HostLimits] = {}
+    host_to_base_url = {host: extr.BASE_URL for extr, host in
+                        extractors.EXTRACTOR_TO_HOST.items()}
+    per_host = config.config.get("Settings", "host_rate_limits", fallback="")
+    for entry in per_host.split(","):
+        if not entry.strip():
+            continue
+        try:
+            host, limits = entry.split("=", 1)
+            host = host.strip()
+            try:
+                key = host_key(host_to_base_url[extractors.AudioHost[host.upper()]])
+            except KeyError:
+                key = host_key(host)
+            host_limits[key] = _parse_limits(limits, default)
+        except ValueError:
+            logger.warning("Malformed host_rate_limits entry: %s", entry)
+
+    return HostScheduler(default, host_limits)
+
+
+_scheduler: Optional[HostScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> HostScheduler:
+    """
+    Returns the process-wide scheduler, which gets built from the config on first use
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = scheduler_from_config()
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[HostScheduler]) -> None:
+    """
+    Replaces the process-wide scheduler; None means it will be re-built from
+    the config on next use
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,129 @@
+"""
+Compact in-memory index of known URLs, e.g. the urls of all the files and
+collections in the DB, so duplicates can be dropped without querying the DB
+
+Instead of the urls themselves only 64-bit digests are stored (sorted for
+binary search), which are confirmed after a Bloom filter check
+-> ~1MB for 100k urls compared to >10MB for a set of the url strings
+"""
+
+import math
+import bisect
+import hashlib
+import sqlite3
+
+from array import array
+from typing import Iterable, Iterator, Tuple, Set
+
+
+def url_hash(url: str) -> Tuple[int, int]:
+    """
+    :return: Two independent 64-bit hashes of url
+    """
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+class BloomFilter:
+    """
+    Bloom filter using double hashing on the hashes returned by url_hash
+
+    There are no false negatives, false positives happen with a probability of
+    about error_rate once `capacity` items were added
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.nr_bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.nr_hashes = max(1, round(self.nr_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.nr_bits + 7) // 8)
+
+    def _positions(self, hashes: Tuple[int, int]) -> Iterator[int]:
+        h1, h2 = hashes
+        for i in range(self.nr_hashes):
+            yield (h1 + i * h2) % self.nr_bits
+
+    def add_hash(self, hashes: Tuple[int, int]) -> None:
+        for pos in self._positions(hashes):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def contains_hash(self, hashes: Tuple[int, int]) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(hashes))
+
+    def add(self, item: str) -> None:
+        self.add_hash(url_hash(item))
+
+    def __contains__(self, item: str) -> bool:
+        return self.contains_hash(url_hash(item))
+
+
+class UrlIndex:
+    """
+    Set-like index of urls that only supports adding and membership tests
+
+    Membership is exact up to collisions of the 64-bit digests, which are
+    negligible for the number of urls we deal with
+    """
+
+    # spare capacity of the Bloom filter for urls added after the index was built
+    SPARE_CAPACITY = 1000
+
+    def __init__(self, urls: Iterable[str] = (), error_rate: float = 0.01):
+        # NOTE: store the hashes in arrays first, so we know the nr of urls for sizing
+        # the Bloom filter without having to keep all url strings around
+        first = array('Q')
+        second = array('Q')
+        for url in urls:
+            h1, h2 = url_hash(url)
+            first.append(h1)
+            second.append(h2)
+
+        self._bloom = BloomFilter(len(first) + self.SPARE_CAPACITY, error_rate)
+        for hashes in zip(first, second):
+            self._bloom.add_hash(hashes)
+        del second
+
+        self._digests = array('Q', sorted(set(first)))
+        # urls that were added after building the index e.g. during a
+        # clipboard watching session
+        self._added: Set[int] = set()
+
+    def _has_digest(self, digest: int) -> bool:
+        if digest in self._added:
+            return True
+        i = bisect.bisect_left(self._digests, digest)
+        return i < len(self._digests) and self._digests[i] == digest
+
+    def add(self, url: str) -> None:
+        hashes = url_hash(url)
+        self._bloom.add_hash(hashes)
+        self._added.add(hashes[0])
+
+    def __contains__(self, url: str) -> bool:
+        hashes = url_hash(url)
+        # Bloom filter rejects most unknown urls without the binary search
+        if not self._bloom.contains_hash(hashes):
+            return False
+        return self._has_digest(hashes[0])
+
+    def __len__(self) -> int:
+        return len(self._digests) + len(self._added)
+
+    def memory_usage(self) -> int:
+        """
+        :return: Approximate size of the index data in bytes
+        """
+        return (len(self._bloom.bits) + self._digests.itemsize * len(self._digests) +
+                # int object + set slot
+                len(self._added) * 50)
+
+
+def load_url_index(db_con: sqlite3.Connection) -> UrlIndex:
+    """
+    Builds an UrlIndex of all AudioFile and FileCollection urls in the DB
+    """
+    c = db_con.execute("""
+    SELECT url FROM AudioFile WHERE url IS NOT NULL
+    UNION ALL
+    SELECT url FROM FileCollection WHERE url IS NOT NULL""")
+    return UrlIndex(row[0] for row in c)
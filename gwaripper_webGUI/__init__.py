@@ -9,6 +9,8 @@ from .webGUI import main_bp, init_app
 from .csrf import init_app as csrf_init_app
 from .auth import auth_bp, init_app as auth_init_app
 from .gwaripper_db import init_db
+from .render_cache import init_app as render_cache_init_app
+from .api import api_bp
 
 
 def create_app(test_config=None, **kwargs):
@@ -52,7 +54,10 @@ def create_app(test_config=None, **kwargs):
         DATABASE_PATH=os.path.join(app.instance_path, 'gwarip_db.sqlite'),
         # limit upload size to 500MiB
         MAX_CONTENT_LENGTH=500 * 1024 * 1024,
-        SESSION_COOKIE_NAME='gwarsession'
+        SESSION_COOKIE_NAME='gwarsession',
+        # static files are cached by the browser for a year, urls generated with
+        # url_for('static', ..) contain the file's mtime (see webGUI.init_app)
+        SEND_FILE_MAX_AGE_DEFAULT=365 * 24 * 60 * 60
     )
 
     if test_config is None:
@@ -79,8 +84,10 @@ def create_app(test_config=None, **kwargs):
     csrf_init_app(app)
     init_app(app)
     init_db(app)
+    render_cache_init_app(app)
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(api_bp)
     auth_init_app(app)
 
     return app
@@ -0,0 +1,294 @@
+"""
+File: api.py
+Description: JSON API of the webGUI, so scripts or other frontends can page through
+             the library without having to scrape the html pages
+"""
+
+import json
+import gzip
+import base64
+import binascii
+import datetime
+
+from typing import Optional, List, Tuple, Any, Sequence
+
+from flask import request, Blueprint, Response
+from werkzeug.http import is_resource_modified
+
+from gwaripper.db import (
+    get_x_entries, get_x_listen_later_entries, search, RowData, SORT_COLUMNS,
+    search_sytnax_parser, has_relevance, last_change_seq
+)
+
+from .gwaripper_db import get_db
+from .webGUI import ENTRIES_PER_PAGE, get_sort_col, first_last_more
+
+# brotli is optional, responses are only gzipped if it's not installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# max nr of entries per page
+API_MAX_LIMIT = 500
+# bodies smaller than this aren't worth the cpu time of compressing them
+COMPRESS_MIN_SIZE = 1024
+# fields that are only set for search results: excerpt of the best matching column
+# of a full-text search with the matched terms surrounded by db.SNIPPET_HIGHLIGHT
+# and the rank of ranked searches
+SEARCH_ONLY_FIELDS = ("snippet", "relevance")
+
+
+class APIError(Exception):
+    def __init__(self, msg: str, status: int = 400):
+        super().__init__(msg)
+        self.msg = msg
+        self.status = status
+
+
+@api_bp.errorhandler(APIError)
+def handle_api_error(e: APIError):
+    return json_response({"error": e.msg}, status=e.status)
+
+
+class Cursor:
+    """
+    Opaque cursor for keyset pagination that's passed back to the client
+
+    Since the keyset values only make sense for the sort column and order they
+    were taken from, these are part of the cursor too
+    """
+
+    def __init__(self, direction: str, sort_col: str, asc_desc: str, keyset: Sequence[Any]):
+        self.direction = direction
+        self.sort_col = sort_col
+        self.asc_desc = asc_desc
+        # (id,) when sorting by id otherwise (value of sort column, id)
+        self.keyset = tuple(keyset)
+
+    def encode(self) -> str:
+        raw = json.dumps([self.direction, self.sort_col, self.asc_desc, self.keyset],
+                         separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'Cursor':
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, sort_col, asc_desc, keyset = json.loads(raw)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise APIError("Invalid cursor!")
+        # NOTE: values are passed to the DB using SQL param substitution, but the
+        # sort col is used in the statement itself
+        if (direction not in ("after", "before") or asc_desc not in ("ASC", "DESC") or
+                (sort_col != "id" and sort_col not in SORT_COLUMNS) or
+                not isinstance(keyset, list) or
+                len(keyset) != (1 if sort_col == "id" else 2) or
+                not isinstance(keyset[-1], int)):
+            raise APIError("Invalid cursor!")
+        return cls(direction, sort_col, asc_desc, keyset)
+
+
+def mv_columns() -> List[str]:
+    return [row[1] for row in get_db().execute(
+        "PRAGMA table_info(mv_audio_and_collection_combined)")]
+
+
+def get_fields(query: Optional[str]) -> List[str]:
+    columns = mv_columns()
+    fields_arg = request.args.get("fields", None, type=str)
+    if not fields_arg:
+        return columns + list(SEARCH_ONLY_FIELDS) if query else columns
+
+    fields = [f.strip() for f in fields_arg.split(",") if f.strip()]
+    invalid = [f for f in fields if f not in columns and f not in SEARCH_ONLY_FIELDS]
+    if invalid:
+        raise APIError(f"Unknown fields: {', '.join(invalid)}")
+    return fields
+
+
+def get_limit() -> int:
+    limit = request.args.get("limit", ENTRIES_PER_PAGE, type=int)
+    if not 0 < limit <= API_MAX_LIMIT:
+        raise APIError(f"limit has to be between 1 and {API_MAX_LIMIT}")
+    return limit
+
+
+def get_sorting(query: Optional[str]) -> Tuple[str, str, Optional[Cursor]]:
+    cursor_arg = request.args.get("cursor", None, type=str)
+    if not cursor_arg:
+        asc_desc = "ASC" if request.args.get(
+            'order', "DESC", type=str) == "ASC" else "DESC"
+        return get_sort_col(query), asc_desc, None
+
+    # sorting is taken from the cursor, so following a cursor only needs the cursor
+    # and the query args that select the entries (q, fields, limit)
+    cursor = Cursor.decode(cursor_arg)
+    if cursor.sort_col == "relevance" and not (
+            query and has_relevance(*search_sytnax_parser(query))):
+        raise APIError("Cursor sorts by relevance but the query can't be ranked!")
+    return cursor.sort_col, cursor.asc_desc, cursor
+
+
+def json_value(value: Any) -> Any:
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def field_value(entry: RowData, field: str) -> Any:
+    if field == "snippet":
+        return entry.snippet
+    elif field == "relevance":
+        return entry.relevance if "relevance" in entry.row.keys() else None
+    return json_value(entry.row[field])
+
+
+def response_encoding() -> Optional[str]:
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(available)
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        # level 6 is zlib's default; fast enough for responses generated per request
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def json_response(payload: Any, status: int = 200, encoding: Optional[str] = None,
+                  cacheable: bool = False) -> Response:
+    # compact, since the rows can be transferred in bulk
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    resp = Response(mimetype="application/json", status=status)
+    if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+        body = compress(body, encoding)
+        resp.content_encoding = encoding
+    else:
+        encoding = None
+    resp.set_data(body)
+    resp.vary.add("Accept-Encoding")
+    if cacheable:
+        resp.set_etag(representation_etag(encoding))
+        # private: only the logged in user may see the entries
+        # may be stored but has to be revalidated before it's used
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    return resp
+
+
+def representation_etag(encoding: Optional[str]) -> str:
+    # all of the entries are in the materialized view and every change to it bumps
+    # the change seq, so it can be used as strong validator for all responses
+    # without having to query the entries; caches store responses by url, but
+    # every encoding of the response needs its own strong validator
+    return f"{last_change_seq(get_db()):x}-{encoding or 'identity'}"
+
+
+def not_modified_response(encoding: Optional[str]) -> Optional[Response]:
+    """
+    :return: A 304 response if the client's cached copy is still valid, None otherwise
+    """
+    # NOTE: whether the body gets compressed depends on its size, which isn't known
+    # before the entries are queried; but the same url and change seq always produce
+    # the same body, so the client's copy is current if it matches either of them
+    for etag in dict.fromkeys((representation_etag(encoding), representation_etag(None))):
+        if not is_resource_modified(request.environ, etag=etag):
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            resp.vary.add("Accept-Encoding")
+            resp.cache_control.private = True
+            resp.cache_control.no_cache = True
+            return resp
+    return None
+
+
+def entries_page(listen_later_only: bool = False) -> Response:
+    query = request.args.get("q", "", type=str).strip() or None
+    fields = get_fields(query)
+    limit = get_limit()
+    order_by_col, asc_desc, cursor = get_sorting(query)
+
+    encoding = response_encoding()
+    # NOTE: checked after the args were validated but before any of the entries
+    # are queried
+    not_modified = not_modified_response(encoding)
+    if not_modified is not None:
+        return not_modified
+    order_by = f"AudioFile.{order_by_col} {asc_desc}"
+
+    after = before = None
+    if cursor is not None:
+        if cursor.direction == "after":
+            after = cursor.keyset
+        else:
+            before = cursor.keyset
+
+    entries: Optional[List[RowData]]
+    # get 1 entry more than limit so we know if there are more in that direction
+    if query:
+        entries = search(
+            get_db(), query, order_by=order_by, limit=limit+1, after=after, before=before,
+            **({'additional_conditions': 'AudioFile.listen_later = 1'}
+               if listen_later_only else {}))
+        if entries is None:
+            raise APIError("Invalid search query!")
+    elif listen_later_only:
+        entries = get_x_listen_later_entries(
+            get_db(), limit+1, after=after, before=before, order_by=order_by)
+    else:
+        entries = get_x_entries(
+            get_db(), limit+1, after=after, before=before, order_by=order_by)
+    first, last, more = first_last_more(entries, order_by_col, after, before, per_page=limit)
+
+    def page_cursor(direction: str, keyset: Any) -> str:
+        return Cursor(direction, order_by_col, asc_desc,
+                      keyset if isinstance(keyset, tuple) else (keyset,)).encode()
+
+    return json_response({
+        "fields": fields,
+        # rows as lists, so the field names aren't repeated for every entry
+        "entries": [[field_value(e, f) for f in fields] for e in entries],
+        "next": page_cursor("after", last) if more and more["next"] else None,
+        "prev": page_cursor("before", first) if more and more["prev"] else None,
+    }, encoding=encoding, cacheable=True)
+
+
+@api_bp.route("/entries", methods=["GET"])
+def entries():
+    """
+    Entries of the library, search results if the query arg q is passed
+
+    Query args: q, fields (comma-separated), limit, sort_col, order, cursor
+    (the next/prev cursor of the previous page; it determines the sorting)
+    """
+    return entries_page()
+
+
+@api_bp.route("/entries/listen-later", methods=["GET"])
+def listen_later_entries():
+    return entries_page(listen_later_only=True)
+
+
+@api_bp.route("/entries/<int:entry_id>", methods=["GET"])
+def entry(entry_id: int):
+    fields = get_fields(None)
+    encoding = response_encoding()
+    not_modified = not_modified_response(encoding)
+    if not_modified is not None:
+        return not_modified
+
+    row = get_db().execute(
+        "SELECT * FROM mv_audio_and_collection_combined WHERE id = ?",
+        (entry_id,)).fetchone()
+    if row is None:
+        raise APIError(f"Could not find entry with id {entry_id}!", status=404)
+    entry = RowData(row)
+    return json_response({
+        "fields": fields,
+        "entry": [field_value(entry, f) for f in fields],
+    }, encoding=encoding, cacheable=True)
@@ -2,7 +2,7 @@ import os.path
 import functools
 from flask import (
         Blueprint, request, redirect, url_for,
-        render_template, flash, session, current_app
+        render_template, flash, session, current_app, jsonify
         )
 from werkzeug.security import check_password_hash, generate_password_hash
 
@@ -126,6 +126,9 @@ def init_app(app):
                 # allow access to is_public marked functions
                 getattr(app.view_functions[request.endpoint], 'is_public', False)]):
             return  # Access granted
+        elif request.blueprint == "api":
+            # scripts using the api can't follow the redirect to the login form
+            return jsonify({"error": "Login required!"}), 401
         else:
             return redirect(url_for('auth.login'))
 
@@ -1,30 +1,50 @@
-import threading
 import sqlite3
+import contextlib
+
+from typing import Iterator
 
 from flask import current_app, g
 
-from gwaripper.db import load_or_create_sql_db
+from gwaripper.db import ConnectionManager
+
+
+def get_db_manager() -> ConnectionManager:
+    return current_app.extensions["gwaripper_db"]
 
 
-def get_db():
-    # sqlite3 connections can't be shared between threads, but the module
-    # can be used concurrently (assuming sqlite3.threadsafety>=1)
-    # so every thread creates their own connection here
-    # and stores it in the global app context g (which afaik is
-    # threadlocal and every requrest is a new thread and  pushes
-    # a new app context)
+def get_db() -> sqlite3.Connection:
+    # sqlite3 connections can't be used by multiple threads at the same time
+    # so every request (which is handled by its own thread) checks out one
+    # of the manager's pooled read-only connections and stores it in the
+    # app context g (which afaik is threadlocal and every request pushes
+    # a new app context); it's returned to the pool on teardown
     if 'db' not in g:
-        # cant store in app.config since thread specific and app config isnt
-        g.db, _ = load_or_create_sql_db(
-            current_app.config["DATABASE_PATH"])
-        g.db.row_factory = sqlite3.Row
+        g.db = get_db_manager().acquire_reader()
     return g.db
 
 
+@contextlib.contextmanager
+def get_db_writer() -> Iterator[sqlite3.Connection]:
+    """
+    The app's single writer connection, which is shared by all requests
+    Commits on success and rolls back on exceptions
+    """
+    with get_db_manager().writer() as db:
+        yield db
+
+
 def init_db(app):
+    # NOTE: creating/migrating the DB happens once here instead of on every request
+    # pool size roughly matches the nr of concurrent requests we expect from
+    # a single user
+    pool_size = app.config.get("DATABASE_POOL_SIZE", 8)
+    app.extensions["gwaripper_db"] = ConnectionManager(
+        app.config["DATABASE_PATH"], pool_size=pool_size,
+        min_readers=min(2, pool_size))
+
     @app.teardown_appcontext
     def teardown_db(exception):
         db = g.pop('db', None)
 
         if db is not None:
-            db.close()
+            app.extensions["gwaripper_db"].release_reader(db)
@@ -0,0 +1,100 @@
+import threading
+import functools
+import collections
+
+from typing import Optional, Tuple, Hashable, Callable
+
+from flask import current_app, request, session
+
+from gwaripper.db import last_change_seq
+
+from .gwaripper_db import get_db
+
+
+class RenderCache:
+    """
+    LRU cache of rendered pages that are only valid as long as the DB didn't change
+
+    The change counter is the sequence nr of the last change of the materialized view
+    (see gwaripper.db.last_change_seq), which is bumped by triggers on every write
+    that can change what's displayed (favorites, ratings, removals, listen later,
+    new downloads) no matter which process or connection did the write
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.change_seq: Optional[int] = None
+        self._pages: 'collections.OrderedDict[Hashable, str]' = collections.OrderedDict()
+        # NOTE: requests are handled by multiple threads
+        self._lock = threading.Lock()
+
+    def _check_seq(self, change_seq: int) -> None:
+        # all pages were rendered with the same change_seq, so all of them are
+        # outdated once it changes
+        if change_seq != self.change_seq:
+            self._pages.clear()
+            self.change_seq = change_seq
+
+    def get(self, key: Hashable, change_seq: int) -> Optional[str]:
+        with self._lock:
+            self._check_seq(change_seq)
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put(self, key: Hashable, change_seq: int, page: str) -> None:
+        with self._lock:
+            self._check_seq(change_seq)
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+            self.change_seq = None
+
+
+def get_render_cache() -> RenderCache:
+    return current_app.extensions["gwaripper_render_cache"]
+
+
+def page_cache_key() -> Tuple[Hashable, ...]:
+    # all query args (q, sort_col, order, after, before) so the same page can be
+    # reached with the args in a different order
+    # the csrf token is embedded in the page (layout.html)
+    return (request.endpoint, tuple(sorted(request.args.items(multi=True))),
+            session.get("_csrf_token", None))
+
+
+def cached_page(view: Callable) -> Callable:
+    """
+    Caches the html returned by view (other responses e.g. redirects aren't cached)
+    in the app's RenderCache
+    """
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        # flashed messages are part of the page but are only shown once
+        if "_flashes" in session:
+            return view(**kwargs)
+
+        cache = get_render_cache()
+        key = page_cache_key()
+        change_seq = last_change_seq(get_db())
+        page = cache.get(key, change_seq)
+        if page is None:
+            page = view(**kwargs)
+            # NOTE: without a csrf token the view generates a new one for this
+            # session, which mustn't end up in another session's page
+            if isinstance(page, str) and key[-1] is not None:
+                cache.put(key, change_seq, page)
+        return page
+
+    return wrapped_view
+
+
+def init_app(app):
+    app.extensions["gwaripper_render_cache"] = RenderCache(
+        app.config.get("RENDER_CACHE_SIZE", 64))
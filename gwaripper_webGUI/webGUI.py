@@ -6,8 +6,13 @@ Description: Creates a webGUI for GWARipper using flask
 import os
 import re
 import datetime
+import secrets
+import mimetypes
+import functools
 
-from typing import Optional, List, Tuple, Dict, Any, NamedTuple
+from typing import Optional, List, Tuple, Dict, Any, NamedTuple, Iterator
+
+from markupsafe import Markup, escape
 
 from flask import (
     current_app, request, redirect, url_for, Blueprint,
@@ -15,18 +20,22 @@ from flask import (
     jsonify, send_file, session, g, Response, abort
 )
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
+from werkzeug.http import is_resource_modified, parse_if_range_header
 
 from gwaripper.gwaripper import GWARipper
 from gwaripper import config
 from gwaripper.db import (
     get_x_entries, get_x_listen_later_entries, validate_order_by_str, search,
     remove_entry as gwa_remove_entry, set_favorite_entry,
-    set_rating, RowData
+    set_rating, RowData, sort_column_value, search_sytnax_parser, SNIPPET_HIGHLIGHT,
+    has_relevance, fuzzy_match_names
 )
-from gwaripper.info import sanitize_filename, FileInfo, FileCollection
+from gwaripper.info import FileInfo, FileCollection
 from gwaripper.extractors.base import BaseExtractor
 
-from .gwaripper_db import get_db
+from .gwaripper_db import get_db, get_db_writer
+from .render_cache import cached_page
 
 ENTRIES_PER_PAGE = 30
 
@@ -38,6 +47,14 @@ ALLOWED_EXTENSIONS = {"m4a", "mp4", "webm", "aac", "mp3", "flv", "avi", "mpeg",
                       "oga", "mogg", "act", "flac", "mpc", "opus", "wav", "wma"}
 
 
+@functools.lru_cache(maxsize=None)
+def static_file_version(static_folder: str, filename: str) -> int:
+    try:
+        return int(os.path.getmtime(os.path.join(static_folder, filename)))
+    except OSError:
+        return 0
+
+
 def init_app(app):
     # send that we accept byte ranges for sending partial content
     @app.after_request
@@ -45,6 +62,14 @@ def init_app(app):
         response.headers.add('Accept-Ranges', 'bytes')
         return response
 
+    # static files are cached for a long time (see SEND_FILE_MAX_AGE_DEFAULT)
+    # -> add their mtime to the url so the browser gets the new file once it changed
+    # (files are only checked once per process, they only change on updates)
+    @app.url_defaults
+    def add_static_file_version(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values.setdefault('v', static_file_version(app.static_folder, values['filename']))
+
     return None
 
 # flask send_from_directory just sends the whole file to the client, which can cause
@@ -58,26 +83,184 @@ def init_app(app):
 #      https://stackoverflow.com/questions/57314357/streaming-video-files-using-flask
 
 
-# this and part of artist_file from https://stackoverflow.com/a/57324447
-# by waynetech
-def get_chunk(filename, byte1=None, byte2=None):
-    file_size = os.stat(filename).st_size
-    start = 0
-    # roughly 6secs for a 128kBit/s mp3 file
-    chunk_size = 102400
+# size of the blocks byte ranges are read and sent in, so the memory a stream
+# needs doesn't depend on the size of the file or the requested range
+FILE_BLOCK_SIZE = 64 * 1024
+# more ranges (after merging overlapping ones) than this in one request are ignored
+# and the whole file is sent instead, as permitted by rfc7233 section 6.1
+MAX_RANGES_PER_REQUEST = 16
+
+
+class ByteRange(NamedTuple):
+    # byte-pos is 0-based
+    start: int
+    # exclusive
+    stop: int
+
+    def content_range(self, file_size: int) -> str:
+        return f"bytes {self.start}-{self.stop - 1}/{file_size}"
+
+
+# byte-range-spec or suffix-byte-range-spec: first-byte-pos "-" [ last-byte-pos ]
+# or "-" suffix-length
+BYTE_RANGE_SPEC_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+def satisfiable_ranges(range_header: str, file_size: int) -> Optional[List[ByteRange]]:
+    """
+    Parses the Range header and clamps its ranges to the size of the file
+    https://tools.ietf.org/html/rfc7233#section-2.1
+
+    :return: The satisfiable ranges sorted by their start with overlapping or
+             adjacent ones merged, an empty list if none of the ranges can be
+             satisfied (-> 416), None if the header should be ignored (-> 200)
+    """
+    # NOTE: not using werkzeug's parse_range_header since it rejects overlapping
+    # ranges or ones that aren't in ascending order, which rfc7233 allows
+    # starts with "bytes " or "bytes=" even though rfc7233 only specifies "="
+    units, _, range_set = range_header.replace("bytes ", "bytes=", 1).partition("=")
+    # other units are ignored
+    if units.strip().lower() != "bytes":
+        return None
+
+    requested: List[Tuple[int, int]] = []
+    # byte-range-set is a comma-separated list, which may contain empty elements
+    for spec in (spec for spec in range_set.split(",") if spec.strip()):
+        m = BYTE_RANGE_SPEC_RE.match(spec)
+        if not m or not (m.group(1) or m.group(2)):
+            # invalid headers are ignored
+            return None
+        first_byte_str, last_byte_str = m.groups()
+        if not first_byte_str:
+            # the last suffix-length bytes
+            requested.append((max(file_size - int(last_byte_str), 0), file_size))
+            continue
+        first_byte = int(first_byte_str)
+        if not last_byte_str:
+            # open-ended request
+            requested.append((first_byte, file_size))
+            continue
+        last_byte = int(last_byte_str)
+        if last_byte < first_byte:
+            return None
+        # byte-pos is 0-based and last-byte-pos is inclusive
+        requested.append((first_byte, min(last_byte + 1, file_size)))
+    if not requested:
+        return None
+
+    ranges: List[ByteRange] = []
+    for start, stop in sorted(requested):
+        if start >= stop:
+            continue
+        if ranges and start <= ranges[-1].stop:
+            ranges[-1] = ByteRange(ranges[-1].start, max(stop, ranges[-1].stop))
+        else:
+            ranges.append(ByteRange(start, stop))
+
+    if len(ranges) > MAX_RANGES_PER_REQUEST:
+        return None
+    return ranges
 
-    if byte1 < file_size:
-        start = byte1
-    if byte2:
-        # byte-pos is 0-based
-        chunk_size = byte2 + 1 - byte1
-    else:
-        chunk_size = file_size - start
 
+def iter_file_range(filename: str, byte_range: ByteRange,
+                    block_size: int = FILE_BLOCK_SIZE) -> Iterator[bytes]:
+    # NOTE: the file is only opened once the response is sent, so a HEAD request
+    # (whose body is never iterated) doesn't even open it
     with open(filename, 'rb') as f:
-        f.seek(start)
-        chunk = f.read(chunk_size)
-    return chunk, start, chunk_size, file_size
+        f.seek(byte_range.start)
+        remaining = byte_range.stop - byte_range.start
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                # file was truncated in the meantime
+                break
+            remaining -= len(block)
+            yield block
+
+
+def multipart_byteranges(filename: str, ranges: List[ByteRange], file_size: int,
+                         mimetype: str) -> Tuple[Iterator[bytes], int, str]:
+    """
+    Body of a multipart/byteranges response
+    https://tools.ietf.org/html/rfc7233#appendix-A
+
+    :return: Iterator over the body, its length and the boundary
+    """
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+         f"Content-Range: {byte_range.content_range(file_size)}\r\n\r\n").encode("ascii")
+        for byte_range in ranges]
+    closing = f"\r\n--{boundary}--\r\n".encode("ascii")
+    length = (sum(len(h) for h in part_headers) + len(closing) +
+              sum(r.stop - r.start for r in ranges))
+
+    def body() -> Iterator[bytes]:
+        for part_header, byte_range in zip(part_headers, ranges):
+            yield part_header
+            yield from iter_file_range(filename, byte_range)
+        yield closing
+
+    return body(), length, boundary
+
+
+# audio files practically never change once they're downloaded -> let the browser
+# re-use cached (ranges of) files without asking again, e.g. when seeking back
+# and forth in the player
+AUDIO_MAX_AGE = 24 * 60 * 60
+
+
+def file_validators(st: os.stat_result) -> Tuple[str, datetime.datetime]:
+    """
+    :return: ETag (unquoted) and Last-Modified for a file with the stat result st
+    """
+    # NOTE: size and mtime in ns change whenever the file is re-written, so this
+    # can be used as strong validator without having to hash the contents
+    return (f"{st.st_size:x}-{st.st_mtime_ns:x}",
+            datetime.datetime.fromtimestamp(int(st.st_mtime), tz=datetime.timezone.utc))
+
+
+def set_validators(resp: Response, etag: str, last_modified: datetime.datetime,
+                   max_age: Optional[int] = None) -> Response:
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    # private: only the logged in user may see the files
+    resp.cache_control.private = True
+    if max_age is None:
+        # may be stored but has to be revalidated before it's used
+        resp.cache_control.no_cache = True
+    else:
+        resp.cache_control.max_age = max_age
+    return resp
+
+
+def not_modified_response(etag: str, last_modified: datetime.datetime,
+                          max_age: Optional[int] = None) -> Optional[Response]:
+    """
+    Handles If-None-Match and If-Modified-Since
+
+    :return: A 304 response if the client's cached copy is still valid, None otherwise
+    """
+    # NOTE: If-Modified-Since is ignored if If-None-Match is present
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return set_validators(Response(status=304), etag, last_modified, max_age)
+
+
+def if_range_matches(etag: str, last_modified: datetime.datetime) -> bool:
+    """
+    https://tools.ietf.org/html/rfc7233#section-3.2
+    :return: False if the Range header has to be ignored, since the client's partial
+             copy is from another version of the file
+    """
+    if_range = request.headers.get('If-Range', None)
+    if if_range is None:
+        return True
+    parsed = parse_if_range_header(if_range)
+    if parsed.date is not None:
+        return parsed.date == last_modified
+    # needs a strong comparison, so weak etags never match
+    return not if_range.lstrip().startswith("W/") and parsed.etag == etag
 
 
 # browser sends open-ended request 0- but not the whole file is sent
@@ -91,51 +274,59 @@ def get_chunk(filename, byte1=None, byte2=None):
 # if there's a file with 1000 bytes: the first request is always Range:
 # bytes=0-. The browser decides to load 100 bytes. The user seeks toward the
 # end, and the browser sends another request Range: bytes=900-.
+# -> the response body is streamed in blocks instead of reading the whole range
+# into memory, and whole files (no or 0- ranges) are passed to wsgi.file_wrapper
+# so servers that support it (e.g. waitress, gunicorn) can use sendfile
 
 # create route for artist files/static data that isnt in static, can be used in template with
 # /audio/artist/filename or with url_for(main.artist_file, artist='artist', filename='filename')
 # Custom static data
+# NOTE: flask also answers HEAD requests with this view, werkzeug then drops the body
+# but keeps our headers
 @main_bp.route('/artist_file/<path:filename>')
 def artist_file(filename):
-    range_header = request.headers.get('Range', None)
     subpath = request.args.get('subpath', '')
-
-    first_byte, last_byte = 0, None
-    if range_header:
-        # https://tools.ietf.org/html/rfc7233#section-4.2
-        # * if complete-length unknown
-        # byte-pos is 0-based
-        # request: byte-range = first-byte-pos "-" last-byte-pos
-        # / without "" means alternative "/" is a literal /
-        # () forms a group
-        # response: byte-range "/" ( complete-length / "*" )
-        # or on 416 (Range Not Satisfiable): unsatisfied-range = "*/" complete-length
-
-        # starts with "bytes " or "bytes=" even though rfc7233 only specifies SP (space)
-        start_first_byte = next(
-            i for i, c in enumerate(range_header) if c.isdigit())
-        first_byte_str, last_byte_str = range_header[start_first_byte:].split(
-            '-')
-        first_byte = int(first_byte_str)
-        if last_byte_str:
-            last_byte = int(last_byte)
-
     full_path = os.path.join(current_app.instance_path, subpath, filename)
-    try:
-        chunk, start, chunk_size, file_size = get_chunk(
-            full_path, first_byte, last_byte)
-    except FileNotFoundError:
+    if not os.path.isfile(full_path):
         abort(404)
+    st = os.stat(full_path)
+    file_size = st.st_size
+    etag, last_modified = file_validators(st)
+    not_modified = not_modified_response(etag, last_modified, AUDIO_MAX_AGE)
+    if not_modified is not None:
+        return not_modified
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
 
-    # mimetype should be type/subtype;parameter=value
-    resp = Response(chunk, 206, mimetype='audio',
-                    content_type='audio', direct_passthrough=True)
-    # byte-pos is 0-based
-    resp.headers.add(
-        'Content-Range', f"bytes {start}-{start + chunk_size - 1}/{file_size}")
+    range_header = request.headers.get('Range', None)
+    ranges = (satisfiable_ranges(range_header, file_size)
+              if range_header and if_range_matches(etag, last_modified) else None)
+    if ranges is not None and not ranges:
+        # https://tools.ietf.org/html/rfc7233#section-4.4
+        # unsatisfied-range = "*/" complete-length
+        resp = Response(status=416)
+        resp.headers['Content-Range'] = f"bytes */{file_size}"
+        return resp
+
+    if ranges is None or ranges == [ByteRange(0, file_size)]:
+        # whole file
+        resp = Response(wrap_file(request.environ, open(full_path, 'rb'), FILE_BLOCK_SIZE),
+                        206 if ranges else 200, mimetype=mimetype,
+                        direct_passthrough=True)
+        resp.content_length = file_size
+        if ranges:
+            resp.headers['Content-Range'] = ranges[0].content_range(file_size)
+    elif len(ranges) == 1:
+        resp = Response(iter_file_range(full_path, ranges[0]), 206, mimetype=mimetype,
+                        direct_passthrough=True)
+        resp.content_length = ranges[0].stop - ranges[0].start
+        resp.headers['Content-Range'] = ranges[0].content_range(file_size)
+    else:
+        body, length, boundary = multipart_byteranges(full_path, ranges, file_size, mimetype)
+        resp = Response(body, 206, content_type=f"multipart/byteranges; boundary={boundary}",
+                        direct_passthrough=True)
+        resp.content_length = length
 
-    # TODO send 416 with unsatisfied-range if we can't provide the range that was requested
-    return resp
+    return set_validators(resp, etag, last_modified, AUDIO_MAX_AGE)
 
 
 @main_bp.route('/embed/audio/<path:filename>')
@@ -147,10 +338,16 @@ def embed_audio(filename: str):
         return (
             "Local file couldn't be found, use the link to "
             "the source page (world icon) instead!")
-    return "".join(["<audio controls src='",
-                   url_for('main.artist_file',
-                           subpath=subpath, filename=filename),
-                   "'></audio>"])
+    # NOTE: the html only depends on the url and the file existing, but the file's
+    # validators are as cheap as any and change if it's replaced
+    etag, last_modified = file_validators(os.stat(full_path))
+    not_modified = not_modified_response(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(Response("".join([
+        "<audio controls src='",
+        url_for('main.artist_file', subpath=subpath, filename=filename),
+        "'></audio>"])), etag, last_modified)
 
 
 @main_bp.route('/embed/selftext/<path:filename>')
@@ -164,23 +361,27 @@ def embed_selftext(filename: str):
     if not os.path.exists(full_path):
         return (
             "<br/>Error: Local selftext file couldn&#39;t be found!<br/>")
+    # file is only read and turned into html if the browser's copy is outdated
+    etag, last_modified = file_validators(os.stat(full_path))
+    not_modified = not_modified_response(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
     with open(full_path, 'r') as f:
         lines = f.readlines()
-    return "".join(['<h2>Selftext:</h2>',
-                    "<br/>".join(lines)])
+    return set_validators(Response("".join(['<h2>Selftext:</h2>',
+                                            "<br/>".join(lines)])), etag, last_modified)
 
 
 # py3.6: new way to define named tuples with types using class syntax
 # order of variables is also the order you pass them during initialization
-# AudioPathHelper('author', 'subpath',  'self.txt')
+# AudioPathHelper('author/subpath', 'author/subpath/self.txt')
 class AudioPathHelper(NamedTuple):
     subpath: str
+    # relative to the root dir
     selftext_filename: Optional[str]
 
 
 def create_audiopath_helper(entry: RowData) -> AudioPathHelper:
-    selftext_filename: Optional[str] = None
-
     if entry.collection_id is not None:
         author_subdir = entry.fcol_alias_name
         subpath = entry.fcol_subpath
@@ -188,35 +389,40 @@ def create_audiopath_helper(entry: RowData) -> AudioPathHelper:
         author_subdir = entry.alias_name
         subpath = ""
 
-    # we write a selftext in set_missing_reddit even though we don't have a filename
-    # but ignore that here @Incomplete
-    if entry.filename and entry.fcol_id_on_page is not None:
-        date: datetime.date = entry.date
-        # date v0.3 started
-        if date > datetime.date(year=2020, month=10, day=10):
-            # @CleanUp basically repeating code from info.py here
-
-            # selftext might have been added later which means it won't use
-            # fcol_alias_name etc. but just alias_name
-            # needs author_subdir to get correct length
-            selftext_filename = sanitize_filename(
-                os.path.join(author_subdir, subpath),
-                entry.fcol_title) + '.txt'
-        else:
-            selftext_filename = f"{entry.filename}.txt"
-
+    # NOTE: the path the selftext was written to is stored in the DB (see
+    # migrations/0010_selftext_path.py) instead of re-constructing it here, which
+    # depended on the version that wrote it
     return AudioPathHelper(
         os.path.join(author_subdir, subpath).replace('\\', '/'),
-        selftext_filename)
+        entry.reddit_selftext_path)
 
 
-def get_entries(query: Optional[str] = None) -> Tuple[
-        List[RowData], List[AudioPathHelper], str, str, Optional[Any], Optional[Any],
-        Optional[Dict[str, bool]]]:
-    order_by_col = request.args.get('sort_col', "id", type=str)
+@main_bp.app_template_filter()
+def highlight_snippet(snippet: str) -> Markup:
+    # snippet is not escaped (unlike other values it's not passed to the template
+    # directly) and contains the raw text of e.g. the description
+    start, end = SNIPPET_HIGHLIGHT
+    return Markup(str(escape(snippet)).replace(start, "<mark>").replace(end, "</mark>"))
+
+
+def get_sort_col(query: Optional[str] = None) -> str:
+    # results of full-text and fuzzy artist searches are ranked by relevance unless
+    # another sorting col was chosen; all other queries have nothing to rank by
+    ranked = bool(query and has_relevance(*search_sytnax_parser(query)))
+    order_by_col = request.args.get('sort_col', type=str) or (
+        "relevance" if ranked else "id")
     # validate our sorting col otherwise were vulnerable to sql injection
     if not validate_order_by_str(order_by_col):
         order_by_col = "id"
+    if order_by_col == "relevance" and not ranked:
+        order_by_col = "id"
+    return order_by_col
+
+
+def get_entries(query: Optional[str] = None) -> Tuple[
+        List[RowData], List[AudioPathHelper], str, str, Optional[Any], Optional[Any],
+        Optional[Dict[str, bool]]]:
+    order_by_col = get_sort_col(query)
     asc_desc = "ASC" if request.args.get(
         'order', "DESC", type=str) == "ASC" else "DESC"
     order_by = f"AudioFile.{order_by_col} {asc_desc}"
@@ -256,6 +462,7 @@ def get_entries(query: Optional[str] = None) -> Tuple[
 
 
 @main_bp.route('/', methods=["GET"])
+@cached_page
 def show_entries():
     entries, audio_paths, order_by_col, asc_desc, first, last, more = get_entries()
 
@@ -272,7 +479,8 @@ def show_entries():
 
 
 def first_last_more(entries: List[RowData], order_by_col: str = "id",
-                    after: Optional[int] = None, before: Optional[int] = None) -> Tuple[
+                    after: Optional[int] = None, before: Optional[int] = None,
+                    per_page: int = ENTRIES_PER_PAGE) -> Tuple[
         Optional[Any], Optional[Any], Optional[Dict[str, bool]]]:
     if not entries:
         return None, None, None
@@ -281,7 +489,7 @@ def first_last_more(entries: List[RowData], order_by_col: str = "id",
 
     # we alway get one row more to know if there are more results after our current last_id
     # in the direction we moved in
-    if len(entries) == ENTRIES_PER_PAGE+1:
+    if len(entries) == per_page+1:
         onemore = True
     else:
         onemore = False
@@ -316,14 +524,15 @@ def first_last_more(entries: List[RowData], order_by_col: str = "id",
     if "id" != order_by_col.lower():
         # if we are sorting by something else than id
         # we also need to pass the values of that col
-        primary_first = getattr(entries[0], order_by_col)
-        primary_last = getattr(entries[-1], order_by_col)
+        primary_first = sort_column_value(entries[0], order_by_col)
+        primary_last = sort_column_value(entries[-1], order_by_col)
         return (primary_first, first_id), (primary_last, last_id), more
     else:
         return first_id, last_id, more
 
 
 @main_bp.route("/search", methods=["GET"])
+@cached_page
 def search_entries():
     searchstr = request.args['q']
     if URL_RE.match(searchstr):
@@ -347,14 +556,12 @@ def search_entries():
 
 
 @main_bp.route('/listen-later')
+@cached_page
 def show_listen_later() -> Tuple[
         List[RowData], List[AudioPathHelper], str, str, Optional[Any], Optional[Any],
         Optional[Dict[str, bool]]]:
-    order_by_col = request.args.get('sort_col', "id", type=str)
     query = request.args.get('q', '', type=str)
-    # validate our sorting col otherwise were vulnerable to sql injection
-    if not validate_order_by_str(order_by_col):
-        order_by_col = "id"
+    order_by_col = get_sort_col(query)
     asc_desc = "ASC" if request.args.get(
         'order', "DESC", type=str) == "ASC" else "DESC"
     order_by = f"AudioFile.{order_by_col} {asc_desc}"
@@ -376,9 +583,7 @@ def show_listen_later() -> Tuple[
         entries = search(
             get_db(), query, order_by=order_by,
             limit=ENTRIES_PER_PAGE+1, after=after, before=before,
-            additional_conditions=('EXISTS (SELECT 1 '
-                                   'FROM ListenLater WHERE '
-                                   'ListenLater.audio_id = AudioFile.id)'))
+            additional_conditions='AudioFile.listen_later = 1')
     else:
         entries: List[RowData] = get_x_listen_later_entries(
             get_db(), ENTRIES_PER_PAGE+1, after=after, before=before,
@@ -413,7 +618,7 @@ def entry(entry_id: int):
     db = get_db()
 
     query = """
-        SELECT * FROM v_audio_and_collection_combined AudioFile
+        SELECT * FROM mv_audio_and_collection_combined AudioFile
         WHERE id = ?
     """
     c = db.execute(query, (entry_id,))
@@ -468,7 +673,8 @@ def set_favorite():
     fav_intbool = request.form.get("favIntbool", None, type=int)
     if entry_id is None or fav_intbool is None:
         return jsonify({"error": "Missing entry id or fav value from data!"})
-    set_favorite_entry(get_db(), entry_id, fav_intbool)
+    with get_db_writer() as db:
+        set_favorite_entry(db, entry_id, fav_intbool)
     return jsonify({})
 
 
@@ -477,20 +683,18 @@ def listen_later():
     entry_id = request.form.get("entryId", None, type=int)
     if entry_id is None:
         return '<span style="color: red;">Error: Missing entryId!</span>'
-    db = get_db()
-    c = db.execute('SELECT * FROM ListenLater WHERE audio_id = ?', (entry_id,))
-    row = c.fetchone()
-    if not row:
-        # add it
-        with db:
+    with get_db_writer() as db:
+        c = db.execute('SELECT * FROM ListenLater WHERE audio_id = ?', (entry_id,))
+        row = c.fetchone()
+        if not row:
+            # add it
             c.execute(
                 'INSERT INTO ListenLater (audio_id) VALUES (?)', (entry_id,))
-        return '<i class="fas fa-clock"></i>'
-    else:
-        # remove it
-        with db:
+            return '<i class="fas fa-clock"></i>'
+        else:
+            # remove it
             c.execute('DELETE FROM ListenLater WHERE audio_id = ?', (entry_id,))
-        return '<i class="far fa-clock"></i>'
+            return '<i class="far fa-clock"></i>'
 
 
 @main_bp.route("/entry/rate", methods=("POST",))
@@ -506,7 +710,8 @@ def rate_entry():
             'components/entry_rate.html',
             rate_error='Error: Failed to update rating! Missing rating!')
 
-    set_rating(get_db(), entry_id, rating)
+    with get_db_writer() as db:
+        set_rating(db, entry_id, rating)
     return render_template(
         'components/entry_rate.html',
         entry={'id': entry_id, 'rating': rating})
@@ -514,7 +719,8 @@ def rate_entry():
 
 @main_bp.route('/entry/<int:entry_id>', methods=("DELETE",))
 def remove_entry(entry_id: int):
-    gwa_remove_entry(get_db(), entry_id, current_app.instance_path)
+    with get_db_writer() as db:
+        gwa_remove_entry(db, entry_id, current_app.instance_path)
     return (
         '<div class="red-fcolor">Entry was successfully removed from the DB! '
         'You have to delete the files manually!</div>')
@@ -524,16 +730,21 @@ def remove_entry(entry_id: int):
 def show_add_audio():
     new_info = FileInfo(BaseExtractor, True, "", "", "",
                         None, "New Audio", None, None)
-    db = get_db()
-    c = db.execute("SELECT name FROM Artist")
-    artists = [r['name'] for r in c.fetchall()]
-
+    # NOTE: artists aren't all embedded into the page anymore, the artist select
+    # loads them from artist_typeahead while typing
     return render_template(
         'edit_audio.html',
-        artists=artists,
         file_info=new_info)
 
 
+@main_bp.route("/artist/typeahead", methods=["GET"])
+def artist_typeahead():
+    query = request.args.get("q", "", type=str)
+    matches = fuzzy_match_names(get_db(), query, table="Artist") if query else []
+    # ordered by descending similarity
+    return jsonify({"artists": [m._asdict() for m in matches]})
+
+
 @main_bp.route("/entry/add/submit", methods=("POST",))
 def add_audio():
     # check if the post request has the file part
@@ -577,8 +788,7 @@ def add_audio():
 
     flash("File imported successfully!")
 
-    db = get_db()
-    with db:
+    with get_db_writer() as db:
         # since manually added files currently don't have a FileCollection
         # we need to add the associated artist manually
         GWARipper.add_artist(db, new_info.author)
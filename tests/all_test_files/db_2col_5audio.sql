@@ -19,7 +19,7 @@ INSERT INTO "FileCollection" VALUES
 (2,'https://www.reddit.com/r/gonewildaudio/comments/6dvum7/f4m_my_daughter_is_an_idiot_for_breaking_up_with/','6dvum7','[F4M] My Daughter is an Idiot for Breaking Up With You... Let Me Help You Feel Better [milf] [sex with your ex''s sweet + sexy mom] [realistic slow build] [kissing] [sloppy wet handjob + deep-throating blowjob] [dirty talk] [sucking my big tits] [riding you on the couch] [creampie] [improv]','',2,NULL,5);
 UPDATE "GWAR_Version" SET
 version_id = 2, dirty = 0;
-INSERT INTO "RedditInfo" VALUES
+INSERT INTO "RedditInfo"(id, created_utc) VALUES
 (1,1600718407.0),
 (2,1496001999.0);
 COMMIT;
@@ -15,13 +15,22 @@ def pytest_configure(config):
         "markers",
         "broken_sites: enable to test extractors/downloads of broken sites: e.g. chirbit"
     )
+    config.addinivalue_line(
+        "markers",
+        "benchmark: micro-benchmarks that print timings, enable with --benchmark"
+    )
 
     # only test broken sites if the --test-broken option was passed
     if not config.option.test_broken_sites:
         # append to config.option.markexpr so we don't overwrite exprs passed with -m
         setattr(config.option, 'markexpr',
                 f"{config.option.markexpr}{' and ' if config.option.markexpr else ''}not broken_sites")
+    if not config.option.run_benchmarks:
+        setattr(config.option, 'markexpr',
+                f"{config.option.markexpr}{' and ' if config.option.markexpr else ''}not benchmark")
 
 def pytest_addoption(parser):
     parser.addoption('--test-broken', action='store_true', dest="test_broken_sites",
                  default=False, help="enable testing of broken sites")
+    parser.addoption('--benchmark', action='store_true', dest="run_benchmarks",
+                 default=False, help="run micro-benchmarks")
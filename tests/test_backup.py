@@ -0,0 +1,115 @@
+import pytest
+import os
+import sqlite3
+
+import gwaripper.config as config
+from gwaripper.backup import snapshot_db, PageStore
+from gwaripper.db import (
+    load_or_create_sql_db, backup_db, prune_backups, PAGE_STORE_FILENAME
+)
+from utils import setup_tmpdir, create_db_with_entries
+
+
+def _dump_db(path):
+    con = sqlite3.connect(path)
+    try:
+        return list(con.iterdump())
+    finally:
+        con.close()
+
+
+def test_snapshot_db_while_writing(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 300)
+    con, _ = load_or_create_sql_db(db_path)
+    expected = _dump_db(db_path)
+
+    # writer has an open transaction -> the snapshot only contains committed changes
+    con.execute("BEGIN IMMEDIATE")
+    con.execute("UPDATE AudioFile SET rating = 10 WHERE id = 1")
+    out_path = os.path.join(setup_tmpdir, "snapshot.sqlite")
+    snapshot_db(db_path, out_path, pages_per_step=5)
+    con.commit()
+    assert _dump_db(out_path) == expected
+
+    snapshot_db(db_path, out_path, pages_per_step=5)
+    assert _dump_db(out_path) == _dump_db(db_path) != expected
+    con.close()
+
+
+def test_page_store(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 1000)
+    con, _ = load_or_create_sql_db(db_path)
+    snapshot_path = os.path.join(setup_tmpdir, "snapshot.sqlite")
+    store_path = os.path.join(setup_tmpdir, PAGE_STORE_FILENAME)
+
+    with PageStore(store_path) as store:
+        snapshot_db(db_path, snapshot_path)
+        first = _dump_db(snapshot_path)
+        nr_pages, nr_new = store.add_snapshot("first", snapshot_path)
+        # pages that are all zeroes etc.
+        assert nr_new <= nr_pages
+
+        with con:
+            con.execute("UPDATE AudioFile SET rating = 10 WHERE id = 500")
+        snapshot_db(db_path, snapshot_path)
+        second = _dump_db(snapshot_path)
+        nr_pages, nr_new = store.add_snapshot("second", snapshot_path)
+        # only the changed pages were added
+        assert nr_new < nr_pages // 4
+        assert store.snapshots() == ["first", "second"]
+
+        # same name replaces the snapshot
+        store.add_snapshot("second", snapshot_path)
+        assert store.snapshots() == ["first", "second"]
+
+        restored = os.path.join(setup_tmpdir, "restored.sqlite")
+        store.restore("first", restored)
+        assert _dump_db(restored) == first
+        store.restore("second", restored)
+        assert _dump_db(restored) == second
+
+        nr_stored = store.con.execute("SELECT COUNT(*) FROM Page").fetchone()[0]
+        store.remove_snapshot("first")
+        assert store.snapshots() == ["second"]
+        # pages that were only used by first are gone
+        assert store.con.execute("SELECT COUNT(*) FROM Page").fetchone()[0] < nr_stored
+        store.restore("second", restored)
+        assert _dump_db(restored) == second
+        with pytest.raises(KeyError):
+            store.restore("first", restored)
+    con.close()
+
+
+def test_backup_db_pages_format(setup_tmpdir, monkeypatch):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 100)
+    bu_dir = os.path.join(setup_tmpdir, "_db-autobu")
+    monkeypatch.setitem(config.config["Settings"], "db_bu_format", "pages")
+    monkeypatch.setitem(config.config["Settings"], "max_db_bu", "2")
+    # don't persist the changed settings
+    monkeypatch.setattr("gwaripper.db.write_config_module", lambda: None)
+
+    backup_db(db_path, bu_dir, force_bu=True)
+    # no copies of the DB file
+    assert os.listdir(bu_dir) == [PAGE_STORE_FILENAME]
+    store_path = os.path.join(bu_dir, PAGE_STORE_FILENAME)
+    with PageStore(store_path) as store:
+        assert len(store.snapshots()) == 1
+        name = store.snapshots()[0]
+        restored = os.path.join(setup_tmpdir, "restored.sqlite")
+        store.restore(name, restored)
+        assert _dump_db(restored) == _dump_db(db_path)
+
+        # retention is handled like for copies of the DB file
+        for old_name in (name, "0", "1"):
+            if old_name != name:
+                store.add_snapshot(old_name, restored)
+            with open(os.path.join(bu_dir, f"{old_name}_gwarip_db_exp.csv"), "w") as f:
+                f.write("")
+    prune_backups(bu_dir, "pages")
+    with PageStore(store_path) as store:
+        assert store.snapshots() == ["0", "1"]
+    assert not os.path.isfile(os.path.join(bu_dir, f"{name}_gwarip_db_exp.csv"))
+    assert os.path.isfile(os.path.join(bu_dir, "1_gwarip_db_exp.csv"))
@@ -0,0 +1,55 @@
+import pytest
+import os
+import time
+
+from utils import setup_tmpdir, create_db_with_entries
+
+from gwaripper.db import load_or_create_sql_db, ConnectionManager, get_x_entries
+
+# run with: pytest tests/test_benchmark_db_connections.py --benchmark -s
+
+NR_ENTRIES = 50_000
+NR_REQUESTS = 500
+ENTRIES_PER_PAGE = 60
+
+
+def _per_request_load_or_create(db_path, query):
+    # what the webGUI's get_db used to do on every request
+    con, _ = load_or_create_sql_db(db_path)
+    try:
+        if query:
+            get_x_entries(con, ENTRIES_PER_PAGE + 1)
+    finally:
+        con.close()
+
+
+def _per_request_pooled(manager, query):
+    with manager.reader() as con:
+        if query:
+            get_x_entries(con, ENTRIES_PER_PAGE + 1)
+
+
+def _bench(func, *args):
+    before = time.perf_counter()
+    for _ in range(NR_REQUESTS):
+        func(*args)
+    return (time.perf_counter() - before) / NR_REQUESTS
+
+
+@pytest.mark.benchmark
+def test_benchmark_per_request_db_overhead(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, NR_ENTRIES)
+
+    with ConnectionManager(db_path, pool_size=4, min_readers=1) as manager:
+        old_overhead = _bench(_per_request_load_or_create, db_path, False)
+        new_overhead = _bench(_per_request_pooled, manager, False)
+        old_total = _bench(_per_request_load_or_create, db_path, True)
+        new_total = _bench(_per_request_pooled, manager, True)
+
+    print(f"\nPer request on a DB with {NR_ENTRIES} entries:")
+    print(f"  connection setup only:  load_or_create_sql_db {old_overhead * 1e3:.3f}ms, "
+          f"pooled {new_overhead * 1e3:.3f}ms")
+    print(f"  incl. first page query: load_or_create_sql_db {old_total * 1e3:.3f}ms, "
+          f"pooled {new_total * 1e3:.3f}ms")
+    assert new_overhead < old_overhead
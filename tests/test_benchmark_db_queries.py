@@ -0,0 +1,223 @@
+import pytest
+import os
+import re
+import time
+import sqlite3
+
+from typing import Callable, List, NamedTuple, Optional, Any
+
+from utils import setup_tmpdir, create_db_with_entries
+
+from gwaripper.db import (
+    load_or_create_sql_db, get_x_entries, get_x_listen_later_entries, search,
+    sort_column_value, order_by_clause, RowData, SORT_COLUMNS, fuzzy_match_names
+)
+
+# run with: pytest tests/test_benchmark_db_queries.py --benchmark -s
+# the query plans are also checked by test_query_plans, which runs without --benchmark
+# on a small library, so schema changes that make one of the queries fall back to
+# scanning a table fail the regular test suite
+
+# NOTE: generating the 1M library takes a few minutes
+LIBRARY_SIZES = [10_000, 100_000, 1_000_000]
+NR_RUNS = 20
+ENTRIES_PER_PAGE = 60
+# fan-out of the generated libraries
+MAX_FILES_PER_COLLECTION = 8
+ALIASES_PER_ARTIST = 3
+# how deep the after/before pages are, as fraction of all entries
+DEEP_PAGE_POSITION = 0.9
+# NOTE: the materialized view is aliased as AudioFile in all the queries
+BASE_TABLES = {"AudioFile", "FileCollection", "Alias", "Artist", "RedditInfo",
+               "ListenLater", "mv_audio_and_collection_combined"}
+SCAN_RE = re.compile(r"SCAN (\w+)\b")
+
+
+class BenchQuery(NamedTuple):
+    name: str
+    run: Callable[[sqlite3.Connection], Any]
+    # first pages can just walk the table or an index in sort order and stop after
+    # the limit; this is the only scan (EXPLAIN QUERY PLAN detail) the query is allowed
+    # to have
+    allowed_scan: Optional[str] = None
+
+
+def _row_at(con: sqlite3.Connection, order_by: str, position: float,
+            where: str = "") -> RowData:
+    count = con.execute(
+        f"SELECT COUNT(*) FROM mv_audio_and_collection_combined AudioFile {where}").fetchone()[0]
+    row = con.execute(f"""
+        SELECT * FROM mv_audio_and_collection_combined AudioFile
+        {where}
+        {order_by_clause(order_by)}
+        LIMIT 1 OFFSET ?""", (int(count * position),)).fetchone()
+    return RowData(row)
+
+
+def _keyset(row: RowData, sort_col: str):
+    if sort_col == "id":
+        return (row.id,)
+    return (sort_column_value(row, sort_col), row.id)
+
+
+def typical_queries(con: sqlite3.Connection) -> List[BenchQuery]:
+    """
+    Queries the webGUI typically makes: first pages, deep after/before pages for
+    all sort columns, the listen later list, title (FTS), (fuzzy) artist searches
+    and the artist typeahead
+    """
+    limit = ENTRIES_PER_PAGE + 1
+    queries = [BenchQuery("first page by id", lambda c: get_x_entries(c, limit),
+                          "SCAN AudioFile")]
+
+    for sort_col in ["id", *(c for c in SORT_COLUMNS if c != "relevance")]:
+        order_by = f"AudioFile.{sort_col} DESC"
+        if sort_col != "id":
+            queries.append(BenchQuery(
+                f"first page by {sort_col}",
+                lambda c, o=order_by: get_x_entries(c, limit, order_by=o),
+                f"SCAN AudioFile USING INDEX mv_combined_sort_{sort_col}_idx"))
+        key = _keyset(_row_at(con, order_by, DEEP_PAGE_POSITION), sort_col)
+        queries.append(BenchQuery(
+            f"deep after page by {sort_col}",
+            lambda c, o=order_by, k=key: get_x_entries(c, limit, after=k, order_by=o)))
+        queries.append(BenchQuery(
+            f"deep before page by {sort_col}",
+            lambda c, o=order_by, k=key: get_x_entries(c, limit, before=k, order_by=o)))
+
+    ll_order_by = "AudioFile.rating DESC"
+    ll_key = _keyset(_row_at(con, ll_order_by, 0.5, "WHERE AudioFile.listen_later = 1"),
+                     "rating")
+    queries.extend([
+        BenchQuery("listen later first page",
+                   lambda c: get_x_listen_later_entries(c, limit),
+                   "SCAN AudioFile USING INDEX mv_combined_listen_later_idx"),
+        # NOTE: walks the sort index and skips the files that aren't on the list
+        BenchQuery("listen later by rating",
+                   lambda c: get_x_listen_later_entries(c, limit, order_by=ll_order_by),
+                   "SCAN AudioFile USING INDEX mv_combined_sort_rating_idx"),
+        BenchQuery("listen later deep after page by rating",
+                   lambda c: get_x_listen_later_entries(
+                       c, limit, after=ll_key, order_by=ll_order_by)),
+    ])
+
+    deep_row = _row_at(con, "AudioFile.id DESC", DEEP_PAGE_POSITION)
+    artist = deep_row.artist_name
+    relevance_order_by = "AudioFile.relevance DESC"
+    ranked = search(con, "rain whisper", order_by=relevance_order_by, limit=1_000_000)
+    relevance_key = _keyset(ranked[int(len(ranked) * DEEP_PAGE_POSITION)], "relevance")
+    queries.extend([
+        BenchQuery("title search",
+                   lambda c: search(c, "rain whisper", limit=limit)),
+        BenchQuery("title search by relevance",
+                   lambda c: search(c, "rain whisper", order_by=relevance_order_by,
+                                    limit=limit)),
+        BenchQuery("title search deep after page by relevance",
+                   lambda c: search(c, "rain whisper", order_by=relevance_order_by,
+                                    limit=limit, after=relevance_key)),
+        BenchQuery("title prefix search",
+                   lambda c: search(c, "whisp* tingl*", order_by=relevance_order_by,
+                                    limit=limit)),
+        BenchQuery("title search by rating",
+                   lambda c: search(c, "rain whisper", order_by="AudioFile.rating DESC",
+                                    limit=limit)),
+        BenchQuery("title search deep after page",
+                   lambda c: search(c, "rain whisper", limit=limit, after=(deep_row.id,))),
+        BenchQuery("title search in listen later",
+                   lambda c: search(c, "rain", limit=limit,
+                                    additional_conditions="AudioFile.listen_later = 1")),
+        BenchQuery("artist search",
+                   lambda c: search(c, f"artist:{artist}", limit=limit)),
+        BenchQuery("artist search deep after page by rating",
+                   lambda c: search(c, f"artist:{artist}", order_by="AudioFile.rating DESC",
+                                    limit=limit, after=_keyset(deep_row, "rating"))),
+        BenchQuery("artist and title search",
+                   lambda c: search(c, f"artist:{artist} rain", limit=limit)),
+        BenchQuery("fuzzy artist search",
+                   lambda c: search(c, f"artist~:{artist[:-1]}", limit=limit)),
+        BenchQuery("fuzzy artist search by relevance",
+                   lambda c: search(c, f"artist~:{artist[:-1]}",
+                                    order_by=relevance_order_by, limit=limit)),
+        # the webGUI's artist typeahead
+        BenchQuery("artist typeahead",
+                   lambda c: fuzzy_match_names(c, artist[:4])),
+        BenchQuery("artist typeahead with typo",
+                   lambda c: fuzzy_match_names(c, artist[1:])),
+        BenchQuery("url search",
+                   lambda c: search(c, f"url:{deep_row.url}", limit=limit)),
+    ])
+
+    return queries
+
+
+def query_plans(con: sqlite3.Connection, query: BenchQuery) -> List[List[str]]:
+    """
+    Runs query and returns the EXPLAIN QUERY PLAN details of all SELECTs it executed
+    """
+    statements: List[str] = []
+    # NOTE: the trace callback receives the statements with the parameters expanded
+    con.set_trace_callback(statements.append)
+    try:
+        query.run(con)
+    finally:
+        con.set_trace_callback(None)
+
+    plans = []
+    for stmt in statements:
+        # skip internal statements of the FTS5 module on its shadow tables
+        if not stmt.lstrip().upper().startswith("SELECT") or "'main'." in stmt:
+            continue
+        plans.append([row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {stmt}")])
+    return plans
+
+
+def assert_no_table_scan(con: sqlite3.Connection, query: BenchQuery):
+    plans = query_plans(con, query)
+    assert plans, f"{query.name}: no statement executed"
+    for plan in plans:
+        scans = [detail for detail in plan
+                 if (m := SCAN_RE.match(detail)) and m.group(1) in BASE_TABLES and
+                 # scanning in order is pointless if the result has to be sorted afterwards
+                 (detail != query.allowed_scan or "USE TEMP B-TREE FOR ORDER BY" in plan)]
+        assert not scans, f"{query.name} scans a table: {plan}"
+
+
+def _bench(con, query):
+    query.run(con)  # warm up the page cache
+    before = time.perf_counter()
+    for _ in range(NR_RUNS):
+        query.run(con)
+    return (time.perf_counter() - before) / NR_RUNS
+
+
+def test_query_plans(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 3000, max_files_per_collection=MAX_FILES_PER_COLLECTION,
+                           aliases_per_artist=ALIASES_PER_ARTIST)
+    con, _ = load_or_create_sql_db(db_path)
+    try:
+        for query in typical_queries(con):
+            assert_no_table_scan(con, query)
+    finally:
+        con.close()
+
+
+@pytest.fixture(scope="module", params=LIBRARY_SIZES, ids=lambda n: f"{n // 1000}k")
+def library(request, tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("bench_db") / "gwarip_db.sqlite")
+    create_db_with_entries(db_path, request.param,
+                           max_files_per_collection=MAX_FILES_PER_COLLECTION,
+                           aliases_per_artist=ALIASES_PER_ARTIST)
+    con, _ = load_or_create_sql_db(db_path)
+    yield request.param, con
+    con.close()
+
+
+@pytest.mark.benchmark
+def test_benchmark_typical_queries(library):
+    nr_entries, con = library
+
+    print(f"\nLibrary with {nr_entries} entries ({NR_RUNS} runs each):")
+    for query in typical_queries(con):
+        assert_no_table_scan(con, query)
+        print(f"  {query.name:<45} {_bench(con, query) * 1e3:8.3f}ms")
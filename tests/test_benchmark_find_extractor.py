@@ -0,0 +1,70 @@
+import pytest
+import time
+import random
+
+from gwaripper.extractors import find_extractor, AVAILABLE_EXTRACTORS
+from gwaripper.extractors.base import BaseExtractor
+
+# run with: pytest tests/test_benchmark_find_extractor.py --benchmark -s
+
+NR_LINKS = 50_000
+
+
+def _find_extractor_linear(url):
+    for extractor in AVAILABLE_EXTRACTORS:
+        if extractor.is_compatible(url):
+            return extractor
+    return None
+
+
+def _is_unsupported_linear(url):
+    return any(pattern.match(url) for pattern in BaseExtractor.FILTER_URLS_RE)
+
+
+def _generate_links(nr_links, nr_unique):
+    # roughly what links in a subreddit dump look like: mostly audio hosts,
+    # some unsupported hosts and lots of random other links
+    templates = [
+        "https://soundgasm.net/u/user{0}/title-{0}",
+        "https://whyp.it/tracks/{0}/title?token=abc",
+        "https://erocast.me/track/{0}/title",
+        "https://www.reddit.com/r/gonewildaudio/comments/{0}/title/",
+        "https://i.imgur.com/abcd{0}.jpg",
+        "https://soundcloud.com/user{0}/track",
+        "https://www.patreon.com/user{0}",
+        "https://example{0}.com/some/path",
+        "https://twitter.com/user{0}",
+    ]
+    rnd = random.Random(1337)
+    unique = [rnd.choice(templates).format(i) for i in range(nr_unique)]
+    return [rnd.choice(unique) for _ in range(nr_links)]
+
+
+def _bench(func, links):
+    before = time.perf_counter()
+    results = [func(url) for url in links]
+    return time.perf_counter() - before, results
+
+
+@pytest.mark.benchmark
+def test_benchmark_find_extractor():
+    links = _generate_links(NR_LINKS, NR_LINKS // 5)
+
+    linear_time, expected = _bench(_find_extractor_linear, links)
+    find_extractor.cache_clear()
+    dispatch_time, results = _bench(find_extractor, links)
+    warm_time, _ = _bench(find_extractor, links)
+    assert results == expected
+
+    unsupported_linear_time, expected = _bench(_is_unsupported_linear, links)
+    unsupported_time, results = _bench(BaseExtractor.is_unsupported_audio_url, links)
+    assert results == expected
+
+    print(f"\nfind_extractor on {NR_LINKS} links:")
+    print(f"  linear scan:       {linear_time * 1e6 / NR_LINKS:.2f}us/link")
+    print(f"  host dispatch:     {dispatch_time * 1e6 / NR_LINKS:.2f}us/link "
+          f"{find_extractor.cache_info()}")
+    print(f"  warm cache:        {warm_time * 1e6 / NR_LINKS:.2f}us/link")
+    print("is_unsupported_audio_url:")
+    print(f"  linear scan:       {unsupported_linear_time * 1e6 / NR_LINKS:.2f}us/link")
+    print(f"  host dispatch:     {unsupported_time * 1e6 / NR_LINKS:.2f}us/link")
@@ -0,0 +1,155 @@
+import pytest
+import os
+import time
+
+import gwaripper.bulk_import as bulk_import_mod
+from gwaripper.bulk_import import bulk_import, ImportRecord, records_from_csv
+from gwaripper.db import load_or_create_sql_db, search, export_changes_to_csv
+from utils import setup_tmpdir, create_db_with_entries
+
+
+def _records(nr, offset=0):
+    words = ["asmr", "rain", "whisper", "sleep", "comfort", "story"]
+    for i in range(offset, offset + nr):
+        in_collection = i % 3 == 0
+        yield ImportRecord(
+            url=f"https://soundgasm.net/u/alias{i % 40}/audio{i}",
+            filename=f"audio{i}.m4a",
+            alias=f"alias{i % 40}",
+            title=f"[F4M] {words[i % len(words)]} audio{i}",
+            description=f"description {i}",
+            date="2020-01-01",
+            # every second alias is a known artist (e.g. from reddit)
+            artist=f"artist{i % 20}" if i % 2 == 0 else None,
+            rating=i % 10 or None,
+            collection_url=(f"https://www.reddit.com/r/gwa/comments/{i // 6}/"
+                            if in_collection else None),
+            collection_title=f"[F4M] collection {i // 6}" if in_collection else None,
+            collection_id_on_page=str(i // 6) if in_collection else None,
+            collection_alias=f"artist{i % 20}" if in_collection and i % 2 == 0 else None,
+            reddit_created_utc=1_500_000_000.0 + i if in_collection else None,
+            selftext=f"selftext thunderstorm {i}" if in_collection and i % 4 == 0 else None,
+        )
+
+
+def _dump(con):
+    return {
+        "mv": con.execute(
+            "SELECT * FROM mv_audio_and_collection_combined ORDER BY id").fetchall(),
+        "fts": con.execute(
+            "SELECT rowid, * FROM Search_fts_idx ORDER BY rowid").fetchall(),
+        "change_log": con.execute(
+            "SELECT * FROM AudioFileChangeLog ORDER BY audio_id").fetchall(),
+        "alias": con.execute("SELECT * FROM Alias ORDER BY id").fetchall(),
+        "artist": con.execute("SELECT * FROM Artist ORDER BY id").fetchall(),
+        "artist_trigram": con.execute(
+            "SELECT rowid, * FROM Artist_trigram_idx ORDER BY rowid").fetchall(),
+        "schema": con.execute(
+            "SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall(),
+    }
+
+
+def test_bulk_import_same_as_triggers(setup_tmpdir, monkeypatch):
+    bulk_con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, "bulk.sqlite"))
+    trig_con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, "triggers.sqlite"))
+
+    # small batches so collections and aliases span multiple batches
+    assert bulk_import(bulk_con, _records(500), batch_size=64) == 500
+    # the triggers do all the work
+    with monkeypatch.context() as m:
+        m.setattr(bulk_import_mod, "DEFERRED_TRIGGERS", ())
+        m.setattr(bulk_import_mod, "_refresh_derived_tables", lambda c, first_id: None)
+        assert bulk_import(trig_con, _records(500), batch_size=64) == 500
+
+    bulk = _dump(bulk_con)
+    assert len(bulk["mv"]) == 500
+    assert bulk == _dump(trig_con)
+
+    # triggers were restored
+    with bulk_con:
+        bulk_con.execute("UPDATE AudioFile SET title = 'lightning' WHERE id = 3")
+    assert [r.id for r in search(bulk_con, "lightning")] == [3]
+    assert [r.id for r in search(bulk_con, "thunderstorm")] == [
+        r.id for r in search(trig_con, "thunderstorm")]
+    assert bulk_con.execute(
+        "SELECT change_seq FROM AudioFileChangeLog WHERE audio_id = 3").fetchone()[0] > 500
+
+    bulk_con.close()
+    trig_con.close()
+
+
+def test_bulk_import_existing(setup_tmpdir):
+    con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, "gwarip_db.sqlite"))
+
+    assert bulk_import(con, _records(100)) == 100
+    nr_collections = con.execute("SELECT COUNT(*) FROM FileCollection").fetchone()[0]
+    # files that are already in the DB are skipped, existing collections, artists
+    # and aliases are re-used
+    assert bulk_import(con, _records(150)) == 50
+    assert con.execute("SELECT COUNT(*) FROM mv_audio_and_collection_combined").fetchone()[0] == 150
+    assert con.execute("SELECT COUNT(*) FROM Search_fts_idx").fetchone()[0] == 150
+    # default aliases + 40 aliases + the 10 artists (only even i % 20)
+    assert con.execute("SELECT COUNT(*) FROM Alias").fetchone()[0] == 2 + 40 + 10
+    # collection 16 (files 96 and 99) already existed, so the new file was added to it
+    assert con.execute(
+        "SELECT COUNT(*) FROM FileCollection").fetchone()[0] == nr_collections + 8
+    assert [r[0] for r in con.execute("""
+        SELECT AudioFile.id FROM AudioFile JOIN FileCollection
+        ON FileCollection.id = AudioFile.collection_id
+        WHERE FileCollection.id_on_page = '16'""")] == [97, 100]
+
+    con.close()
+
+
+def test_bulk_import_rollback(setup_tmpdir):
+    con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, "gwarip_db.sqlite"))
+    before = _dump(con)
+
+    def failing_records():
+        yield from _records(10)
+        raise ValueError("corrupt record")
+
+    with pytest.raises(ValueError):
+        bulk_import(con, failing_records(), batch_size=4)
+    assert not con.in_transaction
+    # nothing was imported and the dropped triggers are back
+    assert _dump(con) == before
+
+    con.close()
+
+
+def test_bulk_import_csv_export(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 300, max_files_per_collection=4)
+    con, _ = load_or_create_sql_db(db_path)
+    csv_path = os.path.join(setup_tmpdir, "export.csv")
+    seq = export_changes_to_csv(con, csv_path, "v_audio_and_collection_combined")
+    # appended rows of changed files replace the earlier ones
+    with con:
+        con.execute("UPDATE AudioFile SET title = 'changed', rating = 7.5 WHERE id = 20")
+        con.execute("UPDATE RedditInfo SET selftext_path = 'alias/selftext.txt' WHERE id = 1")
+    export_changes_to_csv(con, csv_path, "v_audio_and_collection_combined", seq)
+
+    imported_con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, "imported.sqlite"))
+    assert bulk_import(imported_con, records_from_csv(csv_path)) == 300
+
+    # ids of aliases etc. differ
+    cols = """url, filename, title, description, date, rating, favorite, alias_name,
+              artist_name, fcol_url, fcol_id_on_page, fcol_title, fcol_subpath,
+              fcol_alias_name, reddit_created_utc, reddit_selftext_path"""
+    query = f"SELECT {cols} FROM mv_audio_and_collection_combined ORDER BY url"
+    assert imported_con.execute(query).fetchall() == con.execute(query).fetchall()
+
+    con.close()
+    imported_con.close()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("nr_records", [10_000, 100_000])
+def test_benchmark_bulk_import(setup_tmpdir, nr_records):
+    con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, f"bulk{nr_records}.sqlite"))
+    records = list(_records(nr_records))
+    before = time.perf_counter()
+    assert bulk_import(con, records) == nr_records
+    print(f"\nbulk import of {nr_records} records: {time.perf_counter() - before:.3f}s")
+    con.close()
@@ -3,12 +3,20 @@ import sqlite3
 import os
 import csv
 import time
+import re
 
 # needed for valid logging dir hack
-from utils import gen_hash_from_file, setup_tmpdir, TESTS_DIR
+from utils import gen_hash_from_file, setup_tmpdir, TESTS_DIR, create_db_with_entries
 
 import gwaripper.config as config
-from gwaripper.db import export_table_to_csv, backup_db
+import gwaripper.migrate as migrate
+from gwaripper.info import sanitize_filename
+from gwaripper.db import (
+    export_table_to_csv, backup_db, ConnectionManager, load_or_create_sql_db,
+    get_x_entries, get_x_listen_later_entries, search, sort_column_value, SORT_COLUMNS,
+    keyset_pagination_statment, SNIPPET_HIGHLIGHT, fuzzy_match_names, export_changes_to_csv,
+    last_change_seq
+)
 
 time_str = time.strftime("%Y-%m-%d")
 
@@ -133,6 +141,64 @@ def test_export_csv(create_db_for_export):
     con.close()
 
 
+def _read_csv(path):
+    with open(path, "r", newline="", encoding='utf-8') as csvf:
+        return list(csv.reader(csvf, dialect="excel", delimiter=';'))
+
+
+def test_export_changes_to_csv(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    csv_path = os.path.join(setup_tmpdir, "gwarip_db_exp.csv")
+    create_db_with_entries(db_path, 100)
+    con, _ = load_or_create_sql_db(db_path)
+    table = "v_audio_and_collection_combined"
+
+    # no previous export -> full export; batch size doesn't divide the nr of rows
+    change_seq = export_changes_to_csv(con, csv_path, table, None, batch_size=7)
+    assert change_seq == last_change_seq(con)
+    rows = _read_csv(csv_path)
+    assert rows[0][:2] == ["id", "collection_id"]
+    assert [int(r[0]) for r in rows[1:]] == list(range(1, 101))
+
+    # nothing changed
+    assert export_changes_to_csv(con, csv_path, table, change_seq) == change_seq
+    assert _read_csv(csv_path) == rows
+
+    with con:
+        con.execute("UPDATE AudioFile SET rating = 9.5 WHERE id = 5")
+        con.execute("UPDATE AudioFile SET favorite = 1 WHERE id = 64")
+        con.execute("DELETE FROM AudioFile WHERE id = 7")
+    new_change_seq = export_changes_to_csv(con, csv_path, table, change_seq)
+    assert new_change_seq > change_seq
+    appended = _read_csv(csv_path)
+    # only the changed rows were appended; removed ones are kept till the next full export
+    assert appended[:len(rows)] == rows
+    assert [int(r[0]) for r in appended[len(rows):]] == [5, 64]
+    rating_col = rows[0].index("rating")
+    assert float(appended[-2][rating_col]) == 9.5
+
+    # DB was replaced, e.g. by a backup -> full export
+    export_changes_to_csv(con, csv_path, table, new_change_seq + 10)
+    rows = _read_csv(csv_path)
+    assert len(rows) == 100
+    assert 7 not in {int(r[0]) for r in rows[1:]}
+
+    # columns changed -> full export
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("id;title\n1;foo\n")
+    export_changes_to_csv(con, csv_path, table, new_change_seq)
+    assert _read_csv(csv_path) == rows
+    con.close()
+
+
+def _dump_db(path):
+    con = sqlite3.connect(path)
+    try:
+        return list(con.iterdump())
+    finally:
+        con.close()
+
+
 @pytest.mark.parametrize("last_bu, bu_freq, csv_bu, force, backuped, too_many", [
     ("0.0", "5", False, False, True, False),  # def bu no csv
     ("0.0", "5", False, False, True, True),  # def bu, too many bus in budir no csv
@@ -177,8 +243,8 @@ def test_backup_db(last_bu, bu_freq, csv_bu, force, backuped, too_many, create_d
         backup_db(sql_p, bu_dir, None, force)
 
     if backuped:
-        assert gen_hash_from_file(bu_sql_path, 'md5', _hex=True) == gen_hash_from_file(
-                sql_p, 'md5', _hex=True)
+        # NOTE: made with the backup API so the file header differs from the original
+        assert _dump_db(bu_sql_path) == _dump_db(sql_p)
         if csv_bu:
             assert gen_hash_from_file(bu_csv_path, 'md5', _hex=True) == gen_hash_from_file(
                     csv_p, 'md5', _hex=True)
@@ -194,3 +260,378 @@ def test_backup_db(last_bu, bu_freq, csv_bu, force, backuped, too_many, create_d
         assert not os.path.isfile(os.path.join(bu_dir, "0_exp.csv"))
 
     con.close()
+
+
+def test_connection_manager(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    with ConnectionManager(db_path, pool_size=2) as manager:
+        with manager.writer() as con:
+            assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert con.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+            con.execute("INSERT INTO Artist(name) VALUES ('artist')")
+
+        with manager.reader() as con:
+            assert con.execute("SELECT name FROM Artist").fetchone()["name"] == "artist"
+            with pytest.raises(sqlite3.OperationalError):
+                con.execute("INSERT INTO Artist(name) VALUES ('foo')")
+        # pooled connection gets re-used
+        first = manager.acquire_reader()
+        manager.release_reader(first)
+        assert manager.acquire_reader() is first
+        second = manager.acquire_reader()
+        assert second is not first
+
+        # readers aren't blocked by an open write transaction and don't see
+        # its uncommitted changes
+        with manager.writer() as con:
+            con.execute("INSERT INTO Artist(name) VALUES ('uncommitted')")
+            assert second.execute("SELECT count(*) FROM Artist").fetchone()[0] == 1
+        assert second.execute("SELECT count(*) FROM Artist").fetchone()[0] == 2
+
+        manager.release_reader(first)
+        manager.release_reader(second)
+
+        # rolled back on exception
+        with pytest.raises(ValueError):
+            with manager.writer() as con:
+                con.execute("INSERT INTO Artist(name) VALUES ('rolled back')")
+                raise ValueError
+        with manager.reader() as con:
+            assert con.execute("SELECT count(*) FROM Artist").fetchone()[0] == 2
+
+
+def _assert_materialized_view_in_sync(con):
+    expected = con.execute("SELECT * FROM v_audio_and_collection_combined ORDER BY id").fetchall()
+    actual = con.execute("SELECT * FROM mv_audio_and_collection_combined ORDER BY id").fetchall()
+    assert [tuple(r) for r in actual] == [tuple(r) for r in expected]
+
+
+def test_materialized_combined_view(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 300)
+    con, _ = load_or_create_sql_db(db_path)
+    _assert_materialized_view_in_sync(con)
+    assert con.execute("SELECT count(*) FROM mv_audio_and_collection_combined").fetchone()[0] == 300
+
+    with con:
+        con.execute("UPDATE AudioFile SET rating = 9.5, title = 'changed' WHERE id = 5")
+        con.execute("UPDATE AudioFile SET collection_id = 2 WHERE id = 6")
+        con.execute("DELETE FROM ListenLater WHERE audio_id = 1")
+        con.execute("DELETE FROM AudioFile WHERE id = 7")
+        con.execute("UPDATE FileCollection SET title = 'fcol changed', url = 'u' WHERE id = 1")
+        con.execute("UPDATE Alias SET name = 'renamed alias' WHERE name = 'alias0'")
+        con.execute("UPDATE Alias SET artist_id = 2 WHERE name = 'alias1'")
+        con.execute("UPDATE Artist SET name = 'renamed artist' WHERE id = 3")
+        con.execute("UPDATE RedditInfo SET created_utc = 1 WHERE id = 1")
+        con.execute("INSERT INTO ListenLater(audio_id) VALUES (5)")
+        con.execute("INSERT INTO ListenLater(audio_id) VALUES (5)")
+        con.execute("DELETE FROM ListenLater WHERE id = (SELECT max(id) FROM ListenLater)")
+        con.execute("UPDATE ListenLater SET audio_id = 8 WHERE audio_id = 98")
+        con.execute("""
+            INSERT INTO AudioFile(collection_id, date, filename, title, url, alias_id)
+            VALUES (3, '2023-01-01', 'new.m4a', 'new', 'https://new', 4)""")
+    _assert_materialized_view_in_sync(con)
+    con.close()
+
+
+def _drop_selftext_path(con):
+    view_sql = con.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'v_audio_and_collection_combined'"
+    ).fetchone()[0]
+    con.execute("DROP VIEW v_audio_and_collection_combined")
+    # triggers using the view are checked when dropping the column
+    con.execute(re.sub(r",\s*(--[^\n]*\s*)?RedditInfo\.selftext_path as reddit_selftext_path",
+                       "", view_sql))
+    con.execute("ALTER TABLE RedditInfo DROP COLUMN selftext_path")
+
+
+def test_migrate_materialized_combined_view(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 100)
+    con = sqlite3.connect(db_path)
+    with con:
+        # back to version 3
+        for (name,) in con.execute(
+                "SELECT name FROM sqlite_master WHERE name LIKE 'mv_combined_%'"
+                " AND type = 'trigger'").fetchall():
+            con.execute(f"DROP TRIGGER {name}")
+        con.execute("DROP TABLE mv_audio_and_collection_combined")
+        con.execute("DROP INDEX listen_later_audio_id_idx")
+        # 0007
+        con.execute("DROP TABLE Search_fts_idx")
+        con.execute("ALTER TABLE RedditInfo DROP COLUMN selftext")
+        # 0008
+        for table in ("Artist", "Alias"):
+            con.execute(f"DROP TABLE {table}_trigram_idx")
+            for suffix in ("ai", "au", "ad"):
+                con.execute(f"DROP TRIGGER {table.lower()}_trigram_{suffix}")
+        # 0009; triggers were dropped with the materialized view
+        con.execute("DROP TABLE AudioFileChangeLog")
+        # 0010
+        _drop_selftext_path(con)
+        con.execute(f"UPDATE {migrate.VERSION_TABLE} SET version_id = 3")
+    con.close()
+
+    con, _ = load_or_create_sql_db(db_path)
+    assert con.execute(
+        f"SELECT version_id FROM {migrate.VERSION_TABLE}").fetchone()[0] == migrate.LATEST_VERSION
+    _assert_materialized_view_in_sync(con)
+    # triggers work after migrating
+    with con:
+        con.execute("UPDATE AudioFile SET favorite = 1 WHERE id = 3")
+    _assert_materialized_view_in_sync(con)
+    con.close()
+
+
+@pytest.mark.parametrize("sort_col", ["id", *(c for c in SORT_COLUMNS if c != "relevance")])
+@pytest.mark.parametrize("asc", [True, False])
+def test_keyset_pagination(setup_tmpdir, sort_col, asc):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 150)
+    con, _ = load_or_create_sql_db(db_path)
+    with con:
+        # NULLs in the sort columns
+        con.execute("UPDATE AudioFile SET title = NULL WHERE id % 10 = 0")
+        con.execute("UPDATE Alias SET artist_id = NULL WHERE id % 2 = 0")
+
+    def key(row):
+        return (sort_column_value(row, sort_col), row.id)
+
+    order_by = f"AudioFile.{sort_col} {'ASC' if asc else 'DESC'}"
+    expected = sorted(get_x_entries(con, 1000), key=key, reverse=not asc)
+    page_size = 7
+
+    def keyset(row):
+        # values are passed as strings when coming from the webGUI
+        if sort_col == "id":
+            return (str(row.id),)
+        return (str(sort_column_value(row, sort_col)), str(row.id))
+
+    pages = []
+    page = get_x_entries(con, page_size, order_by=order_by)
+    while page:
+        pages.append(page)
+        page = get_x_entries(con, page_size, after=keyset(page[-1]), order_by=order_by)
+    assert [r.id for page in pages for r in page] == [r.id for r in expected]
+
+    # going backwards from the last page
+    for prev_page, page in zip(pages[-2::-1], pages[:0:-1]):
+        assert ([r.id for r in get_x_entries(
+            con, page_size, before=keyset(page[0]), order_by=order_by)] ==
+            [r.id for r in prev_page])
+
+    # seeks in the index of the sort expression instead of scanning the table
+    if sort_col != "id":
+        query, vals = keyset_pagination_statment(
+            "SELECT * FROM mv_audio_and_collection_combined AudioFile\nORDER BY\nLIMIT ?",
+            [], after=keyset(expected[70]), order_by=order_by, first_cond=True, limit=7)
+        plan = [row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {query}", (*vals, 7))]
+        assert sum(f"USING INDEX mv_combined_sort_{sort_col}_idx" in p for p in plan) == 2
+        assert not any(p.startswith("SCAN AudioFile") for p in plan)
+
+    # legacy NULL keyset: only the id was passed
+    if sort_col != "id":
+        nulls = [r for r in expected
+                 if sort_column_value(r, sort_col) == SORT_COLUMNS[sort_col].null_value]
+        if nulls:
+            idx = expected.index(nulls[0])
+            assert ([r.id for r in get_x_entries(
+                con, 3, after=(None, nulls[0].id), order_by=order_by)] ==
+                [r.id for r in expected[idx + 1:idx + 4]])
+
+    # with search conditions and listen later
+    ll_expected = [r.id for r in expected if r.listen_later]
+    ll = get_x_listen_later_entries(con, 2, order_by=order_by) or []
+    if ll:
+        ll += get_x_listen_later_entries(
+            con, 100, after=keyset(ll[-1]), order_by=order_by) or []
+    assert [r.id for r in ll] == ll_expected
+    found = search(con, "artist:alias1", order_by=order_by, limit=2)
+    found += search(con, "artist:alias1", order_by=order_by, limit=100,
+                    after=keyset(found[-1]))
+    assert ([r.id for r in found] ==
+            [r.id for r in search(con, "artist:alias1", order_by=order_by, limit=1000)])
+    con.close()
+
+
+def test_full_text_search(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 600)
+    con, _ = load_or_create_sql_db(db_path)
+    (reddit_audio_id, reddit_info_id), (fcol_audio_id, fcol_id) = con.execute("""
+        SELECT AudioFile.id, reddit_info_id FROM AudioFile
+        JOIN FileCollection ON FileCollection.id = AudioFile.collection_id
+        WHERE reddit_info_id IS NOT NULL LIMIT 1""").fetchone(), con.execute("""
+        SELECT AudioFile.id, FileCollection.id FROM AudioFile
+        JOIN FileCollection ON FileCollection.id = AudioFile.collection_id
+        WHERE reddit_info_id IS NULL LIMIT 1""").fetchone()
+    alias_id = con.execute("SELECT alias_id FROM AudioFile WHERE id = 50").fetchone()[0]
+    # all indexed columns are kept in sync with the materialized view
+    with con:
+        con.execute("UPDATE AudioFile SET title = 'the zebra title' WHERE id = 5")
+        con.execute("UPDATE AudioFile SET description = 'a zebra in the description'"
+                    " WHERE id = 6")
+        con.execute("UPDATE FileCollection SET title = 'zebra' WHERE id = ?", (fcol_id,))
+        con.execute("UPDATE Alias SET name = 'zebra_voice' WHERE id = ?", (alias_id,))
+        con.execute("UPDATE RedditInfo SET selftext = 'long selftext about a zebra' "
+                    "WHERE id = ?", (reddit_info_id,))
+    alias_files = {r[0] for r in con.execute(
+        "SELECT id FROM mv_audio_and_collection_combined "
+        "WHERE alias_name = 'zebra_voice' OR fcol_alias_name = 'zebra_voice'")}
+    assert 50 in alias_files
+
+    expected = {5, 6, fcol_audio_id, reddit_audio_id} | alias_files
+    found = search(con, "zebra", order_by="AudioFile.relevance DESC", limit=100)
+    assert {r.id for r in found} == expected
+    # title has the highest weight and the selftext/description match is in a
+    # longer text than the collection title
+    assert found[0].id == 5
+    assert [r.relevance for r in found] == sorted((r.relevance for r in found), reverse=True)
+    start, end = SNIPPET_HIGHLIGHT
+    assert found[0].snippet == f"the {start}zebra{end} title"
+    assert all(f"{start}zebra{end}" in r.snippet for r in found)
+    # prefix query
+    assert {r.id for r in search(con, "zeb*", limit=100)} == expected
+
+    # paging by relevance
+    page = search(con, "zebra", order_by="AudioFile.relevance DESC", limit=2)
+    page += search(con, "zebra", order_by="AudioFile.relevance DESC", limit=100,
+                   after=(str(page[-1].relevance), str(page[-1].id)))
+    assert [r.id for r in page] == [r.id for r in found]
+    assert [r.id for r in search(
+        con, "zebra", order_by="AudioFile.relevance DESC", limit=2,
+        before=(found[3].relevance, found[3].id))] == [r.id for r in found[1:3]]
+
+    # no full-text query to rank by -> sorted by id
+    assert ([r.id for r in search(con, "artist:zebra_voice", order_by="AudioFile.relevance ASC")] ==
+            sorted(alias_files))
+    assert [r.id for r in get_x_entries(con, 3, order_by="AudioFile.relevance DESC")] == [
+        600, 599, 598]
+
+    with con:
+        con.execute("DELETE FROM AudioFile WHERE id = 5")
+    assert 5 not in {r.id for r in search(con, "zebra", limit=100)}
+    con.close()
+
+
+def test_fuzzy_artist_search(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 600, aliases_per_artist=2)
+    con, _ = load_or_create_sql_db(db_path)
+    artist_id, alias_id = con.execute(
+        "SELECT artist_id, id FROM Alias WHERE artist_id IS NOT NULL LIMIT 1").fetchone()
+    # trigram indexes are kept in sync with Artist/Alias
+    with con:
+        con.execute("UPDATE Artist SET name = 'sweet_audio' WHERE id = ?", (artist_id,))
+        con.execute("UPDATE Alias SET name = 'Sweet-Audio.ASMR' WHERE id = ?", (alias_id,))
+        con.execute("INSERT INTO Artist(name) VALUES ('sweetie')")
+
+    # separators are ignored, prefixes and typos still match
+    for query in ("sweetaud", "sweet audio", "swetaudio", "SWEET_AUDIO"):
+        assert fuzzy_match_names(con, query)[0].name == "sweet_audio"
+    exact = fuzzy_match_names(con, "sweetaudio")
+    assert exact[0].similarity == 1
+    # ranked by similarity
+    matches = fuzzy_match_names(con, "sweet")
+    assert [m.name for m in matches] == ["sweetie", "sweet_audio"]
+    assert matches[0].similarity > matches[1].similarity
+    # less than 3 chars can't use the trigram index
+    assert {m.name for m in fuzzy_match_names(con, "sw")} == {"sweet_audio", "sweetie"}
+    assert fuzzy_match_names(con, "zzzz") == []
+    assert fuzzy_match_names(con, "sweetaud", table="Alias")[0].name == "Sweet-Audio.ASMR"
+
+    expected = {r[0] for r in con.execute("""
+        SELECT id FROM mv_audio_and_collection_combined
+        WHERE artist_name = 'sweet_audio' OR alias_name = 'Sweet-Audio.ASMR'
+            OR fcol_alias_name = 'Sweet-Audio.ASMR'""")}
+    assert expected
+    found = search(con, "artist~:sweetaud", order_by="AudioFile.relevance DESC", limit=100)
+    assert {r.id for r in found} == expected
+    assert [r.relevance for r in found] == sorted((r.relevance for r in found), reverse=True)
+    # paging by relevance
+    page = search(con, "artist~:sweetaud", order_by="AudioFile.relevance DESC", limit=2)
+    page += search(con, "artist~:sweetaud", order_by="AudioFile.relevance DESC", limit=100,
+                   after=(page[-1].relevance, page[-1].id))
+    assert [r.id for r in page] == [r.id for r in found]
+    # other sort columns and combined with other search types
+    assert [r.id for r in search(con, "artist~:sweetaud", order_by="AudioFile.id ASC")] == (
+        sorted(expected))
+    assert search(con, "artist~:zzzz", limit=100) == []
+    con.close()
+
+
+def test_fuzzy_artist_search_without_trigram_tokenizer(setup_tmpdir, monkeypatch):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    # tokenize='trigram' needs SQLite >= 3.34
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 31, 1))
+    create_db_with_entries(db_path, 30)
+    con, _ = load_or_create_sql_db(db_path)
+    assert con.execute(
+        "SELECT 1 FROM sqlite_master WHERE name LIKE '%trigram%'").fetchone() is None
+    with con:
+        con.execute("UPDATE Artist SET name = 'sweet_audio' WHERE id = 1")
+
+    # only exact names match
+    assert fuzzy_match_names(con, "sweet_audio") == [("sweet_audio", 1.0)]
+    assert fuzzy_match_names(con, "sweetaud") == []
+    expected = {r[0] for r in con.execute(
+        "SELECT id FROM mv_audio_and_collection_combined WHERE artist_name = 'sweet_audio'")}
+    assert expected
+    assert {r.id for r in search(con, "artist~:sweet_audio", limit=100)} == expected
+    assert search(con, "artist~:sweetaud", limit=100) == []
+    con.close()
+
+    # indexes are created once the DB is opened with a newer SQLite version
+    monkeypatch.undo()
+    con, _ = load_or_create_sql_db(db_path)
+    assert fuzzy_match_names(con, "sweetaud")[0].name == "sweet_audio"
+    assert {r.id for r in search(con, "artist~:sweetaud", limit=100)} == expected
+    con.close()
+
+
+def test_migrate_selftext_path_backfill(setup_tmpdir):
+    db_path = os.path.join(setup_tmpdir, "gwarip_db.sqlite")
+    create_db_with_entries(db_path, 30)
+    con = sqlite3.connect(db_path)
+    con.row_factory = sqlite3.Row
+    with con:
+        con.execute("UPDATE FileCollection SET subpath = 'sub' WHERE reddit_info_id = 2")
+        con.execute("UPDATE RedditInfo SET selftext = 'already in db' WHERE id = 3")
+        # back to version 9
+        _drop_selftext_path(con)
+        con.execute("ALTER TABLE mv_audio_and_collection_combined DROP COLUMN reddit_selftext_path")
+        con.execute(f"UPDATE {migrate.VERSION_TABLE} SET version_id = 9")
+    fcols = {r['fcol_reddit_info_id']: r for r in con.execute(
+        "SELECT * FROM mv_audio_and_collection_combined WHERE fcol_reddit_info_id IS NOT NULL")}
+    con.close()
+
+    expected = {
+        # >v0.3
+        1: f"alias0/{sanitize_filename('alias0', fcols[1]['fcol_title'])}.txt",
+        # <=v0.3
+        2: "alias0/sub/file3.m4a.txt",
+        # set_missing_reddit_db
+        3: "alias0/file6.m4a.txt",
+    }
+    for reddit_info_id, rel_path in expected.items():
+        path = os.path.join(setup_tmpdir, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="UTF-8") as f:
+            f.write(f"Title: title\nPermalink: link\nSelftext:\n\nselftext {reddit_info_id}")
+
+    con, _ = load_or_create_sql_db(db_path)
+    assert {r[0]: r[1:] for r in con.execute(
+        "SELECT id, selftext_path, selftext FROM RedditInfo")} == {
+        1: (expected[1], "selftext 1"),
+        2: (expected[2], "selftext 2"),
+        # selftext that was already in the DB is kept
+        3: (expected[3], "already in db"),
+        4: (None, None),
+        5: (None, None),
+    }
+    _assert_materialized_view_in_sync(con)
+    assert con.execute(
+        "SELECT reddit_selftext_path FROM mv_audio_and_collection_combined WHERE id = 4"
+    ).fetchone()[0] == expected[2]
+    assert sorted(r.id for r in search(con, "selftext")) == [1, 4]
+    con.close()
@@ -1,14 +1,22 @@
 import pytest
 
 import os
+import hashlib
+import urllib.error
 import gwaripper.config as cfg
 
 from gwaripper.gwaripper import GWARipper
 from gwaripper.info import FileInfo, FileCollection
 from gwaripper.cli import _cl_link
-from gwaripper.download import DownloadErrorCode
+from gwaripper.download import (
+    DownloadErrorCode, HTTPConnectionPool, download_in_chunks, download_text,
+    part_filename, part_validator_filename, parse_content_range, iter_hls_segments, fetch_hls_segment, download_hls,
+    hls_needs_remux, get_url_file_size
+)
+from gwaripper import download
+from gwaripper.ratelimit import HostScheduler, HostLimits
 from gwaripper import extractors
-from utils import TESTS_DIR, setup_tmpdir_param, gen_hash_from_file
+from utils import TESTS_DIR, setup_tmpdir_param, gen_hash_from_file, local_http_server
 
 class ArgsDummy:
     def __init__(self, links, **kwargs):
@@ -137,3 +145,364 @@ def test_skip_non_prio_hosts(monkeypatch, setup_tmpdir_param):
     assert files[5].downloaded is DownloadErrorCode.CHOSE_OTHER_HOST
     assert files[6].downloaded is DownloadErrorCode.NO_ERRORS
     assert files[7].downloaded is DownloadErrorCode.CHOSE_OTHER_HOST
+
+
+def test_connection_pool_keep_alive(local_http_server):
+    server = local_http_server
+    server.files["/a.txt"] = b"file a"
+    server.files["/b.txt"] = b"file b" * 1000
+
+    pool = HTTPConnectionPool()
+    with pool.urlopen(server.url("/a.txt"), {"X-Test": "1"}) as resp:
+        assert resp.status == 200
+        assert resp.read() == b"file a"
+    with pool.urlopen(server.url("/b.txt")) as resp:
+        # read in chunks
+        data = b""
+        while True:
+            chunk = resp.read(100)
+            if not chunk:
+                break
+            data += chunk
+        assert data == server.files["/b.txt"]
+
+    # second request re-used the connection of the first
+    assert server.connections == 1
+    assert pool.stats() == {"hits": 1, "misses": 1, "idle": 1}
+    assert server.requests[0][2]["X-Test"] == "1"
+
+    # not reading the body means the connection can't be re-used
+    resp = pool.urlopen(server.url("/b.txt"))
+    resp.close()
+    assert pool.stats()["idle"] == 0
+
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        pool.urlopen(server.url("/missing"))
+    assert exc.value.code == 404
+    # error responses don't cost the connection either
+    assert pool.stats()["idle"] == 1
+
+    # server closed the idle connection -> transparently retried on a new one
+    for conns in pool._idle.values():
+        for conn in conns:
+            conn.sock.close()
+    with pool.urlopen(server.url("/a.txt")) as resp:
+        assert resp.read() == b"file a"
+
+    pool.clear()
+    assert pool.stats()["idle"] == 0
+
+
+def test_download_helpers_use_pool(monkeypatch, local_http_server, setup_tmpdir_param):
+    server = local_http_server
+    server.files["/page.html"] = "<p>täst</p>".encode("utf-8")
+    server.files["/audio.m4a"] = os.urandom(50000)
+
+    pool = HTTPConnectionPool()
+    monkeypatch.setattr(download, "_pool", pool)
+
+    assert download_text({"User-Agent": "ua"}, server.url("/page.html"),
+                         additional_headers={"Referer": "ref"}) == ("<p>täst</p>", None)
+    assert server.requests[-1][2]["Referer"] == "ref"
+    assert download_text({}, server.url("/nope.html")) == (None, 404)
+
+    fn = os.path.join(setup_tmpdir_param, "audio.m4a")
+    assert download_in_chunks(server.url("/audio.m4a"), fn) == 50000
+    with open(fn, "rb") as f:
+        assert f.read() == server.files["/audio.m4a"]
+
+    assert server.connections == 1
+    assert pool.stats()["hits"] == 2
+
+
+def test_connection_pool_redirects(monkeypatch, local_http_server):
+    server = local_http_server
+    server.files["/file.txt"] = b"content"
+    # same server under another hostname
+    other_url = server.url("/file.txt").replace("127.0.0.1", "localhost")
+    server.redirects["/same"] = (302, "/file.txt")
+    server.redirects["/other"] = (301, other_url)
+
+    scheduled = []
+
+    class RecordingScheduler(HostScheduler):
+        def request(self, url):
+            scheduled.append(url)
+            return super().request(url)
+
+    scheduler = RecordingScheduler(HostLimits(0, 1, 1))
+    monkeypatch.setattr("gwaripper.ratelimit._scheduler", scheduler)
+
+    pool = HTTPConnectionPool()
+    headers = {"Authorization": "Bearer x", "cookie": "a=b", "X-Test": "1"}
+    with pool.urlopen(server.url("/same"), headers) as resp:
+        assert resp.read() == b"content"
+    # same host: covered by the caller's slot
+    assert scheduled == []
+    assert server.requests[-1][2]["Authorization"] == "Bearer x"
+
+    with pool.urlopen(server.url("/other"), headers) as resp:
+        assert resp.geturl() == other_url
+        assert resp.read() == b"content"
+    # every hop to another host gets its own slot
+    assert scheduled == [other_url]
+    sent = server.requests[-1][2]
+    assert "Authorization" not in sent and "Cookie" not in sent
+    assert sent["X-Test"] == "1"
+    # slot was released once the response was closed
+    assert scheduler._get_state("localhost").connections.acquire(timeout=1)
+
+
+def test_get_url_file_size(monkeypatch, local_http_server):
+    server = local_http_server
+    server.files["/file.txt"] = b"x" * 1234
+    monkeypatch.setattr(download, "_pool", HTTPConnectionPool())
+
+    assert get_url_file_size(server.url("/file.txt")) == 1234
+    assert [r[0] for r in server.requests] == ["HEAD"]
+    # HEAD not allowed -> GET without reading the body
+    server.fail_with["/file.txt"] = [405]
+    assert get_url_file_size(server.url("/file.txt")) == 1234
+    assert [r[0] for r in server.requests[1:]] == ["HEAD", "GET"]
+
+
+def test_parse_content_range():
+    assert parse_content_range("bytes 100-999/1000") == (100, 1000)
+    assert parse_content_range("bytes 0-9/*") == (0, -1)
+    assert parse_content_range("bytes */1000") == (None, 1000)
+    assert parse_content_range(None) == (None, -1)
+    assert parse_content_range("garbage") == (None, -1)
+
+
+def test_download_in_chunks_resume(monkeypatch, local_http_server, setup_tmpdir_param):
+    server = local_http_server
+    content = os.urandom(100000)
+    server.files["/audio.m4a"] = content
+    url = server.url("/audio.m4a")
+    fn = os.path.join(setup_tmpdir_param, "audio.m4a")
+    part_fn = part_filename(fn, url)
+
+    # interrupted twice -> resumed within the same call using Range requests
+    server.cut_after["/audio.m4a"] = [30000, 10000]
+    assert download_in_chunks(url, fn) == len(content)
+    with open(fn, "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(part_fn)
+    ranges = [r[2].get("Range") for r in server.requests]
+    assert ranges == [None, "bytes=30000-", "bytes=40000-"]
+
+    # no resumes left -> ContentTooShortError but .part file is kept
+    os.remove(fn)
+    server.requests.clear()
+    server.cut_after["/audio.m4a"] = [20000]
+    with pytest.raises(urllib.error.ContentTooShortError):
+        download_in_chunks(url, fn, max_resumes=0)
+    assert not os.path.exists(fn)
+    assert os.path.getsize(part_fn) == 20000
+
+    # next call resumes from the .part file
+    assert download_in_chunks(url, fn) == len(content)
+    with open(fn, "rb") as f:
+        assert f.read() == content
+    # resumed with the ETag of the response the .part file was started with
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+    assert [(r[2].get("Range"), r[2].get("If-Range")) for r in server.requests] == [
+        (None, None), ("bytes=20000-", etag)]
+    assert not os.path.exists(part_validator_filename(part_fn))
+
+    # already complete .part file -> 416 -> just renamed
+    os.remove(fn)
+    with open(part_fn, "wb") as f:
+        f.write(content)
+    with open(part_validator_filename(part_fn), "w") as f:
+        f.write(etag)
+    server.requests.clear()
+    assert download_in_chunks(url, fn) == len(content)
+    with open(fn, "rb") as f:
+        assert f.read() == content
+    assert [r[2].get("Range") for r in server.requests] == [f"bytes={len(content)}-"]
+
+    # stale .part file that's larger than the file -> restarted
+    os.remove(fn)
+    with open(part_fn, "wb") as f:
+        f.write(content + b"more")
+    with open(part_validator_filename(part_fn), "w") as f:
+        f.write(etag)
+    assert download_in_chunks(url, fn) == len(content)
+    with open(fn, "rb") as f:
+        assert f.read() == content
+
+
+def test_download_in_chunks_resume_changed_file(local_http_server, setup_tmpdir_param):
+    server = local_http_server
+    old = os.urandom(50000)
+    new = os.urandom(60000)
+    server.files["/audio.m4a"] = old
+    url = server.url("/audio.m4a")
+    fn = os.path.join(setup_tmpdir_param, "audio.m4a")
+    part_fn = part_filename(fn, url)
+
+    server.cut_after["/audio.m4a"] = [20000]
+    with pytest.raises(urllib.error.ContentTooShortError):
+        download_in_chunks(url, fn, max_resumes=0)
+    assert os.path.getsize(part_fn) == 20000
+
+    # file changed on the server -> If-Range doesn't match -> whole new file
+    # instead of the old prefix joined to the new tail
+    server.files["/audio.m4a"] = new
+    server.requests.clear()
+    assert download_in_chunks(url, fn) == len(new)
+    with open(fn, "rb") as f:
+        assert f.read() == new
+    assert [(r[2].get("Range"), r[2].get("If-Range")) for r in server.requests] == [
+        ("bytes=20000-", f'"{hashlib.md5(old).hexdigest()}"')]
+    assert not os.path.exists(part_fn)
+    assert not os.path.exists(part_validator_filename(part_fn))
+
+    # no validator -> a .part file of a previous call can't be checked -> restarted
+    os.remove(fn)
+    server.send_etag = False
+    server.cut_after["/audio.m4a"] = [20000]
+    with pytest.raises(urllib.error.ContentTooShortError):
+        download_in_chunks(url, fn, max_resumes=0)
+    assert not os.path.exists(part_validator_filename(part_fn))
+    server.requests.clear()
+    assert download_in_chunks(url, fn) == len(new)
+    with open(fn, "rb") as f:
+        assert f.read() == new
+    assert [r[2].get("Range") for r in server.requests] == [None]
+
+
+def test_download_in_chunks_resume_unknown_total(local_http_server, setup_tmpdir_param):
+    server = local_http_server
+    content = os.urandom(50000)
+    server.files["/audio.m4a"] = content
+    server.unknown_total = True
+    url = server.url("/audio.m4a")
+    fn = os.path.join(setup_tmpdir_param, "audio.m4a")
+
+    # resumed responses only report the length of the range, cut off again
+    # -> not complete
+    server.cut_after["/audio.m4a"] = [30000, 10000]
+    assert download_in_chunks(url, fn) == len(content)
+    with open(fn, "rb") as f:
+        assert f.read() == content
+    assert [r[2].get("Range") for r in server.requests] == [
+        None, "bytes=30000-", "bytes=40000-"]
+
+
+def test_download_in_chunks_no_range_support(local_http_server, setup_tmpdir_param):
+    server = local_http_server
+    server.accept_ranges = False
+    content = os.urandom(50000)
+    server.files["/audio.m4a"] = content
+    url = server.url("/audio.m4a")
+    fn = os.path.join(setup_tmpdir_param, "audio.m4a")
+
+    server.cut_after["/audio.m4a"] = [20000]
+    with pytest.raises(urllib.error.ContentTooShortError):
+        download_in_chunks(url, fn)
+    # can't be resumed -> nothing is kept
+    assert not os.path.exists(fn)
+    assert not os.path.exists(part_filename(fn, url))
+
+    # .part file of a previous run but the server ignores the Range header
+    with open(part_filename(fn, url), "wb") as f:
+        f.write(b"x" * 100)
+    assert download_in_chunks(url, fn) == len(content)
+    with open(fn, "rb") as f:
+        assert f.read() == content
+
+
+def test_iter_hls_segments(monkeypatch, local_http_server):
+    server = local_http_server
+    parts = []
+    for i in range(12):
+        server.files[f"/seg{i}.ts"] = f"segment {i};".encode("utf-8")
+        parts.append(server.url(f"/seg{i}.ts"))
+    # one segment fails twice before succeeding
+    server.fail_with["/seg5.ts"] = [503, 429]
+
+    # no rate limiting/backoff by the scheduler, so we only record the segment backoff
+    monkeypatch.setattr("gwaripper.ratelimit._scheduler", HostScheduler(HostLimits(0, 1, 100)))
+    monkeypatch.setattr(HostScheduler, "backoff", lambda *args, **kwargs: 0.0)
+    slept = []
+    monkeypatch.setattr("gwaripper.download.time.sleep", lambda s: slept.append(s))
+
+    segments = list(iter_hls_segments(parts, concurrency=4, show_progress=False))
+    # yielded in playlist order
+    assert segments == [f"segment {i};".encode("utf-8") for i in range(12)]
+    # only slept after the failures with exponential backoff
+    assert slept == [1, 2]
+
+    # errors that won't go away by retrying are raised immediately
+    slept.clear()
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        fetch_hls_segment(server.url("/missing.ts"))
+    assert exc.value.code == 404
+    assert not slept
+
+    # gives up after max_retries
+    server.fail_with["/seg0.ts"] = [503] * 3
+    with pytest.raises(urllib.error.HTTPError):
+        fetch_hls_segment(parts[0], max_retries=2)
+    assert slept == [1, 2]
+
+    # truncated segments are retried
+    slept.clear()
+    server.cut_after["/seg1.ts"] = [3]
+    assert fetch_hls_segment(parts[1]) == b"segment 1;"
+    assert slept == [1]
+
+    # closing the generator early doesn't fetch the whole playlist
+    server.requests.clear()
+    gen = iter_hls_segments(parts, concurrency=1, show_progress=False)
+    assert next(gen) == b"segment 0;"
+    gen.close()
+    assert len(server.requests) <= 3
+
+
+@pytest.mark.parametrize("filename, expected", [
+    ("a.ts", False),
+    ("a.TS", False),
+    ("a.mp4", True),
+    ("a.m4a", True),
+    ("a", True),
+])
+def test_hls_needs_remux(filename, expected):
+    assert hls_needs_remux(filename) is expected
+
+
+def test_download_hls_concat(monkeypatch, local_http_server, setup_tmpdir_param):
+    server = local_http_server
+    playlist = ["#EXTM3U", "#EXT-X-TARGETDURATION:10"]
+    for i in range(5):
+        server.files[f"/seg{i}.ts"] = bytes([i]) * 1000
+        playlist.extend(["#EXTINF:10.0,", server.url(f"/seg{i}.ts")])
+    playlist.append("#EXT-X-ENDLIST")
+    server.files["/playlist.m3u8"] = "\n".join(playlist).encode("utf-8")
+
+    monkeypatch.setattr("gwaripper.ratelimit._scheduler", HostScheduler(HostLimits(0, 1, 100)))
+    # no ffmpeg needed for .ts files
+    monkeypatch.setattr("gwaripper.download.find_ffmpeg", lambda *args: None)
+
+    fn = os.path.join(setup_tmpdir_param, "stream.ts")
+    assert download_hls(server.url("/playlist.m3u8"), fn, show_progress=False, concurrency=2)
+    with open(fn, "rb") as f:
+        assert f.read() == b"".join(bytes([i]) * 1000 for i in range(5))
+    assert not os.path.exists(f"{fn}.part")
+    # segments never touched _tmp
+    assert not os.path.exists(os.path.join(setup_tmpdir_param, "_tmp"))
+
+    # ffmpeg would be needed for remuxing
+    fn = os.path.join(setup_tmpdir_param, "stream.mp4")
+    assert not download_hls(server.url("/playlist.m3u8"), fn, show_progress=False)
+    assert not os.path.exists(fn)
+
+    # failed segment -> no partial output
+    server.fail_with["/seg3.ts"] = [404]
+    fn = os.path.join(setup_tmpdir_param, "failed.ts")
+    with pytest.raises(urllib.error.HTTPError):
+        download_hls(server.url("/playlist.m3u8"), fn, show_progress=False)
+    assert not os.path.exists(fn)
+    assert not os.path.exists(f"{fn}.part")
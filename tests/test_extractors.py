@@ -102,6 +102,34 @@ def test_find_extractor_and_init(url, expected, attr_val):
         assert getattr(e, k) == v
 
 
+def _find_extractor_linear(url):
+    for extractor in AVAILABLE_EXTRACTORS:
+        if extractor.is_compatible(url):
+            return extractor
+    return None
+
+
+@pytest.mark.parametrize('url', [
+    'https://soundgasm.net/u/user/title',
+    'HTTPS://WWW.SOUNDGASM.NET/u/user/title',
+    'soundgasm.net/u/user',
+    'https://media.soundgasm.net/sounds/abc.m4a',
+    'https://soundgasm.net.evil.com/u/user/title',
+    'https://i.imgur.com/c0T9oSy.mp4?1',
+    'https://m.imgur.com/a/k23j4',
+    'https://old.reddit.com/r/gonewildaudio/comments/44vvko/title/',
+    'https://www.soundcloud.com/user/track',
+    'https://example.com/soundgasm.net/u/user/title',
+    'http://[::1/broken',
+    'not an url',
+    '',
+])
+def test_find_extractor_same_as_linear(url):
+    # dispatching by host has to give the same results as trying all extractors
+    assert find_extractor(url) is _find_extractor_linear(url)
+    assert BaseExtractor.is_unsupported_audio_url(url) is any(
+        pattern.match(url) for pattern in BaseExtractor.FILTER_URLS_RE)
+
 sgasm_usr_audio_urls = [
     "https://soundgasm.net/u/DDCherryB/Youve-got-another-girl-somewhere-"
     "beastmaybe-DDLGno-age-rapecrying-l-bombsimpreg-surprise-lube-sounds-"
@@ -4,6 +4,7 @@ import time
 import sqlite3
 import logging
 import datetime
+import threading
 
 import urllib.error
 
@@ -15,7 +16,8 @@ from gwaripper import exceptions
 from gwaripper.info import FileInfo, RedditInfo, FileCollection, DELETED_USR_FOLDER, UNKNOWN_USR_FOLDER
 from gwaripper.download import DownloadErrorCode
 from gwaripper.extractors.base import ExtractorReport, ExtractorErrorCode
-from gwaripper.extractors.soundgasm import SoundgasmExtractor
+from gwaripper.extractors.soundgasm import SoundgasmExtractor, SoundgasmUserExtractor
+import gwaripper.extractors.base as extr_base
 from gwaripper.extractors.erocast import ErocastExtractor
 from gwaripper.extractors.reddit import RedditExtractor
 from gwaripper.extractors.imgur import ImgurImageExtractor, ImgurAlbumExtractor
@@ -33,16 +35,17 @@ def test_exit_context(setup_tmpdir, monkeypatch):
 
     exp_csv_called = False
 
-    def patch_exp_csv(con, fn, table):
+    def patch_exp_csv(con, fn, table, since_change_seq):
         assert fn == os.path.join(tmpdir, 'gwarip_db_exp.csv')
         assert con
         assert table == "v_audio_and_collection_combined"
         nonlocal exp_csv_called
         exp_csv_called = True
+        return 5
 
     # gwaripper.py used from .. import .. so it's in it's own 'namespace'
     # so we have to patch it there
-    monkeypatch.setattr('gwaripper.gwaripper.export_table_to_csv', patch_exp_csv)
+    monkeypatch.setattr('gwaripper.gwaripper.export_changes_to_csv', patch_exp_csv)
 
     close_called = False
 
@@ -1250,6 +1253,210 @@ def test_set_urls(setup_tmpdir):
         assert gwa.nr_urls == 5
 
 
+def test_download_all_concurrent_keeps_report_order(setup_tmpdir, monkeypatch):
+    urls = [f"https://soundgasm.net/u/user/title-{i}" for i in range(8)]
+
+    def patched_extract_and_download(self, url):
+        # later urls finish first
+        time.sleep(0.01 * (len(urls) - urls.index(url)))
+        return ExtractorReport(url, ExtractorErrorCode.NO_ERRORS)
+
+    monkeypatch.setattr('gwaripper.gwaripper.GWARipper._extract_and_download',
+                        patched_extract_and_download)
+
+    gwa = GWARipper(max_workers=4)
+    # order of passed in urls is kept and duplicates are removed
+    gwa.set_urls(urls + urls[:2])
+    assert gwa.urls == urls
+    gwa.download_all()
+    assert [r.url for r in gwa.extractor_reports] == urls
+    gwa.db_con.close()
+
+
+def test_pad_filename_reserved(setup_tmpdir):
+    tmpdir = setup_tmpdir
+    with open(os.path.join(tmpdir, "file.mp3"), "w"):
+        pass
+    reserved = {os.path.join(tmpdir, "file_02.mp3")}
+
+    assert GWARipper._pad_filename_if_exists(tmpdir, "file", "mp3") == "file_02"
+    assert GWARipper._pad_filename_if_exists(
+        tmpdir, "file", "mp3", reserved=reserved) == "file_03"
+    assert GWARipper._pad_filename_if_exists(
+        tmpdir, "other", "mp3", reserved=reserved) == "other"
+
+
+def test_download_all_skips_known_urls(setup_tmpdir, monkeypatch):
+    known = "https://soundgasm.net/u/user/known"
+    new = "https://soundgasm.net/u/user/new"
+    monkeypatch.setitem(cfg.config["Settings"], "set_missing_reddit", "False")
+
+    gwa = GWARipper()
+    with gwa.db_con:
+        GWARipper.add_to_db(gwa.db_con, FileInfo(
+            SoundgasmExtractor, True, "m4a", known, "https://media.soundgasm.net/1.m4a",
+            None, "Known", None, "user"), None, "known.m4a")
+
+    extracted = []
+
+    def patched_extract(self):
+        extracted.append(self.url)
+        return None, ExtractorReport(self.url, ExtractorErrorCode.NO_ERRORS)
+
+    monkeypatch.setattr('gwaripper.extractors.soundgasm.SoundgasmExtractor._extract',
+                        patched_extract)
+    user_page = (f'<div class="sound-details"><a href="{known}">k</a></div>'
+                 f'<div class="sound-details"><a href="{new}">n</a></div>')
+    monkeypatch.setattr('gwaripper.extractors.soundgasm.SoundgasmExtractor.get_html',
+                        lambda url: (user_page, 200))
+
+    gwa.set_urls([known, new, "https://soundgasm.net/u/user"])
+    gwa.download_all()
+    # known url was never fetched, neither top-level nor as part of the user page
+    assert extracted == [new, new]
+    reports = gwa.extractor_reports
+    assert reports[0].url == known
+    assert reports[0].download_error_code is DownloadErrorCode.SKIPPED_DUPLICATE
+    assert reports[1].download_error_code is not DownloadErrorCode.SKIPPED_DUPLICATE
+    assert [(r.url, r.download_error_code) for r in reports[2].children] == [
+        (known, DownloadErrorCode.SKIPPED_DUPLICATE),
+        (new, DownloadErrorCode.NOT_DOWNLOADED)]
+
+    # set_missing_reddit needs files without a collection to be extracted again
+    monkeypatch.setitem(cfg.config["Settings"], "set_missing_reddit", "True")
+    assert known not in gwa.load_known_urls()
+    monkeypatch.setitem(cfg.config["Settings"], "set_missing_reddit", "False")
+    assert known in gwa.load_known_urls()
+
+    # nothing is skipped when re-downloading duplicates or outside of download_all
+    extracted.clear()
+    gwa.extract_and_download(known)
+    assert extracted == [known]
+    gwa.db_con.close()
+
+    gwa = GWARipper(download_duplicates=True)
+    extracted.clear()
+    gwa.set_urls([known])
+    gwa.download_all()
+    assert extracted == [known]
+    gwa.db_con.close()
+
+
+def test_download_all_retries_partially_downloaded_collection(setup_tmpdir, monkeypatch):
+    album = "https://imgur.com/a/abcde"
+    known = "https://i.imgur.com/known.mp4"
+    failed = "https://i.imgur.com/failed.mp4"
+    monkeypatch.setitem(cfg.config["Settings"], "set_missing_reddit", "False")
+
+    gwa = GWARipper()
+    # collection was added to the DB when the first file was downloaded, but the
+    # other one failed
+    with gwa.db_con:
+        alias_id = gwa.db_con.execute("INSERT INTO Alias(name) VALUES ('user')").lastrowid
+        collection_id = gwa.db_con.execute(
+            "INSERT INTO FileCollection(url, id_on_page, title, subpath, alias_id) "
+            "VALUES (?, 'abcde', 'Album', '', ?)", (album, alias_id)).lastrowid
+        GWARipper.add_to_db(gwa.db_con, FileInfo(
+            ImgurImageExtractor, True, "mp4", known, known,
+            None, "Known", None, "user"), collection_id, "known.mp4")
+    assert gwa.load_known_urls() == {known}
+
+    extracted = []
+
+    def patched_extract(self):
+        extracted.append(self.url)
+        return None, ExtractorReport(self.url, ExtractorErrorCode.NO_ERRORS)
+
+    monkeypatch.setattr(ImgurAlbumExtractor, '_extract', patched_extract)
+    gwa.set_urls([album])
+    gwa.download_all()
+    # the album gets extracted again so the failed file can be downloaded
+    assert extracted == [album]
+    assert gwa.extractor_reports[0].download_error_code is not DownloadErrorCode.SKIPPED_DUPLICATE
+    gwa.db_con.close()
+
+
+def test_soundgasm_user_keeps_known_children(setup_tmpdir, monkeypatch):
+    urls = [f"https://soundgasm.net/u/user/title-{i}" for i in range(3)]
+    user_page = "".join(f'<div class="sound-details"><a href="{url}">t</a></div>'
+                        for url in urls)
+    monkeypatch.setattr('gwaripper.extractors.soundgasm.SoundgasmExtractor.get_html',
+                        lambda url: (user_page, 200))
+    extracted = []
+
+    def patched_extract(self):
+        extracted.append(self.url)
+        return (FileInfo(SoundgasmExtractor, True, "m4a", self.url, f"{self.url}.m4a",
+                         None, "title", None, "user"),
+                ExtractorReport(self.url, ExtractorErrorCode.NO_ERRORS))
+
+    monkeypatch.setattr(SoundgasmExtractor, '_extract', patched_extract)
+    extr_base.set_known_urls({urls[1]})
+    try:
+        fcol, report = SoundgasmUserExtractor.extract("https://soundgasm.net/u/user")
+        children = list(fcol.iter_children())
+    finally:
+        extr_base.set_known_urls(None)
+
+    # known file wasn't fetched but keeps its place, so the numbering and the
+    # sub-directory of the other files stay the same
+    assert extracted == [urls[0], urls[2]]
+    assert [c.page_url for c in children] == urls
+    assert fcol.nr_files == 3
+    assert [c.downloaded for c in children] == [
+        DownloadErrorCode.NOT_DOWNLOADED, DownloadErrorCode.SKIPPED_DUPLICATE,
+        DownloadErrorCode.NOT_DOWNLOADED]
+    assert [r.download_error_code for r in report.children] == [
+        DownloadErrorCode.NOT_DOWNLOADED, DownloadErrorCode.SKIPPED_DUPLICATE,
+        DownloadErrorCode.NOT_DOWNLOADED]
+
+
+def test_download_starts_before_collection_is_extracted(setup_tmpdir, monkeypatch):
+    tmpdir = setup_tmpdir
+    monkeypatch.setitem(cfg.config["Settings"], "extract_concurrency", "2")
+    urls = [f"https://soundgasm.net/u/user/title-{i}" for i in range(6)]
+    first_download = threading.Event()
+
+    def patched_extract(self):
+        idx = urls.index(self.url)
+        # 0, 2 and 3 are the first 3 files so the download can start with them
+        if idx >= 4:
+            # only finishes once the first file is downloading
+            assert first_download.wait(5)
+        if idx == 1:
+            return None, ExtractorReport(self.url, ExtractorErrorCode.NO_RESPONSE)
+        return (FileInfo(SoundgasmExtractor, True, "m4a", self.url, self.url + ".m4a",
+                         None, f"title-{idx}", None, "user"),
+                ExtractorReport(self.url, ExtractorErrorCode.NO_ERRORS))
+
+    user_page = "".join(f'<div class="sound-details"><a href="{url}">t</a></div>'
+                        for url in urls)
+    monkeypatch.setattr('gwaripper.extractors.soundgasm.SoundgasmExtractor._extract',
+                        patched_extract)
+    monkeypatch.setattr('gwaripper.extractors.soundgasm.SoundgasmExtractor.get_html',
+                        lambda url: (user_page, 200))
+
+    downloaded = []
+
+    def patched_download(self, info, mypath, filename):
+        first_download.set()
+        downloaded.append((os.path.relpath(mypath, tmpdir), filename))
+
+    monkeypatch.setattr('gwaripper.gwaripper.GWARipper._download_file_http', patched_download)
+
+    gwa = GWARipper()
+    gwa.extract_and_download("https://soundgasm.net/u/user")
+    gwa.db_con.close()
+
+    # numbering and sub-directory same as if the whole collection had been extracted first
+    assert downloaded == [(os.path.join("user", "user"), f"{i:02d}_title-{idx}.m4a")
+                          for i, idx in enumerate([0, 2, 3, 4, 5], start=1)]
+    report = gwa.extractor_reports[0]
+    assert report.err_code is ExtractorErrorCode.ERROR_IN_CHILDREN
+    assert [r.url for r in report.children] == urls
+    assert report.children[1].err_code is ExtractorErrorCode.NO_RESPONSE
+
+
 def test_extract_and_download(setup_tmpdir, monkeypatch, caplog):
     # setup_tmpdir sets root_path in config
 
@@ -228,6 +228,47 @@ def test_preferred_author():
     assert fc2.get_preferred_author_name() == "_unknown_user_files"
 
 
+def test_fcol_pending_children():
+    fc = FileCollection(base.BaseExtractor, "url", "id", "title", "author")
+    files = [FileInfo(base.BaseExtractor, True, "m4a", f"page{i}", f"direct{i}",
+                      None, f"title{i}", None, "author") for i in range(5)]
+    attached = 0
+
+    def pending():
+        nonlocal attached
+        for fi in files:
+            fc.add_file(fi)
+            attached += 1
+            yield
+
+    fc.set_pending_children(pending())
+    assert fc.extraction_pending
+    # doesn't need to wait for the children
+    assert fc.get_preferred_author_name() == "author"
+    assert attached == 0
+
+    fc.finish_extraction(min_files=3)
+    assert attached == 3
+    assert fc.nr_files == 3
+
+    it = fc.iter_children()
+    assert [next(it) for _ in range(4)] == files[:4]
+    assert attached == 4
+    # property blocks till all children were attached
+    assert fc.children == files
+    assert not fc.extraction_pending
+    assert list(it) == files[4:]
+
+    # cancelling stops attaching
+    fc = FileCollection(base.BaseExtractor, "url", "id", "title", "author")
+    attached = 0
+    fc.set_pending_children(pending())
+    fc.finish_extraction(min_files=1)
+    fc.cancel_extraction()
+    assert not fc.extraction_pending
+    assert fc.children == files[:1]
+
+
 def test_downloaded_set_on_report():
     fi1, fi2, fi3, fi4, fi5, fc1, fc2, ri = generate_redditinfo_tree(add_collections=True)
     exerr = base.ExtractorErrorCode
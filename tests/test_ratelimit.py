@@ -0,0 +1,133 @@
+import pytest
+import time
+import logging
+import datetime
+import email.utils
+import urllib.error
+
+import gwaripper.config as cfg
+
+from gwaripper.ratelimit import (
+    host_key, parse_retry_after, TokenBucket, HostScheduler, HostLimits,
+    scheduler_from_config
+)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://soundgasm.net/u/user/title", "soundgasm.net"),
+    ("https://media.soundgasm.net/sounds/abc.m4a", "soundgasm.net"),
+    ("soundgasm.net/u/", "soundgasm.net"),
+    ("http://i.imgur.com/abc.jpg", "imgur.com"),
+    ("https://whyp.it/tracks/1", "whyp.it"),
+    ("http://127.0.0.1:8080/file", "127.0.0.1"),
+])
+def test_host_key(url, expected):
+    assert host_key(url) == expected
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("garbage") is None
+
+    in_30s = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+    secs = parse_retry_after(email.utils.format_datetime(in_30s, usegmt=True))
+    assert 28 < secs <= 30
+    # dates in the past -> don't wait
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(10, 3)
+    # burst
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    # afterwards callers are spaced 1/rate apart
+    first = bucket.reserve()
+    second = bucket.reserve()
+    assert 0.05 < first <= 0.1
+    assert 0.15 < second <= 0.2
+
+    unlimited = TokenBucket(0, 1)
+    assert all(unlimited.reserve() == 0 for _ in range(100))
+
+
+def test_scheduler_throttles_per_host():
+    sched = HostScheduler(HostLimits(0, 1, 4), {"slow.com": HostLimits(20, 1, 1)})
+
+    before = time.monotonic()
+    for _ in range(3):
+        with sched.request("https://slow.com/x"):
+            pass
+    # burst of one then 2 requests 1/20s apart
+    assert time.monotonic() - before >= 0.09
+
+    before = time.monotonic()
+    for _ in range(3):
+        with sched.request("https://fast.com/x"):
+            pass
+    assert time.monotonic() - before < 0.05
+
+    stats = sched.stats()
+    assert stats["slow.com"].requests == 3
+    assert stats["slow.com"].throttled >= 0.09
+    assert stats["fast.com"].requests == 3
+    assert stats["fast.com"].throttled < 0.05
+
+
+def test_scheduler_backoff_on_429():
+    sched = HostScheduler(HostLimits(8, 8, 2))
+
+    with pytest.raises(urllib.error.HTTPError):
+        with sched.request("https://host.com/a"):
+            raise urllib.error.HTTPError(
+                "https://host.com/a", 429, "Too Many Requests", {"Retry-After": "0.2"}, None)
+
+    st = sched.stats()["host.com"]
+    assert st.backoffs == 1
+    # rate was halved
+    assert sched._hosts["host.com"].bucket.rate == 4
+
+    before = time.monotonic()
+    with sched.request("https://host.com/b"):
+        pass
+    # waited for Retry-After
+    assert time.monotonic() - before >= 0.15
+    # successful request -> recovering rate
+    assert sched._hosts["host.com"].bucket.rate == 6
+
+    # other errors don't cause a backoff
+    with pytest.raises(urllib.error.HTTPError):
+        with sched.request("https://host.com/a"):
+            raise urllib.error.HTTPError("https://host.com/a", 404, "Not Found", {}, None)
+    assert sched.stats()["host.com"].backoffs == 1
+
+
+def test_scheduler_log_stats(caplog):
+    sched = HostScheduler(HostLimits(0, 1, 2))
+    with sched.request("https://calm.com/a"):
+        pass
+    with pytest.raises(urllib.error.HTTPError):
+        with sched.request("https://busy.com/a"):
+            raise urllib.error.HTTPError(
+                "https://busy.com/a", 503, "Service Unavailable", {"Retry-After": "0"}, None)
+
+    with caplog.at_level(logging.DEBUG, logger="gwaripper.ratelimit"):
+        sched.log_stats()
+    levels = {r.getMessage().split(":")[0]: r.levelno for r in caplog.records
+              if r.getMessage().startswith("Host ") and "requests" in r.getMessage()}
+    # throttled or backed off hosts are logged at info
+    assert levels == {"Host busy.com": logging.INFO, "Host calm.com": logging.DEBUG}
+
+
+def test_scheduler_from_config(monkeypatch):
+    monkeypatch.setitem(cfg.config["Settings"], "host_rate_limit", "2:3:1")
+    monkeypatch.setitem(cfg.config["Settings"], "host_rate_limits",
+                        "SOUNDGASM=1:2:3, i.imgur.com=5, malformed, WHYP=x")
+    sched = scheduler_from_config()
+    assert sched.default_limits == HostLimits(2, 3, 1)
+    assert sched.host_limits == {
+        "soundgasm.net": HostLimits(1, 2, 3),
+        # missing values use the defaults
+        "imgur.com": HostLimits(5, 3, 1),
+    }
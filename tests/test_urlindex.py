@@ -0,0 +1,104 @@
+import pytest
+import os
+
+from gwaripper.urlindex import BloomFilter, UrlIndex, load_url_index
+from gwaripper.db import load_or_create_sql_db
+from gwaripper.gwaripper import GWARipper
+from gwaripper.info import FileInfo
+from gwaripper.extractors.soundgasm import SoundgasmExtractor, SoundgasmUserExtractor
+from gwaripper import clipwatcher_single
+from utils import setup_tmpdir
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    added = [f"https://soundgasm.net/u/user/{i}" for i in range(1000)]
+    for url in added:
+        bloom.add(url)
+
+    # no false negatives
+    assert all(url in bloom for url in added)
+    false_positives = sum(f"https://whyp.it/tracks/{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_url_index():
+    urls = [f"https://soundgasm.net/u/user/{i}" for i in range(5000)]
+    index = UrlIndex(urls + urls[:10])
+    assert len(index) == 5000
+    assert all(url in index for url in urls)
+    # exact confirmation after the Bloom filter
+    assert not any(f"https://whyp.it/tracks/{i}" in index for i in range(20000))
+
+    assert "https://whyp.it/tracks/new" not in index
+    index.add("https://whyp.it/tracks/new")
+    assert "https://whyp.it/tracks/new" in index
+
+    empty = UrlIndex()
+    assert "https://soundgasm.net/u/user/0" not in empty
+    empty.add("https://soundgasm.net/u/user/0")
+    assert "https://soundgasm.net/u/user/0" in empty
+
+
+def test_url_index_memory():
+    index = UrlIndex(f"https://soundgasm.net/u/user{i % 1000}/title-{i}" for i in range(100_000))
+    assert len(index) == 100_000
+    assert index.memory_usage() < 2 * 1024**2
+
+
+def test_load_url_index(setup_tmpdir):
+    db_con, _ = load_or_create_sql_db(os.path.join(setup_tmpdir, "gwarip_db.sqlite"))
+    with db_con:
+        GWARipper.add_to_db(db_con, FileInfo(
+            SoundgasmExtractor, True, "m4a", "https://soundgasm.net/u/user/file",
+            "https://media.soundgasm.net/1.m4a", None, "Title", None, "user"), None, "file.m4a")
+        GWARipper.add_artist(db_con, "user")
+        db_con.execute("""
+        INSERT INTO FileCollection(url, id_on_page, title, subpath, alias_id)
+        VALUES ('https://soundgasm.net/u/user', 'user', 'user', '',
+                (SELECT id FROM Alias WHERE name = 'user'))""")
+
+    index = load_url_index(db_con)
+    db_con.close()
+    assert len(index) == 2
+    assert "https://soundgasm.net/u/user/file" in index
+    assert "https://soundgasm.net/u/user" in index
+    assert "https://soundgasm.net/u/user/other" not in index
+
+
+def test_clipboard_watcher_drops_known(monkeypatch):
+    clipboard = iter([
+        "https://soundgasm.net/u/user/known",
+        "not an url",
+        "https://soundgasm.net/u/user/new ",
+        "https://soundgasm.net/u/user",
+        # copied again
+        "https://soundgasm.net/u/user/new",
+        "https://example.com/unsupported",
+    ])
+
+    watcher = None
+
+    def paste():
+        try:
+            return next(clipboard)
+        except StopIteration:
+            watcher.stop()
+            return ""
+
+    monkeypatch.setattr("gwaripper.clipwatcher_single.pyperclip.paste", paste)
+    captured = []
+    watcher = clipwatcher_single.ClipboardWatcher(
+        clipwatcher_single.is_url, lambda url, path, name: captured.append(url), "", 0,
+        known_urls=UrlIndex(["https://soundgasm.net/u/user/known"]))
+    watcher.run()
+
+    expected = ["https://soundgasm.net/u/user/new", "https://soundgasm.net/u/user",
+                "https://example.com/unsupported"]
+    assert captured == expected
+    assert watcher.found == expected
+    assert [(f.url, f.extractor) for f in watcher.found_tagged] == [
+        ("https://soundgasm.net/u/user/new", SoundgasmExtractor),
+        ("https://soundgasm.net/u/user", SoundgasmUserExtractor),
+        ("https://example.com/unsupported", None),
+    ]
@@ -0,0 +1,380 @@
+import pytest
+
+import os
+import re
+import gzip
+import sqlite3
+
+from utils import setup_tmpdir, create_db_with_entries
+
+from gwaripper_webGUI import create_app
+from gwaripper_webGUI.webGUI import (
+    ByteRange, satisfiable_ranges, multipart_byteranges, MAX_RANGES_PER_REQUEST
+)
+from gwaripper_webGUI.api import Cursor, APIError, API_MAX_LIMIT
+
+
+@pytest.fixture
+def app(setup_tmpdir):
+    create_db_with_entries(os.path.join(setup_tmpdir, "gwarip_db.sqlite"), 30)
+    app = create_app(test_config={"TESTING": True})
+    yield app
+    app.extensions["gwaripper_db"].close()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["authenticated"] = True
+    return client
+
+
+AUDIO = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def audio_file(setup_tmpdir):
+    os.makedirs(os.path.join(setup_tmpdir, "artist"))
+    with open(os.path.join(setup_tmpdir, "artist", "audio.m4a"), "wb") as f:
+        f.write(AUDIO)
+    return "/artist_file/audio.m4a?subpath=artist"
+
+
+def test_satisfiable_ranges():
+    size = 1000
+    assert satisfiable_ranges("bytes=0-99", size) == [ByteRange(0, 100)]
+    # last-byte-pos is clamped to the size
+    assert satisfiable_ranges("bytes=900-5000", size) == [ByteRange(900, 1000)]
+    # suffix ranges
+    assert satisfiable_ranges("bytes=-100", size) == [ByteRange(900, 1000)]
+    assert satisfiable_ranges("bytes=-5000", size) == [ByteRange(0, 1000)]
+    # open ranges
+    assert satisfiable_ranges("bytes=500-", size) == [ByteRange(500, 1000)]
+    assert satisfiable_ranges("bytes=0-", size) == [ByteRange(0, 1000)]
+    # sorted, overlapping and adjacent ranges are merged
+    assert satisfiable_ranges("bytes=500-599, 0-99, 50-149, 150-199, 550-", size) == [
+        ByteRange(0, 200), ByteRange(500, 1000)]
+    # empty elements are allowed
+    assert satisfiable_ranges("bytes=,0-9,,", size) == [ByteRange(0, 10)]
+
+    # unsatisfiable -> 416
+    assert satisfiable_ranges("bytes=1000-", size) == []
+    assert satisfiable_ranges("bytes=1000-1100, 2000-", size) == []
+    # only the satisfiable ones are used
+    assert satisfiable_ranges("bytes=1000-1100, 0-0", size) == [ByteRange(0, 1)]
+
+    # invalid or unknown units -> ignored
+    for header in ("bytes=abc", "bytes=10-5", "bytes=-", "bytes=", "items=0-5", "0-5"):
+        assert satisfiable_ranges(header, size) is None
+
+    ranges = ", ".join(f"{i * 10}-{i * 10 + 4}" for i in range(MAX_RANGES_PER_REQUEST))
+    assert len(satisfiable_ranges(f"bytes={ranges}", size)) == MAX_RANGES_PER_REQUEST
+    # too many ranges -> whole file
+    assert satisfiable_ranges(f"bytes={ranges}, 900-904", size) is None
+    # counted after merging
+    assert len(satisfiable_ranges(f"bytes={ranges}, 0-1", size)) == MAX_RANGES_PER_REQUEST
+
+
+def test_multipart_byteranges(setup_tmpdir):
+    fn = os.path.join(setup_tmpdir, "audio.m4a")
+    with open(fn, "wb") as f:
+        f.write(AUDIO)
+    ranges = [ByteRange(0, 10), ByteRange(100, 150), ByteRange(1000, 1024)]
+    body, length, boundary = multipart_byteranges(fn, ranges, len(AUDIO), "audio/mp4")
+    data = b"".join(body)
+    # exact length since it's sent as Content-Length
+    assert len(data) == length
+    parts = data.split(f"--{boundary}".encode("ascii"))
+    assert parts[-1] == b"--\r\n"
+    for part, byte_range in zip(parts[1:-1], ranges):
+        headers, content = part.split(b"\r\n\r\n", 1)
+        assert f"Content-Range: bytes {byte_range.start}-{byte_range.stop - 1}/1024".encode(
+            "ascii") in headers
+        assert b"Content-Type: audio/mp4" in headers
+        # CRLF before the next delimiter belongs to the delimiter
+        assert content == AUDIO[byte_range.start:byte_range.stop] + b"\r\n"
+
+
+def test_artist_file_ranges(client, audio_file):
+    resp = client.get(audio_file)
+    assert resp.status_code == 200
+    assert resp.data == AUDIO
+    assert resp.content_length == len(AUDIO)
+
+    resp = client.get(audio_file, headers={"Range": "bytes=10-19"})
+    assert resp.status_code == 206
+    assert resp.data == AUDIO[10:20]
+    assert resp.headers["Content-Range"] == "bytes 10-19/1024"
+    assert resp.content_length == 10
+
+    resp = client.get(audio_file, headers={"Range": "bytes=-24"})
+    assert resp.status_code == 206
+    assert resp.data == AUDIO[1000:]
+    assert resp.headers["Content-Range"] == "bytes 1000-1023/1024"
+
+    resp = client.get(audio_file, headers={"Range": "bytes=0-"})
+    assert resp.status_code == 206
+    assert resp.data == AUDIO
+    assert resp.headers["Content-Range"] == "bytes 0-1023/1024"
+
+    # overlapping ranges merged into one
+    resp = client.get(audio_file, headers={"Range": "bytes=0-9, 5-19"})
+    assert resp.status_code == 206
+    assert resp.data == AUDIO[:20]
+    assert resp.headers["Content-Range"] == "bytes 0-19/1024"
+
+    resp = client.get(audio_file, headers={"Range": "bytes=0-9, 100-109"})
+    assert resp.status_code == 206
+    boundary = re.match(r"multipart/byteranges; boundary=(\w+)$",
+                        resp.headers["Content-Type"]).group(1)
+    assert resp.content_length == len(resp.data)
+    assert resp.data.count(f"--{boundary}".encode("ascii")) == 3
+    assert AUDIO[100:110] in resp.data
+
+    # invalid header -> whole file
+    resp = client.get(audio_file, headers={"Range": "bytes=20-10"})
+    assert resp.status_code == 200
+    assert resp.data == AUDIO
+    assert "Content-Range" not in resp.headers
+    # too many ranges -> whole file
+    too_many = ", ".join(f"{i * 10}-{i * 10 + 4}" for i in range(MAX_RANGES_PER_REQUEST + 1))
+    resp = client.get(audio_file, headers={"Range": f"bytes={too_many}"})
+    assert resp.status_code == 200
+    assert resp.data == AUDIO
+
+    resp = client.get(audio_file, headers={"Range": "bytes=1024-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == "bytes */1024"
+
+    assert client.get("/artist_file/missing.m4a?subpath=artist").status_code == 404
+
+
+def test_artist_file_conditional_requests(client, audio_file):
+    resp = client.get(audio_file)
+    etag = resp.headers["ETag"]
+    last_modified = resp.headers["Last-Modified"]
+    assert resp.cache_control.private
+    assert resp.cache_control.max_age == 24 * 60 * 60
+    assert not resp.cache_control.no_cache
+
+    resp = client.get(audio_file, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert resp.headers["ETag"] == etag
+    assert resp.cache_control.max_age == 24 * 60 * 60
+    # weak comparison for If-None-Match
+    assert client.get(audio_file, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get(audio_file, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    resp = client.get(audio_file, headers={"If-Modified-Since": last_modified})
+    assert resp.status_code == 304
+    assert client.get(audio_file, headers={
+        "If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    # If-Modified-Since is ignored if If-None-Match is present
+    assert client.get(audio_file, headers={
+        "If-None-Match": '"other"', "If-Modified-Since": last_modified}).status_code == 200
+
+    # If-Range needs a strong match, otherwise the whole file is sent
+    resp = client.get(audio_file, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert resp.status_code == 206
+    assert resp.data == AUDIO[:10]
+    resp = client.get(audio_file, headers={"Range": "bytes=0-9", "If-Range": f"W/{etag}"})
+    assert resp.status_code == 200
+    assert resp.data == AUDIO
+    resp = client.get(audio_file, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert resp.status_code == 200
+    resp = client.get(audio_file, headers={"Range": "bytes=0-9", "If-Range": last_modified})
+    assert resp.status_code == 206
+    resp = client.get(audio_file, headers={
+        "Range": "bytes=0-9", "If-Range": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert resp.status_code == 200
+
+    # file was replaced -> validators change
+    os.utime(os.path.join(client.application.instance_path, "artist", "audio.m4a"),
+             ns=(0, 10**9))
+    assert client.get(audio_file, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_embed_conditional_requests(client, audio_file):
+    url = "/embed/audio/audio.m4a?subpath=artist"
+    resp = client.get(url)
+    assert resp.status_code == 200
+    # html has to be revalidated every time
+    assert resp.cache_control.private
+    assert resp.cache_control.no_cache
+    assert resp.cache_control.max_age is None
+    resp = client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+    assert resp.status_code == 304
+    assert resp.cache_control.no_cache
+
+
+def test_api_cursor():
+    cursor = Cursor("after", "rating", "DESC", [7.5, 12])
+    decoded = Cursor.decode(cursor.encode())
+    assert (decoded.direction, decoded.sort_col, decoded.asc_desc, decoded.keyset) == (
+        "after", "rating", "DESC", (7.5, 12))
+    # no padding, url-safe
+    assert re.match(r"^[A-Za-z0-9_-]+$", cursor.encode())
+    assert Cursor.decode(Cursor("before", "id", "ASC", (3,)).encode()).keyset == (3,)
+
+    for invalid in (
+            "not a cursor!", "e30", Cursor("sideways", "id", "ASC", (1,)).encode(),
+            Cursor("after", "id", "UP", (1,)).encode(),
+            # sort col ends up in the statement
+            Cursor("after", "id; DROP TABLE AudioFile", "ASC", (1,)).encode(),
+            Cursor("after", "rating", "ASC", (1,)).encode(),
+            Cursor("after", "id", "ASC", ("1",)).encode()):
+        with pytest.raises(APIError):
+            Cursor.decode(invalid)
+
+
+def test_api_requires_login(app):
+    client = app.test_client()
+    resp = client.get("/api/v1/entries")
+    # no redirect to the login form
+    assert resp.status_code == 401
+    assert resp.get_json() == {"error": "Login required!"}
+    assert client.get("/").status_code == 302
+
+
+def test_api_entries(client):
+    resp = client.get("/api/v1/entries?fields=id,title&limit=10")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["fields"] == ["id", "title"]
+    assert len(data["entries"]) == 10
+    assert all(len(row) == 2 for row in data["entries"])
+    assert data["prev"] is None
+    ids = [row[0] for row in data["entries"]]
+    assert ids == sorted(ids, reverse=True)
+
+    # following the cursors
+    seen = list(ids)
+    while data["next"]:
+        data = client.get(f"/api/v1/entries?fields=id&limit=10&cursor={data['next']}").get_json()
+        seen.extend(row[0] for row in data["entries"])
+    assert seen == sorted(seen, reverse=True) and len(seen) == len(set(seen))
+    prev = client.get(f"/api/v1/entries?fields=id&limit=10&cursor={data['prev']}").get_json()
+    assert [row[0] for row in prev["entries"]] == seen[-len(data["entries"]) - 10:
+                                                      -len(data["entries"])]
+
+    entry_id = ids[0]
+    resp = client.get(f"/api/v1/entries/{entry_id}?fields=id,title")
+    assert resp.get_json()["entry"][0] == entry_id
+    assert client.get("/api/v1/entries/999999").status_code == 404
+
+    # invalid args
+    resp = client.get("/api/v1/entries?fields=id,nope")
+    assert resp.status_code == 400
+    assert "nope" in resp.get_json()["error"]
+    for limit in (0, -1, API_MAX_LIMIT + 1):
+        assert client.get(f"/api/v1/entries?limit={limit}").status_code == 400
+    assert client.get(f"/api/v1/entries?limit={API_MAX_LIMIT}").status_code == 200
+    assert client.get("/api/v1/entries?cursor=garbage").status_code == 400
+
+
+def test_api_unsupported_search_columns(client, app):
+    con = sqlite3.connect(app.config["DATABASE_PATH"])
+    with con:
+        con.execute("DELETE FROM ListenLater")
+        con.executemany("INSERT INTO ListenLater(audio_id) VALUES (?)", [(3,), (5,)])
+    con.close()
+
+    # query only consists of unsupported columns -> all entries
+    resp = client.get("/api/v1/entries?q=foo:bar&fields=id&limit=100")
+    assert resp.status_code == 200
+    assert len(resp.get_json()["entries"]) == 30
+    resp = client.get("/api/v1/entries/listen-later?q=foo:bar&fields=id")
+    assert resp.status_code == 200
+    assert [row[0] for row in resp.get_json()["entries"]] == [5, 3]
+
+
+def test_api_compression(client):
+    resp = client.get("/api/v1/entries?limit=30", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.vary
+    assert resp.headers["ETag"].endswith('-gzip"')
+    plain = client.get("/api/v1/entries?limit=30")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["ETag"].endswith('-identity"')
+    assert gzip.decompress(resp.data) == plain.data
+
+    # small bodies aren't compressed and get the validator of the uncompressed body
+    resp = client.get("/api/v1/entries?limit=1&fields=id", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["ETag"].endswith('-identity"')
+    assert resp.get_json()["fields"] == ["id"]
+
+
+def test_api_conditional_requests(client, app):
+    url = "/api/v1/entries?limit=30"
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    etag = resp.headers["ETag"]
+    assert resp.cache_control.private and resp.cache_control.no_cache
+
+    resp = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    small = client.get("/api/v1/entries?limit=1&fields=id",
+                       headers={"Accept-Encoding": "gzip"})
+    assert client.get("/api/v1/entries?limit=1&fields=id", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": small.headers["ETag"]}).status_code == 304
+    # args are validated before the client's copy
+    resp = client.get(f"{url}&fields=nope", headers={"If-None-Match": etag})
+    assert resp.status_code == 400
+    resp = client.get("/api/v1/entries/1?fields=nope", headers={"If-None-Match": etag})
+    assert resp.status_code == 400
+
+    # any change to the entries, even from another connection, invalidates the copy
+    con = sqlite3.connect(app.config["DATABASE_PATH"])
+    with con:
+        con.execute("UPDATE AudioFile SET favorite = 1 WHERE id = 1")
+    con.close()
+    resp = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_render_cache_invalidation(client, app):
+    cache = app.extensions["gwaripper_render_cache"]
+    with client.session_transaction() as sess:
+        sess["_csrf_token"] = "token"
+
+    client.get("/")
+    assert len(cache._pages) == 1
+    # served from the cache
+    cache._pages[next(iter(cache._pages))] += "<!-- cached -->"
+    assert client.get("/").data.endswith(b"<!-- cached -->")
+
+    # write by the webGUI's writer
+    resp = client.post("/entry/set-favorite", data={
+        "entryId": 1, "favIntbool": 1, "_csrf_token": "token"})
+    assert resp.status_code == 200
+    assert not client.get("/").data.endswith(b"<!-- cached -->")
+    assert len(cache._pages) == 1
+
+    # write by another connection e.g. gwaripper downloading new files
+    cache._pages[next(iter(cache._pages))] += "<!-- cached -->"
+    assert client.get("/").data.endswith(b"<!-- cached -->")
+    con = sqlite3.connect(app.config["DATABASE_PATH"])
+    with con:
+        con.execute("UPDATE AudioFile SET title = 'renamed title' WHERE id = 30")
+    con.close()
+    page = client.get("/").data
+    assert not page.endswith(b"<!-- cached -->")
+    assert b"renamed title" in page
+
+
+def test_render_cache_needs_csrf_token(client, app):
+    cache = app.extensions["gwaripper_render_cache"]
+    resp = client.get("/")
+    assert resp.status_code == 200
+    # page contains the csrf token that was generated for this session
+    assert not cache._pages
+    with client.session_transaction() as sess:
+        token = sess["_csrf_token"]
+    assert token.encode("ascii") in resp.data
+
+    client.get("/")
+    assert list(cache._pages)[0][-1] == token
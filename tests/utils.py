@@ -5,6 +5,8 @@ import time
 import hashlib
 import random
 import sqlite3
+import threading
+import http.server
 
 import gwaripper.config as config
 from gwaripper.logging_setup import configure_logging
@@ -137,3 +139,199 @@ def load_db(db_fn, row_fac=False):
     if row_fac:
         db_con.row_factory = sqlite3.Row
     return db_con
+
+
+def create_db_with_entries(db_path, nr_entries, seed=1337, max_files_per_collection=1,
+                           aliases_per_artist=1):
+    """
+    Creates a DB with the current schema and fills it with nr_entries AudioFiles
+    (roughly every third one is part of a FileCollection, some have RedditInfo)
+    for benchmarks
+
+    :param max_files_per_collection: If > 1 FileCollections contain between 1 and
+                                     max_files_per_collection files instead of a single one
+    :param aliases_per_artist: Nr of aliases every artist has
+    """
+    # import here so importing utils doesn't need the DB module
+    from gwaripper.db import load_or_create_sql_db
+
+    rnd = random.Random(seed)
+    con, _ = load_or_create_sql_db(db_path)
+    words = ["asmr", "f4m", "rain", "whisper", "girlfriend", "sleep", "comfort",
+             "roleplay", "cuddles", "morning", "tingles", "soft", "story"]
+    nr_artists = max(1, nr_entries // 50)
+    nr_aliases = nr_artists * aliases_per_artist
+
+    if max_files_per_collection > 1:
+        # NOTE: separate rng so the default data stays the same
+        fanout_rnd = random.Random(seed + 1)
+        collection_ids = []
+        nr_collections = 0
+        while len(collection_ids) < nr_entries:
+            # about the same share of files in collections as above
+            nr_single = fanout_rnd.randint(0, max_files_per_collection * 2)
+            nr_in_coll = fanout_rnd.randint(1, max_files_per_collection)
+            nr_collections += 1
+            collection_ids.extend([None] * nr_single + [nr_collections] * nr_in_coll)
+        collection_ids = collection_ids[:nr_entries]
+        nr_collections = max((c for c in collection_ids if c is not None), default=0)
+    else:
+        nr_collections = nr_entries // 3
+        collection_ids = [i // 3 + 1 if i % 3 == 0 and i // 3 < nr_collections else None
+                          for i in range(nr_entries)]
+
+    with con:
+        con.executemany("INSERT INTO Artist(name) VALUES (?)",
+                        ((f"artist{i}",) for i in range(nr_artists)))
+        con.executemany("INSERT INTO Alias(artist_id, name) VALUES (?, ?)",
+                        ((i // aliases_per_artist + 1, f"alias{i}") for i in range(nr_aliases)))
+        first_alias_id = con.execute(
+            "SELECT id FROM Alias WHERE name = 'alias0'").fetchone()[0]
+
+        con.executemany("INSERT INTO RedditInfo(created_utc) VALUES (?)",
+                        ((1_500_000_000 + i * 600,) for i in range(nr_collections // 2)))
+        con.executemany(
+            "INSERT INTO FileCollection(url, id_on_page, title, subpath, reddit_info_id,"
+            " parent_id, alias_id) VALUES (?, ?, ?, '', ?, NULL, ?)",
+            ((f"https://www.reddit.com/r/gwa/comments/{i}/", str(i),
+              " ".join(rnd.choices(words, k=5)),
+              i + 1 if i < nr_collections // 2 else None,
+              first_alias_id + rnd.randrange(nr_aliases))
+             for i in range(nr_collections)))
+
+        con.executemany(
+            "INSERT INTO AudioFile(collection_id, date, description, filename, title,"
+            " url, alias_id, rating, favorite) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((collection_ids[i],
+              f"20{10 + i * 12 // nr_entries:02d}-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+              " ".join(rnd.choices(words, k=20)),
+              f"file{i}.m4a",
+              " ".join(rnd.choices(words, k=6)),
+              f"https://soundgasm.net/u/user/title-{i}",
+              first_alias_id + rnd.randrange(nr_aliases),
+              rnd.choice([None, 1.0, 5.0, 7.5, 10.0]),
+              int(rnd.random() < 0.1))
+             for i in range(nr_entries)))
+        con.executemany("INSERT INTO ListenLater(audio_id) VALUES (?)",
+                        ((i,) for i in range(1, nr_entries + 1, 97)))
+    con.close()
+
+
+class LocalHTTPServer:
+    """
+    Serves the bytes in `files` (path -> content) over HTTP/1.1 with keep-alive
+    on localhost; `connections` counts the TCP connections that were accepted
+    and `requests` the received requests (method, path, headers)
+    Supports single byte ranges if `accept_ranges` is True, which are only served
+    if the If-Range header matches the ETag of the content (if `send_etag` is True)
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        self.connections = 0
+        # path -> list of status codes that will be returned (and removed) before
+        # serving the file normally
+        self.fail_with = {}
+        # path -> list of byte counts after which the connection will be dropped
+        # (and removed) while still reporting the full Content-Length
+        self.cut_after = {}
+        # path -> (status code, Location) of redirects
+        self.redirects = {}
+        self.accept_ranges = True
+        # complete length of 206 responses is sent as * (unknown)
+        self.unknown_total = False
+        self.send_etag = True
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                server.connections += 1
+                super().setup()
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                fail = server.fail_with.get(self.path)
+                if fail:
+                    self.send_response(fail.pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.path in server.redirects:
+                    status, location = server.redirects[self.path]
+                    self.send_response(status)
+                    self.send_header("Location", location)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    content = server.files[self.path]
+                except KeyError:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                total = len(content)
+                etag = f'"{hashlib.md5(content).hexdigest()}"'
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if if_range is not None and (not server.send_etag or if_range != etag):
+                    # content changed -> whole file
+                    range_header = None
+                if range_header and server.accept_ranges:
+                    start = int(range_header.split("=")[1].split("-")[0])
+                    if start >= total:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{total}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{total - 1}/"
+                                     f"{'*' if server.unknown_total else total}")
+                    content = content[start:]
+                else:
+                    self.send_response(200)
+                if server.accept_ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                if server.send_etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if head:
+                    return
+                cut = server.cut_after.get(self.path)
+                if cut:
+                    self.wfile.write(content[:cut.pop(0)])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(content)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def local_http_server():
+    server = LocalHTTPServer()
+    yield server
+    server.shutdown()